@@ -0,0 +1,105 @@
+"""
+Optional compression of pipeline outputs (spans and text artefacts).
+
+The compression method is determined by the file suffix:
+
+    .gz   gzip (Python standard library)
+    .zst  zstd (requires the zstandard package)
+
+Compressed files may consist of multiple concatenated members (frames), eg. when
+written incrementally with compress. Readers below read all members.
+"""
+import io, gzip
+from pathlib import Path
+from typing import IO, List, Optional
+
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def _get_zstandard():
+    try:
+        import zstandard
+
+        return zstandard
+    except ImportError as e:
+        raise ImportError("zstd compression requires the zstandard package") from e
+
+
+def compression_suffix(compression: Optional[str]) -> str:
+    """
+    Return file suffix for a compression method ("gzip", "zstd", or None/"none" for
+    no compression).
+    """
+    if compression in [None, "none"]:
+        return ""
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"Unknown compression {compression}")
+    return COMPRESSION_SUFFIXES[compression]  # type: ignore
+
+
+def with_compression(path: Path, compression: Optional[str]) -> Path:
+    """
+    Return path with suffix for compression method added, eg. spans.json.gz
+    """
+    return path.with_name(path.name + compression_suffix(compression))
+
+
+def compress(data: bytes, path: Path) -> bytes:
+    """
+    Compress data as one member (frame) for a file with the given path. If the path
+    does not have a compression suffix, return data as is.
+    """
+    if path.suffix == ".gz":
+        # fixed mtime so output only depends on input
+        return gzip.compress(data, mtime=0)
+    if path.suffix == ".zst":
+        return _get_zstandard().ZstdCompressor().compress(data)
+    return data
+
+
+def open_text(path: Path, mode: str = "rt") -> IO[str]:
+    """
+    Open text file for reading or writing, and (de)compress based on file suffix.
+    """
+    assert mode in ["rt", "wt"]
+
+    if path.suffix == ".gz":
+        return gzip.open(path, mode, encoding="utf-8")  # type: ignore
+
+    if path.suffix == ".zst":
+        zstandard = _get_zstandard()
+        if mode == "rt":
+            stream = zstandard.ZstdDecompressor().stream_reader(
+                open(path, "rb"), read_across_frames=True, closefd=True
+            )
+        else:
+            stream = zstandard.ZstdCompressor().stream_writer(
+                open(path, "wb"), closefd=True
+            )
+        return io.TextIOWrapper(stream, encoding="utf-8")
+
+    return open(path, mode, encoding="utf-8")
+
+
+def find_path(path: Path) -> Path:
+    """
+    Return path if it exists, or otherwise the first existing compressed version of
+    the path (eg. for path "spans.json", the file "spans.json.gz").
+    """
+    candidates: List[Path] = [path] + [
+        with_compression(path, compression) for compression in COMPRESSION_SUFFIXES
+    ]
+    for candidate in candidates:
+        if candidate.is_file():
+            return candidate
+
+    raise FileNotFoundError(f"None of {candidates} found")
+
+
+def read_text(path: Path) -> str:
+    """
+    Read text file transparently: path may be uncompressed, or be given without
+    the compression suffix, see find_path.
+    """
+    with open_text(find_path(path)) as f:
+        return f.read()
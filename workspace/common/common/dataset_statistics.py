@@ -0,0 +1,150 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Tuple
+
+#
+import numpy as np
+
+# Largest integer value counted with np.bincount (other values use np.unique)
+MAX_BINCOUNT_VALUE = 2**16
+
+
+def _iter_row_chunks(X, y, chunk_size: int) -> Iterator[Tuple[Any, Any]]:
+    """
+    Iterate over aligned chunks of rows of X and y. X and y can be numpy arrays,
+    memory-mapped arrays, or sharded arrays (see common.io.read_sharded_numpy). Only
+    one chunk is loaded into memory at a time.
+    """
+    assert chunk_size > 0
+    assert len(X) == len(y)
+
+    for start in range(0, len(y), chunk_size):
+        yield (
+            np.asarray(X[start : start + chunk_size]),
+            np.asarray(y[start : start + chunk_size]),
+        )
+
+
+def _count_values(values) -> Dict[Any, int]:
+    """
+    Return counts for all distinct values in an array
+    """
+    values = values.reshape(-1)
+    if len(values) == 0:
+        return {}
+
+    is_small_int = values.min() >= 0 and values.max() < MAX_BINCOUNT_VALUE
+    if is_small_int:
+        int_values = values.astype(np.int64)
+        is_small_int = np.issubdtype(values.dtype, np.integer) or bool(
+            (int_values == values).all()
+        )
+
+    if is_small_int:
+        counts = np.bincount(int_values)
+        keys = np.flatnonzero(counts)
+        counts = counts[keys]
+        keys = keys.astype(values.dtype)
+    else:
+        keys, counts = np.unique(values, return_counts=True)
+
+    return {k.item(): int(c) for k, c in zip(keys, counts)}
+
+
+def _add_counts(total: Dict[Any, int], counts: Dict[Any, int]):
+    for k, c in counts.items():
+        total[k] = total.get(k, 0) + c
+
+
+@dataclass
+class DatasetStatistics:
+    """
+    Summary statistics for a labeled dataset with rows of pixel values (X) and
+    class labels (y), see compute_dataset_statistics.
+    """
+
+    nr_rows: int
+
+    # label -> number of rows with label
+    label_counts: Dict[int, int]
+
+    # pixel value -> number of pixels with value (over all rows)
+    pixel_value_counts: Dict[Any, int]
+
+    # mean and variance of each pixel (shape: pixels per row)
+    pixel_mean: Any
+    pixel_var: Any
+
+    # mean and variance of each pixel for rows with a label (shape: nr of labels x
+    # pixels per row, with labels in the order of label_counts)
+    class_pixel_mean: Any
+    class_pixel_var: Any
+
+
+def compute_dataset_statistics(X, y, chunk_size: int = 8192) -> DatasetStatistics:
+    """
+    Compute label counts, pixel value counts, and (overall and per class) pixel
+    means and variances in one pass over chunks of rows.
+
+    Computations are vectorized (np.bincount for counts, and matrix products for
+    sums per class). So the cost is linear in the number of pixels, and memory use is
+    independent of the number of rows.
+
+    Labels should be non-negative integers.
+    """
+    nr_rows: int = len(y)
+    nr_pixels: int = int(np.prod(X.shape[1:]))
+
+    label_bincounts = np.zeros(0, dtype=np.int64)
+    pixel_value_counts: Dict[Any, int] = {}
+
+    # sums of pixel values (and squared pixel values) per label
+    class_sums = np.zeros((0, nr_pixels))
+    class_sq_sums = np.zeros((0, nr_pixels))
+
+    for X_chunk, y_chunk in _iter_row_chunks(X, y, chunk_size):
+        X_chunk = X_chunk.reshape(len(X_chunk), nr_pixels)
+        assert np.issubdtype(y_chunk.dtype, np.integer) or (y_chunk % 1 == 0).all()
+        y_chunk = y_chunk.astype(np.int64)
+        assert (y_chunk >= 0).all()
+
+        # grow per-label accumulators if chunk has new (larger) labels
+        nr_labels = max(len(label_bincounts), int(y_chunk.max()) + 1)
+        label_bincounts = np.pad(label_bincounts, (0, nr_labels - len(label_bincounts)))
+        class_sums = np.pad(class_sums, ((0, nr_labels - len(class_sums)), (0, 0)))
+        class_sq_sums = np.pad(
+            class_sq_sums, ((0, nr_labels - len(class_sq_sums)), (0, 0))
+        )
+
+        label_bincounts += np.bincount(y_chunk, minlength=nr_labels)
+        _add_counts(pixel_value_counts, _count_values(X_chunk))
+
+        # one-hot encoded labels; sums per label are computed as matrix products
+        one_hot = np.zeros((len(y_chunk), nr_labels))
+        one_hot[np.arange(len(y_chunk)), y_chunk] = 1.0
+
+        X_chunk = X_chunk.astype(np.float64)
+        class_sums += one_hot.T @ X_chunk
+        class_sq_sums += one_hot.T @ (X_chunk * X_chunk)
+
+    def mean_var(sums, sq_sums, counts):
+        counts = np.maximum(counts, 1)[..., None]
+        mean = sums / counts
+        return mean, np.maximum(sq_sums / counts - mean * mean, 0.0)
+
+    labels = np.flatnonzero(label_bincounts)
+    pixel_mean, pixel_var = mean_var(
+        class_sums.sum(axis=0), class_sq_sums.sum(axis=0), np.array(nr_rows)
+    )
+    class_pixel_mean, class_pixel_var = mean_var(
+        class_sums[labels], class_sq_sums[labels], label_bincounts[labels]
+    )
+
+    return DatasetStatistics(
+        nr_rows=nr_rows,
+        label_counts={int(k): int(label_bincounts[k]) for k in labels},
+        pixel_value_counts=dict(sorted(pixel_value_counts.items())),
+        pixel_mean=pixel_mean,
+        pixel_var=pixel_var,
+        class_pixel_mean=class_pixel_mean,
+        class_pixel_var=class_pixel_var,
+    )
@@ -0,0 +1,106 @@
+"""
+Figures of the demo pipeline that are rendered in parallel with
+common.plotting.render_figures.
+
+The plot functions are defined at module level (and not in the notebooks), so they
+can be pickled to the worker processes, eg. as functools.partial(plot_function, ...).
+"""
+import itertools as it
+
+
+def plot_digit_images(X_digit, digit: int):
+    """
+    Draw panel of all images (as rows of 8x8 pixels in X_digit) of one digit
+    """
+    import matplotlib.pyplot as plt
+
+    #
+    from common.utils import make_panel_image
+
+    X_digit = X_digit.reshape(-1, 8, 8)
+
+    fig, ax = plt.subplots(nrows=1, ncols=1, figsize=(18, 30))
+
+    ax.set_title(f"\nDigits {digit} (n={len(X_digit)}) \n", fontsize=24)
+    ax.axis("off")
+
+    ax.imshow(
+        make_panel_image(X_digit, pad_width=2, background_fill=6, images_per_row=26),
+        cmap=plt.cm.gray_r,
+    )
+
+    fig.tight_layout()
+    return fig
+
+
+def plot_per_digit_probabilities(y_pred_probs):
+    """
+    Draw histograms of predicted probabilities for each digit
+    """
+    import matplotlib.pyplot as plt
+
+    fig, axs = plt.subplots(nrows=2, ncols=5, figsize=(16, 6))
+
+    for (r, c), digit, ax in zip(
+        it.product(range(2), range(5)), range(10), axs.reshape(-1)
+    ):
+        ax.hist(y_pred_probs[:, digit], bins=20)
+
+        ax.set_title(f"Digit {digit}")
+        if r == 1 and c == 2:
+            ax.set_xlabel("probability", fontsize=16)
+
+        if c == 0:
+            ax.set_ylabel("counts", fontsize=16)
+        ax.set_yscale("log")
+
+    fig.tight_layout()
+    fig.suptitle(
+        f"Distributions of prediction probabilities for each digit "
+        f"(on evaluation data, n={y_pred_probs.shape[0]})",
+        fontsize=20,
+    )
+    fig.tight_layout()
+
+    return fig
+
+
+def plot_roc_curves(y, y_pred_probs):
+    """
+    Draw ROC curves for the one-vs-rest classifiers of each digit
+    """
+    # based on example code
+    # https://scikit-learn.org/stable/auto_examples/model_selection/plot_roc.html
+    import matplotlib.pyplot as plt
+    from sklearn import metrics
+
+    fig, axs = plt.subplots(nrows=2, ncols=5, figsize=(16, 8))
+
+    for (r, c), digit, ax in zip(
+        it.product(range(2), range(5)), range(10), axs.reshape(-1)
+    ):
+        fpr, tpr, _ = metrics.roc_curve(y == digit, y_pred_probs[:, digit])
+        auc = metrics.auc(fpr, tpr)
+
+        ax.plot(fpr, tpr, label=f"ROC AUC={round(auc, 3)}")
+
+        ax.set_title(f"\nDigit {digit}", fontsize=16)
+        if r == 1:
+            ax.set_xlabel("FPR", fontsize=18)
+
+        if c == 0:
+            ax.set_ylabel("TPR", fontsize=18)
+
+        ax.set_xlim([-0.05, 1.05])
+        ax.set_ylim([-0.05, 1.05])
+        ax.legend(loc="lower right", frameon=False, fontsize=14)
+
+    fig.tight_layout()
+    fig.suptitle(
+        f"ROC plots for one-vs-rest performances "
+        f"(on evaluation data, n={y_pred_probs.shape[0]})",
+        fontsize=22,
+    )
+    fig.tight_layout()
+
+    return fig
@@ -0,0 +1,191 @@
+import math
+from typing import Any, Callable, Dict, List, Tuple
+
+#
+import numpy as np
+
+#
+from common.utils import local_executor_enabled
+
+# One cross-validation job: (model parameters, fold train indices, fold test indices)
+FoldJob = Tuple[Dict[str, Any], Any, Any]
+
+# Function that evaluates a list of jobs (possibly in parallel) and returns a list with
+# the score for each job. The data X, y is passed separately from the jobs, so that it
+# only needs to be sent once to remote workers.
+JobsMap = Callable[[Callable[..., float], Any, Any, List[FoldJob]], List[float]]
+
+# Modules imported once by the forkserver process of make_process_map (and not by
+# each worker)
+FORKSERVER_PRELOAD = ["sklearn.svm", "common.hyperparameter_search"]
+
+
+def fit_and_score_svc(X, y, params: Dict[str, Any], train_idxs, test_idxs) -> float:
+    """
+    Fit a sklearn support vector classifier with the given parameters on one
+    cross-validation fold, and return accuracy on the held out rows.
+
+    Note: probability estimates are not computed during the search (this would add
+    an internal cross-validation to each fit).
+    """
+    from sklearn.svm import SVC
+
+    model = SVC(**params, probability=False)
+    model.fit(X[train_idxs], y[train_idxs])
+
+    return float(model.score(X[test_idxs], y[test_idxs]))
+
+
+def serial_map(f, X, y, jobs: List[FoldJob]) -> List[float]:
+    return [f(X, y, *job) for job in jobs]
+
+
+def make_ray_map(max_parallel: int) -> JobsMap:
+    """
+    Return function that evaluates jobs as Ray tasks, with at most max_parallel
+    tasks running at the same time.
+
+    The Ray tasks do not reserve any CPUs. Rather, they are assumed to run on the
+    cores reserved for the notebook task starting the search (see num_cpus in
+    driver.py). Otherwise, notebook tasks waiting for search tasks could block all
+    cores on the Ray cluster.
+    """
+    import ray
+
+    assert max_parallel > 0
+
+    def ray_map(f, X, y, jobs: List[FoldJob]) -> List[float]:
+        f_remote = ray.remote(num_cpus=0)(f)
+        X_ref, y_ref = ray.put(X), ray.put(y)
+
+        pending: Dict[Any, int] = {}
+        scores: List[float] = [math.nan] * len(jobs)
+
+        for job_nr, job in enumerate(jobs):
+            if len(pending) >= max_parallel:
+                [done], _ = ray.wait(list(pending.keys()), num_returns=1)
+                scores[pending.pop(done)] = ray.get(done)
+
+            pending[f_remote.remote(X_ref, y_ref, *job)] = job_nr
+
+        for ref, job_nr in pending.items():
+            scores[job_nr] = ray.get(ref)
+
+        return scores
+
+    return ray_map
+
+
+def make_process_map(max_parallel: int) -> JobsMap:
+    """
+    Return function that evaluates jobs in a pool of at most max_parallel local
+    processes (eg. when the pipeline is run without a Ray cluster).
+
+    Workers are started with the forkserver (or spawn) method, and the evaluated
+    function is pickled, so it should be defined at module level (eg.
+    fit_and_score_svc).
+    """
+    import multiprocessing
+    from multiprocessing.context import BaseContext
+    from concurrent.futures import ProcessPoolExecutor
+
+    assert max_parallel > 0
+
+    def process_map(f, X, y, jobs: List[FoldJob]) -> List[float]:
+        if max_parallel == 1:
+            return serial_map(f, X, y, jobs)
+
+        # Workers are not forked from the notebook kernel, since it may have running
+        # threads (eg. of Ray or onnxruntime), see also common.plotting
+        mp_context: BaseContext
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context("forkserver")
+            mp_context.set_forkserver_preload(FORKSERVER_PRELOAD)
+        else:
+            mp_context = multiprocessing.get_context("spawn")
+
+        with ProcessPoolExecutor(
+            max_workers=max_parallel, mp_context=mp_context
+        ) as executor:
+            futures = [executor.submit(f, X, y, *job) for job in jobs]
+            return [future.result() for future in futures]
+
+    return process_map
+
+
+def make_jobs_map(P, max_parallel: int) -> JobsMap:
+    """
+    Return make_ray_map(max_parallel), or make_process_map(max_parallel) if the
+    pipeline is run with the local executor (see common.local_executor).
+    """
+    if local_executor_enabled(P):
+        return make_process_map(max_parallel)
+    return make_ray_map(max_parallel)
+
+
+def search_svc_hyperparameters(
+    X,
+    y,
+    candidates: List[Dict[str, Any]],
+    nr_folds: int = 5,
+    reduction_factor: int = 2,
+    jobs_map: JobsMap = serial_map,
+    random_state: int = 0,
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Cross-validated search over SVC parameters with early stopping (successive
+    halving over folds):
+
+     - In each round, every remaining candidate is evaluated on the next fold. All
+       fits in one round are independent, and are evaluated with jobs_map (eg. in
+       parallel on a Ray cluster, see make_ray_map).
+     - After each round, only the best 1/reduction_factor of the candidates (ranked
+       by mean score over evaluated folds) continue to the next round.
+
+    Returns the best candidate, and a list with the cross-validation scores for all
+    candidates (including the fold after which a candidate was stopped).
+    """
+    from sklearn.model_selection import StratifiedKFold
+
+    assert len(candidates) > 0
+    assert reduction_factor >= 1
+
+    folds = list(
+        StratifiedKFold(n_splits=nr_folds, shuffle=True, random_state=random_state)
+        # -
+        .split(np.zeros(len(y)), y)
+    )
+
+    results: List[Dict[str, Any]] = [
+        {"params": params, "fold_scores": [], "stopped_after_fold": None}
+        for params in candidates
+    ]
+    remaining: List[int] = list(range(len(candidates)))
+
+    for fold_nr, (train_idxs, test_idxs) in enumerate(folds):
+        scores = jobs_map(
+            fit_and_score_svc,
+            X,
+            y,
+            [(candidates[k], train_idxs, test_idxs) for k in remaining],
+        )
+        for k, score in zip(remaining, scores):
+            results[k]["fold_scores"].append(score)
+
+        if fold_nr == len(folds) - 1:
+            break
+
+        # keep best candidates (stable sort: ties are resolved by candidate order)
+        nr_keep = max(1, math.ceil(len(remaining) / reduction_factor))
+        ranked = sorted(remaining, key=lambda k: -np.mean(results[k]["fold_scores"]))
+
+        for k in ranked[nr_keep:]:
+            results[k]["stopped_after_fold"] = fold_nr
+
+        remaining = sorted(ranked[:nr_keep])
+
+    for result in results:
+        result["mean_score"] = float(np.mean(result["fold_scores"]))
+
+    best = max(remaining, key=lambda k: results[k]["mean_score"])
+    return candidates[best], results
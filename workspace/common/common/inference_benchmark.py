@@ -0,0 +1,88 @@
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+#
+import numpy as np
+
+#
+from common.io import OnnxSessionFactory, OnnxSessionOptions
+
+
+def _get_batch(X, batch_size: int, batch_nr: int):
+    """
+    Return batch number batch_nr of batch_size rows from X. Rows are taken cyclically,
+    so that repeated batches do not always contain the same rows.
+    """
+    start = (batch_nr * batch_size) % len(X)
+    idxs = (np.arange(batch_size) + start) % len(X)
+    return np.ascontiguousarray(X[idxs], dtype=np.float32)
+
+
+def benchmark_onnx_model(
+    model_path: Path,
+    X,
+    batch_sizes: List[Optional[int]],
+    thread_counts: List[int],
+    nr_warmup: int = 3,
+    nr_repeats: int = 20,
+) -> List[Dict[str, Any]]:
+    """
+    Measure inference latency and throughput of a persisted ONNX model (see
+    common.io.convert_sklearn_to_onnx) for all combinations of batch sizes and
+    thread counts.
+
+    A batch size of None means all rows in X. For each combination, the model is
+    first evaluated nr_warmup times (not measured), and then nr_repeats times.
+
+    Returns a list with one dict for each combination with keys:
+     - batch_size, nr_threads
+     - latency_p50_ms, latency_p95_ms, latency_p99_ms: latency percentiles for one
+       batch (in milliseconds)
+     - rows_per_s: throughput (rows evaluated per second)
+    """
+    assert len(X) > 0
+    assert nr_repeats > 0
+
+    # use a separate factory; sessions are not shared with other model readers
+    session_factory = OnnxSessionFactory(max_sessions=1)
+
+    result = []
+    for nr_threads in thread_counts:
+        session = session_factory.get(
+            model_path,
+            OnnxSessionOptions(
+                intra_op_num_threads=nr_threads, inter_op_num_threads=nr_threads
+            ),
+        )
+        input_name: str = session.get_inputs()[0].name
+
+        for batch_size in batch_sizes:
+            batch_size = len(X) if batch_size is None else batch_size
+            batches = [
+                _get_batch(X, batch_size, batch_nr)
+                for batch_nr in range(nr_warmup + nr_repeats)
+            ]
+
+            for batch in batches[:nr_warmup]:
+                session.run(None, {input_name: batch})
+
+            latencies_s = np.empty(nr_repeats)
+            for k, batch in enumerate(batches[nr_warmup:]):
+                start_s = time.perf_counter()
+                session.run(None, {input_name: batch})
+                latencies_s[k] = time.perf_counter() - start_s
+
+            p50, p95, p99 = np.percentile(1000 * latencies_s, [50, 95, 99])
+            result.append(
+                {
+                    "batch_size": batch_size,
+                    "nr_threads": nr_threads,
+                    "latency_p50_ms": float(p50),
+                    "latency_p95_ms": float(p95),
+                    "latency_p99_ms": float(p99),
+                    "rows_per_s": float(batch_size * nr_repeats / latencies_s.sum()),
+                }
+            )
+
+    return result
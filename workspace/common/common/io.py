@@ -1,63 +1,762 @@
-import os
+import os, json, hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
 
 #
 import numpy as np
-import onnx
 
-from onnxruntime.capi.onnxruntime_inference_collection import InferenceSession
-import onnxruntime as rt
+#
+from common.utils import chunkify
+
+# onnx and onnxruntime are slow to import, and are imported on first use (see
+# _get_onnxruntime). So tasks only reading and writing numpy arrays do not load them.
+if TYPE_CHECKING:
+    import onnx
+    from onnxruntime import InferenceSession, SessionOptions
+
+_onnxruntime: Optional[Any] = None
+
+
+def _get_onnxruntime():
+    global _onnxruntime
+
+    if _onnxruntime is None:
+        import onnxruntime as rt
+
+        # See: https://github.com/microsoft/onnxruntime/blob/master/docs/Privacy.md
+        rt.disable_telemetry_events()
+        rt.set_seed(0)
+        _onnxruntime = rt
 
-# See: https://github.com/microsoft/onnxruntime/blob/master/docs/Privacy.md
-rt.disable_telemetry_events()
-rt.set_seed(0)
+    return _onnxruntime
 
 
 def datalake_root(P):
     return Path(P["pipeline.data_lake_root"])
 
 
-def write_numpy(path: Path, numpy_obj):
+# ---- compact storage dtypes ----
+
+# Integer dtypes (from smallest) that arrays with integer values are stored as
+COMPACT_INTEGER_DTYPES: List[Any] = [
+    np.uint8,
+    np.int8,
+    np.uint16,
+    np.int16,
+    np.uint32,
+    np.int32,
+]
+
+
+def compact_dtype(numpy_obj) -> np.dtype:
+    """
+    Return the most compact dtype that can represent all values of an array without
+    loss, eg. uint8 for pixel values 0..16 stored as float64.
+
+    Arrays (also float arrays) with only integer values are stored as the smallest
+    integer dtype with a range covering all values. Other arrays keep their dtype.
+    """
+    numpy_obj = np.asarray(numpy_obj)
+    dtype = numpy_obj.dtype
+
+    is_integer = np.issubdtype(dtype, np.integer)
+    is_float = np.issubdtype(dtype, np.floating)
+    if numpy_obj.size == 0 or not (is_integer or is_float):
+        return dtype
+
+    if is_float and not (
+        np.isfinite(numpy_obj).all() and (numpy_obj == np.trunc(numpy_obj)).all()
+    ):
+        return dtype
+
+    min_value, max_value = numpy_obj.min(), numpy_obj.max()
+    for candidate in COMPACT_INTEGER_DTYPES:
+        if np.dtype(candidate).itemsize >= dtype.itemsize:
+            break
+
+        info = np.iinfo(candidate)
+        if info.min <= min_value and max_value <= info.max:
+            return np.dtype(candidate)
+
+    return dtype
+
+
+def _dtype_metadata_path(path: Path) -> Path:
+    # eg. digits.numpy -> digits.numpy.dtype.json
+    return path.with_name(path.name + ".dtype.json")
+
+
+def logical_dtype(path: Path) -> np.dtype:
+    """
+    Return the dtype of the array written with write_numpy (before it was stored in
+    a compact dtype).
+    """
+    metadata_path = _dtype_metadata_path(path)
+    if metadata_path.is_file():
+        return np.dtype(json.loads(metadata_path.read_text())["logical_dtype"])
+
+    return read_numpy(path, mmap=True).dtype
+
+
+class CastArray:
+    """
+    Read-only view of an array (eg. a memory-mapped or sharded array) that casts
+    rows to dtype when they are accessed. So, eg., a uint8 dataset can be passed to
+    a model as float32 without first converting the full array.
+
+    Use np.asarray(..) to cast the full array.
+    """
+
+    def __init__(self, arr, dtype):
+        self.arr = arr
+        self.dtype = np.dtype(dtype)
+
+    @property
+    def shape(self) -> tuple:
+        return tuple(self.arr.shape)
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    def __len__(self) -> int:
+        return len(self.arr)
+
+    def __getitem__(self, idx):
+        return np.asarray(self.arr[idx]).astype(self.dtype)
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.arr).astype(self.dtype if dtype is None else dtype)
+
+    def to_numpy(self):
+        return np.asarray(self)
+
+
+def _resolve_dtype(path: Path, stored_dtype: np.dtype, dtype) -> np.dtype:
+    if dtype is None:
+        return stored_dtype
+    if isinstance(dtype, str) and dtype == "logical":
+        return logical_dtype(path)
+    return np.dtype(dtype)
+
+
+def write_numpy(
+    path: Path, numpy_obj, compact: bool = False, logical_dtype: Optional[Any] = None
+):
     """
     Serialize and write a numpy array to a local file
+
+    If compact=True, the array is stored in the most compact lossless dtype (see
+    compact_dtype), and its logical dtype is written to a metadata file next to the
+    array. The logical dtype defaults to the dtype of numpy_obj.
     """
     assert path.suffix == ".numpy"
 
     # Create local directory for file if it does not exist
     os.makedirs(path.parent, exist_ok=True)
 
-    with open(path, "wb") as f:
+    numpy_obj = np.asarray(numpy_obj)
+    logical = np.dtype(numpy_obj.dtype if logical_dtype is None else logical_dtype)
+    if compact:
+        numpy_obj = numpy_obj.astype(compact_dtype(numpy_obj), copy=False)
+
+    metadata_path = _dtype_metadata_path(path)
+    if logical != numpy_obj.dtype:
+        metadata_path.write_text(json.dumps({"logical_dtype": logical.str}))
+    else:
+        metadata_path.unlink(missing_ok=True)
+
+    # write to a temporary file that is renamed when complete, so a writer that is
+    # stopped (eg. a cancelled hedged attempt of a task) does not leave a partial file
+    tmp_path: Path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
         np.save(f, numpy_obj, allow_pickle=False)
+    os.replace(tmp_path, path)
 
 
-def read_numpy(path: Path):
+def read_numpy(path: Path, mmap: bool = False, dtype: Optional[Any] = None):
     """
     Read numpy array from a local file saved with write_numpy, see above
+
+    If mmap=True, the file is memory-mapped and a read-only array backed by the OS
+    page cache is returned (instead of reading the full file into process memory).
+    Then:
+     - parallel tasks on the same node reading the same file share physical memory.
+     - only the rows that are accessed are read from disk.
+
+    Writing to a memory-mapped array raises a ValueError. Use np.array(..) to get a
+    writable in-memory copy.
+
+    The array is returned in its stored dtype, unless dtype is given (eg. np.float32
+    for model inputs, or "logical" for the dtype of the array before it was written
+    in a compact dtype). With mmap=True rows are cast when accessed, see CastArray.
     """
     assert path.suffix == ".numpy"
     assert path.is_file()
 
-    with open(path, "rb") as f:
-        return np.load(f)
+    if mmap:
+        numpy_obj = np.load(path, mmap_mode="r", allow_pickle=False)
+    else:
+        with open(path, "rb") as f:
+            numpy_obj = np.load(f)
+
+    target_dtype = _resolve_dtype(path, numpy_obj.dtype, dtype)
+    if target_dtype == numpy_obj.dtype:
+        return numpy_obj
+    if mmap:
+        return CastArray(numpy_obj, target_dtype)
+    return numpy_obj.astype(target_dtype)
+
+
+# ---- numpy datasets passed between pipeline tasks ----
+
+
+def object_store_enabled(P) -> bool:
+    """
+    Return True if datasets are passed between tasks using the Ray object store in
+    this pipeline run, see common.object_store
+    """
+    return bool(P.get("pipeline.object_store_datasets", False))
+
+
+def compact_dtypes_enabled(P) -> bool:
+    """
+    Return True if datasets are stored in compact dtypes (the default), see
+    compact_dtype
+    """
+    return bool(P.get("pipeline.compact_dtypes", True))
+
+
+def write_numpy_dataset(P, path: Path, numpy_obj, logical_dtype: Optional[Any] = None):
+    """
+    Write numpy array output of a task to a data lake path.
+
+    Unless disabled for the pipeline run, the array is stored in its most compact
+    lossless dtype (eg. uint8 for pixel values), see compact_dtype. The logical
+    dtype defaults to the dtype of numpy_obj. So, when writing (a subset of) a
+    dataset read in its compact dtype, pass the logical dtype of the input dataset
+    (see dataset_logical_dtype).
+
+    If the object store is enabled for the pipeline run, the array is published to
+    the Ray object store, and (unless disabled) persisted asynchronously to path.
+    Otherwise, the array is written with write_numpy.
+    """
+    numpy_obj = np.asarray(numpy_obj)
+    logical = np.dtype(numpy_obj.dtype if logical_dtype is None else logical_dtype)
+    if compact_dtypes_enabled(P):
+        numpy_obj = numpy_obj.astype(compact_dtype(numpy_obj), copy=False)
+
+    if object_store_enabled(P):
+        from common.object_store import publish_numpy
+
+        publish_numpy(
+            P,
+            path,
+            numpy_obj,
+            persist=P.get("pipeline.persist_datasets", True),
+            logical_dtype=logical,
+        )
+    else:
+        write_numpy(path, numpy_obj, logical_dtype=logical)
+
+
+def read_numpy_dataset(P, path: Path, dtype: Optional[Any] = None):
+    """
+    Read numpy array written by write_numpy_dataset. The returned array is read-only:
+     - a zero-copy view into the Ray object store (if the array was published there)
+     - otherwise, a memory-mapped array (see read_numpy).
+
+    Arrays are returned in their stored (compact) dtype, unless dtype is given (eg.
+    np.float32, or "logical"). Then rows are cast when accessed, see CastArray.
+    """
+    if object_store_enabled(P):
+        from common.object_store import lookup_numpy
+
+        published = lookup_numpy(P, path)
+        if published is not None:
+            numpy_obj, logical = published
+            is_logical = isinstance(dtype, str) and dtype == "logical"
+            target_dtype = logical if is_logical else dtype
+            if target_dtype is None or np.dtype(target_dtype) == numpy_obj.dtype:
+                return numpy_obj
+            return CastArray(numpy_obj, target_dtype)
+
+    return read_numpy(path, mmap=True, dtype=dtype)
+
+
+def dataset_logical_dtype(P, path: Path) -> np.dtype:
+    """
+    Return the logical dtype of numpy array written by write_numpy_dataset
+    """
+    if object_store_enabled(P):
+        from common.object_store import lookup_numpy
+
+        published = lookup_numpy(P, path)
+        if published is not None:
+            return published[1]
+
+    return logical_dtype(path)
+
+
+# ---- sharded numpy arrays for datasets that may not fit into memory ----
+
+
+def _shard_filename(shard_nr: int) -> str:
+    return f"shard-{shard_nr:05d}.numpy"
+
+
+class ShardedNumpyWriter:
+    """
+    Write a numpy array to a directory of fixed-size row shards, eg.
+
+        <path>/manifest.json
+        <path>/shard-00000.numpy
+        <path>/shard-00001.numpy
+        ...
+
+    Rows (split along the first axis) are streamed into the writer with `append`, and
+    at most one shard of rows is kept in memory. All shards have `shard_size` rows,
+    except the last shard that may have fewer rows.
+
+    The manifest (with dtype, row shape and row counts) is rewritten after each shard
+    is written. So, if a task is killed, the rows up to the last full shard can still
+    be read with ShardedNumpyArray.
+
+    Example:
+
+        with ShardedNumpyWriter(path, shard_size=1000) as writer:
+            for X_batch in ...:
+                writer.append(X_batch)
+    """
+
+    def __init__(self, path: Path, shard_size: int):
+        assert path.suffix == ".shards"
+        if not shard_size > 0:
+            raise ValueError("shard_size should be positive integer")
+
+        self.path = path
+        self.shard_size = shard_size
+
+        self._dtype: Optional[np.dtype] = None
+        self._row_shape: Optional[tuple] = None
+        self._shard_nr_rows: List[int] = []
+        self._buffer: List[Any] = []
+        self._buffer_nr_rows = 0
+
+        # Overwrite any existing sharded array in path (similar to write_numpy)
+        if (path / "manifest.json").is_file():
+            for shard_nr in range(len(_read_manifest(path)["shards"])):
+                (path / _shard_filename(shard_nr)).unlink(missing_ok=True)
+
+        os.makedirs(path, exist_ok=True)
+        self._write_manifest()
+
+    def append(self, rows):
+        """
+        Append rows to the sharded array. All appended rows should have the same
+        dtype and row shape (ie., shape excluding first axis).
+        """
+        rows = np.asarray(rows)
+        if len(rows.shape) == 0:
+            raise ValueError("Can not append a scalar; expected array of rows")
+
+        if self._dtype is None:
+            self._dtype, self._row_shape = rows.dtype, tuple(rows.shape[1:])
+
+        if rows.dtype != self._dtype or tuple(rows.shape[1:]) != self._row_shape:
+            raise ValueError(
+                f"Expected rows with dtype={self._dtype} and row shape="
+                f"{self._row_shape}, got {rows.dtype} and {tuple(rows.shape[1:])}"
+            )
+
+        self._buffer.append(rows)
+        self._buffer_nr_rows += len(rows)
+
+        if self._buffer_nr_rows >= self.shard_size:
+            buffer = np.concatenate(self._buffer)
+            nr_full_rows = (len(buffer) // self.shard_size) * self.shard_size
+
+            for start in range(0, nr_full_rows, self.shard_size):
+                self._write_shard(buffer[start : start + self.shard_size])
+
+            self._buffer = [buffer[nr_full_rows:]]
+            self._buffer_nr_rows = len(buffer) - nr_full_rows
+
+    def close(self):
+        """
+        Write any remaining rows as a last (partial) shard.
+        """
+        if self._buffer_nr_rows > 0:
+            self._write_shard(np.concatenate(self._buffer))
+
+        self._buffer, self._buffer_nr_rows = [], 0
+
+    def __enter__(self) -> "ShardedNumpyWriter":
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def _write_shard(self, rows):
+        write_numpy(self.path / _shard_filename(len(self._shard_nr_rows)), rows)
+        self._shard_nr_rows.append(len(rows))
+        self._write_manifest()
+
+    def _write_manifest(self):
+        manifest: Dict[str, Any] = {
+            "format_version": 1,
+            "shard_size": self.shard_size,
+            "dtype": None if self._dtype is None else self._dtype.str,
+            "row_shape": None if self._row_shape is None else list(self._row_shape),
+            "nr_rows": sum(self._shard_nr_rows),
+            "shards": [
+                {"filename": _shard_filename(shard_nr), "nr_rows": nr_rows}
+                for shard_nr, nr_rows in enumerate(self._shard_nr_rows)
+            ],
+        }
+
+        # write to temp file and rename, so readers never see a partial manifest
+        tmp_path = self.path / "manifest.json.tmp"
+        tmp_path.write_text(json.dumps(manifest, indent=2))
+        os.replace(tmp_path, self.path / "manifest.json")
+
+
+def _read_manifest(path: Path) -> Dict[str, Any]:
+    return json.loads((path / "manifest.json").read_text())
+
+
+class ShardedNumpyArray:
+    """
+    Read-only access to a sharded numpy array written with ShardedNumpyWriter.
+
+    Shards are memory-mapped (see read_numpy), so only shards (and rows) that are
+    accessed are read from disk.
+    """
+
+    def __init__(self, path: Path):
+        assert path.suffix == ".shards"
+        assert (path / "manifest.json").is_file()
+
+        self.path = path
+        self.manifest = _read_manifest(path)
+
+        self._shard_nr_rows = np.array(
+            [shard["nr_rows"] for shard in self.manifest["shards"]], dtype=np.int64
+        )
+        # row offsets[k] is the global row index of the first row in shard k
+        self._offsets = np.concatenate([[0], np.cumsum(self._shard_nr_rows)])
+
+    @property
+    def nr_shards(self) -> int:
+        return len(self._shard_nr_rows)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype(self.manifest["dtype"])
+
+    @property
+    def shape(self) -> tuple:
+        return (len(self), *(self.manifest["row_shape"] or []))
+
+    def __len__(self) -> int:
+        return int(self._offsets[-1])
+
+    def read_shard(self, shard_nr: int):
+        return read_numpy(
+            self.path / self.manifest["shards"][shard_nr]["filename"], mmap=True
+        )
+
+    def iter_batches(self) -> Iterator[Any]:
+        """
+        Iterate over all rows in shard-sized batches (ie., one batch per shard)
+        """
+        for shard_nr in range(self.nr_shards):
+            yield self.read_shard(shard_nr)
+
+    def __getitem__(self, idx):
+        """
+        Random access to rows by global row index. The index can be an integer,
+        a slice, or a 1d array of integers (or a boolean mask).
+        """
+        if isinstance(idx, (int, np.integer)):
+            if not -len(self) <= idx < len(self):
+                raise IndexError(f"Row index {idx} out of range")
+
+            idx = idx % len(self)
+            shard_nr = int(np.searchsorted(self._offsets, idx, side="right")) - 1
+            return self.read_shard(shard_nr)[idx - self._offsets[shard_nr]]
+
+        if isinstance(idx, slice):
+            idxs = np.arange(len(self))[idx]
+        else:
+            idxs = np.arange(len(self))[np.asarray(idx)]
+
+        result = np.empty((len(idxs), *self.shape[1:]), dtype=self.dtype)
+        shard_nrs = np.searchsorted(self._offsets, idxs, side="right") - 1
+
+        # read requested rows shard by shard, but keep the requested row order
+        for shard_nr in np.unique(shard_nrs):
+            mask = shard_nrs == shard_nr
+            result[mask] = self.read_shard(shard_nr)[
+                idxs[mask] - self._offsets[shard_nr]
+            ]
+
+        return result
+
+    def to_numpy(self):
+        """
+        Read all rows into one in-memory numpy array
+        """
+        return self[:]
+
+
+def write_sharded_numpy(path: Path, numpy_obj, shard_size: int):
+    """
+    Write an (in-memory) numpy array as a sharded array, see ShardedNumpyWriter
+    """
+    with ShardedNumpyWriter(path, shard_size=shard_size) as writer:
+        writer.append(numpy_obj)
+
+
+def read_sharded_numpy(path: Path) -> ShardedNumpyArray:
+    return ShardedNumpyArray(path)
 
 
 # ---- onnx helpers for persisting and loading ml models, see https://onnx.ai ----
 
 
-def write_onnx(path: Path, model_onnx: onnx.onnx_ml_pb2.ModelProto):
+def write_onnx(path: Path, model_onnx: "onnx.ModelProto"):
     os.makedirs(path.parent, exist_ok=True)
 
     path.write_bytes(model_onnx.SerializeToString())
 
 
-def read_onnx(path: Path) -> InferenceSession:
-    assert path.is_file()
+@dataclass(frozen=True)
+class OnnxSessionOptions:
+    """
+    Options for creating an ONNX Runtime InferenceSession, see
+    https://onnxruntime.ai/docs/performance/tune-performance.html
+
+     - intra_op_num_threads/inter_op_num_threads: number of threads used within and
+       across operators (0 = ONNX Runtime default, ie. all cores). In a Ray task,
+       these should match the number of CPUs reserved for the task.
+     - execution_mode: "sequential" or "parallel"
+     - graph_optimization_level: "disabled", "basic", "extended" or "all"
+     - optimized_model_dir: if set, the optimized model is written to this directory,
+       and later sessions for the same model load the optimized model (without
+       running graph optimizations again). This should be a directory owned by the
+       task (eg. not the output directory of the task that wrote the model).
+
+    Optimized models can only be persisted up to level "extended", since level "all"
+    includes hardware specific optimizations, see
+    https://onnxruntime.ai/docs/performance/model-optimizations/graph-optimizations.html
+    """
+
+    intra_op_num_threads: int = 0
+    inter_op_num_threads: int = 0
+    execution_mode: str = "sequential"
+    graph_optimization_level: str = "all"
+    optimized_model_dir: Optional[str] = None
+
+    def __post_init__(self):
+        if self.optimized_model_dir is not None and (
+            self.graph_optimization_level not in ["basic", "extended"]
+        ):
+            raise ValueError(
+                "Optimized models can only be persisted with graph optimization "
+                "level basic or extended"
+            )
+
+    def to_session_options(self) -> "SessionOptions":
+        rt = _get_onnxruntime()
+
+        so = rt.SessionOptions()
+        so.intra_op_num_threads = self.intra_op_num_threads
+        so.inter_op_num_threads = self.inter_op_num_threads
+        so.execution_mode = {
+            "sequential": rt.ExecutionMode.ORT_SEQUENTIAL,
+            "parallel": rt.ExecutionMode.ORT_PARALLEL,
+        }[self.execution_mode]
+        so.graph_optimization_level = {
+            "disabled": rt.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            "basic": rt.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            "extended": rt.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            "all": rt.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        }[self.graph_optimization_level]
+
+        return so
+
+
+def optimized_onnx_path(
+    optimized_model_dir: Path, path: Path, content_hash: str, optimization_level: str
+):
+    """
+    Path of persisted optimized model, eg. model.onnx ->
+    <optimized_model_dir>/model.<hash>.opt-extended.onnx
+    """
+    return (
+        optimized_model_dir
+        / path.with_suffix(f".{content_hash[:16]}.opt-{optimization_level}.onnx").name
+    )
+
+
+# (sha256 digest of model file, session options)
+_SessionKey = Tuple[str, OnnxSessionOptions]
+
+
+class OnnxSessionFactory:
+    """
+    Create and memoize ONNX Runtime inference sessions.
+
+    Sessions are memoized by the content of the model file and session options. So,
+    if a model file is updated, a new session is created. At most max_sessions
+    sessions are kept (least recently used sessions are evicted).
+    """
+
+    def __init__(self, max_sessions: int = 8):
+        assert max_sessions > 0
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[_SessionKey, InferenceSession]" = OrderedDict()
+
+    def get(
+        self, path: Path, options: OnnxSessionOptions = OnnxSessionOptions()
+    ) -> "InferenceSession":
+        assert path.is_file()
+
+        # hashing the model is cheap compared to creating a session
+        model_bytes: bytes = path.read_bytes()
+        content_hash: str = hashlib.sha256(model_bytes).hexdigest()
+
+        key: _SessionKey = (content_hash, options)
+        if key in self._sessions:
+            self._sessions.move_to_end(key)
+            return self._sessions[key]
+
+        session = self._create_session(path, model_bytes, content_hash, options)
+
+        self._sessions[key] = session
+        if len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+        return session
+
+    def clear(self):
+        self._sessions.clear()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @staticmethod
+    def _create_session(
+        path: Path, model_bytes: bytes, content_hash: str, options: OnnxSessionOptions
+    ) -> "InferenceSession":
+        rt = _get_onnxruntime()
+        rt.set_seed(0)
+        so = options.to_session_options()
+
+        if options.optimized_model_dir is None:
+            return rt.InferenceSession(model_bytes, so)
+
+        optimized_path = optimized_onnx_path(
+            Path(options.optimized_model_dir),
+            path,
+            content_hash,
+            options.graph_optimization_level,
+        )
+        if optimized_path.is_file():
+            # graph is already optimized
+            so.graph_optimization_level = rt.GraphOptimizationLevel.ORT_DISABLE_ALL
+            return rt.InferenceSession(str(optimized_path), so)
+
+        # Write optimized model to temp file and rename, so that concurrent tasks
+        # never load a partially written model
+        os.makedirs(optimized_path.parent, exist_ok=True)
+        tmp_path = optimized_path.with_suffix(f".tmp-{os.getpid()}")
+        so.optimized_model_filepath = str(tmp_path)
+        session = rt.InferenceSession(model_bytes, so)
+        if tmp_path.is_file():
+            os.replace(tmp_path, optimized_path)
+
+        return session
+
+
+_onnx_session_factory = OnnxSessionFactory()
+
+
+def read_onnx(
+    path: Path, options: Optional[OnnxSessionOptions] = None
+) -> "InferenceSession":
+    """
+    Return (memoized) ONNX Runtime inference session for a model persisted with
+    write_onnx, see OnnxSessionFactory.
+    """
+    return _onnx_session_factory.get(path, options or OnnxSessionOptions())
+
+
+def convert_sklearn_to_onnx(model, input_name: str, nr_features: int):
+    """
+    Convert a sklearn classifier into an ONNX model. This is the standard model format
+    used in the pipeline:
+
+     - one float32 input tensor with shape (batch size, nr_features).
+     - outputs "output_label" (int64 tensor with shape (batch size,)) and
+       "output_probability" (float32 tensor with shape (batch size, nr classes)).
+
+    Note: by default skl2onnx wraps the probabilities in a ZipMap operator, that
+    returns one Python dict per row. This is disabled here.
+    """
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType, Int64TensorType
+
+    # None in FloatTensorType means batch size is unknown, see
+    # https://onnx.ai/sklearn-onnx/api_summary.html
+    return convert_sklearn(
+        model,
+        initial_types=[(input_name, FloatTensorType([None, nr_features]))],
+        final_types=[
+            ("output_label", Int64TensorType([None])),
+            ("output_probability", FloatTensorType([None, len(model.classes_)])),
+        ],
+        options={id(model): {"zipmap": False}},
+    )
+
+
+def run_onnx_classifier(
+    onnx_inference_session: "InferenceSession", X, batch_size: int = 1024
+):
+    """
+    Evaluate an ONNX classifier (converted with convert_sklearn_to_onnx) on rows of X,
+    in batches of at most batch_size rows.
+
+    Returns tuple with predicted labels and a (contiguous float32) array with
+    predicted probabilities. Outputs are written into arrays allocated once.
+    """
+    input_name: str = onnx_inference_session.get_inputs()[0].name
+
+    y_pred_labels = np.empty(len(X), dtype=np.int64)
+    y_pred_probs: Optional[Any] = None
+
+    offset = 0
+    for X_batch in chunkify(X, chunk_size=batch_size):
+        labels, probs = onnx_inference_session.run(
+            ["output_label", "output_probability"],
+            {input_name: np.ascontiguousarray(X_batch, dtype=np.float32)},
+        )
+
+        if y_pred_probs is None:
+            y_pred_probs = np.empty((len(X), probs.shape[1]), dtype=np.float32)
+
+        y_pred_labels[offset : offset + len(X_batch)] = labels
+        y_pred_probs[offset : offset + len(X_batch)] = probs
+        offset += len(X_batch)
 
-    rt.set_seed(0)
-    return rt.InferenceSession(path.read_bytes())
+    assert offset == len(X)
+    return y_pred_labels, y_pred_probs
 
 
-def get_onnx_inputs(onnx_inference_session: InferenceSession):
+def get_onnx_inputs(onnx_inference_session: "InferenceSession"):
     """
     Return a list describing the input parameters for an ONNX model
     """
@@ -67,7 +766,7 @@ def get_onnx_inputs(onnx_inference_session: InferenceSession):
     ]
 
 
-def get_onnx_outputs(onnx_inference_session: InferenceSession):
+def get_onnx_outputs(onnx_inference_session: "InferenceSession"):
     """
     Return a list describing the outputs from an ONNX model
     """
@@ -0,0 +1,412 @@
+"""
+Pool of pre-started Python kernels for evaluating notebook tasks.
+
+Starting a kernel, and importing numpy, sklearn, matplotlib, onnxruntime, etc. in it,
+is a large part of the runtime of short notebook tasks. With a kernel pool, kernels
+are started ahead of time (with these modules imported), and are leased by notebook
+tasks:
+
+ - a leased kernel is used by one task at a time.
+ - when a kernel is returned, its namespace is reset (%reset -f), open matplotlib
+   figures are closed, and profiling is stopped. Imported modules (sys.modules) are
+   kept.
+ - a kernel is shut down (and replaced) after max_uses leases, if it has died, or
+   if the task leasing it was killed (eg. by a timeout).
+
+The pool is run in a named Ray actor (see start_kernel_pool) started by the pipeline
+driver, and kernels are processes on the node of the actor.
+"""
+import os, uuid, threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+#
+import ray
+
+POOL_NAME = "mnist-demo-pipeline-kernel-pool"
+POOL_NAMESPACE = "pydar-ray-cluster"
+
+# Modules imported into kernels when they are started
+PRELOAD_MODULES = [
+    "numpy",
+    "pandas",
+    "sklearn",
+    "sklearn.svm",
+    "sklearn.metrics",
+    "sklearn.model_selection",
+    "matplotlib.pyplot",
+    "onnxruntime",
+    "pynb_dag_runner.tasks.task_opentelemetry_logging",
+    "common.io",
+]
+
+RESET_CODE = """
+import sys as _sys
+if "common.profiling" in _sys.modules:
+    _sys.modules["common.profiling"].stop_profiling()
+if "matplotlib.pyplot" in _sys.modules:
+    _sys.modules["matplotlib.pyplot"].close("all")
+del _sys
+get_ipython().run_line_magic("reset", "-f")
+"""
+
+
+def _preload_code(modules: List[str]) -> str:
+    return "\n".join(
+        [
+            "import importlib",
+            f"for _module in {modules!r}:",
+            "    try:",
+            "        importlib.import_module(_module)",
+            "    except ImportError:",
+            "        pass",
+        ]
+    )
+
+
+def _is_pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JupyterKernel:
+    """
+    Python kernel started with jupyter_client (as a child process of the caller)
+    """
+
+    def __init__(self, kernel_name: str = "python3", startup_timeout_s: float = 60):
+        from jupyter_client.manager import KernelManager
+
+        self.kernel_name = kernel_name
+        self.km = KernelManager(kernel_name=kernel_name)
+        self.km.start_kernel()
+
+        self.kc = self.km.client()
+        self.kc.start_channels()
+        self.kc.wait_for_ready(timeout=startup_timeout_s)
+
+    @property
+    def pid(self) -> int:
+        # jupyter_client >= 7 starts kernels with a provisioner
+        provisioner = getattr(self.km, "provisioner", None)
+        process = provisioner.process if provisioner is not None else self.km.kernel
+        return process.pid
+
+    def execute(self, code: str, timeout_s: float = 60):
+        reply = self.kc.execute_interactive(
+            code, timeout=timeout_s, output_hook=lambda msg: None
+        )
+        if reply["content"]["status"] != "ok":
+            raise Exception(f"Kernel execution failed: {reply['content']}")
+
+    def connection_info(self) -> Dict[str, Any]:
+        return self.km.get_connection_info(session=False)
+
+    def is_alive(self) -> bool:
+        return self.km.is_alive()
+
+    def shutdown(self):
+        self.kc.stop_channels()
+        self.km.shutdown_kernel(now=True)
+
+
+@dataclass
+class _PooledKernel:
+    kernel_id: str
+    kernel: Any
+    nr_uses: int = 0
+    lessee_pid: Optional[int] = None
+
+
+class KernelPool:
+    """
+    Pool of (at least) size kernels with preload_modules imported, see module
+    docstring. If all kernels are leased, new kernels are started on demand, and
+    kernels in excess of size are shut down when they are returned.
+
+    start_kernel creates a started kernel (default: JupyterKernel).
+    """
+
+    def __init__(
+        self,
+        size: int,
+        max_uses: int,
+        preload_modules: List[str] = PRELOAD_MODULES,
+        start_kernel: Callable[[], Any] = JupyterKernel,
+    ):
+        assert size >= 0
+        assert max_uses > 0
+
+        self.size = size
+        self.max_uses = max_uses
+        self.preload_modules = preload_modules
+        self._start_kernel = start_kernel
+
+        self._cv = threading.Condition()
+        self._idle: List[_PooledKernel] = []
+        self._leased: Dict[str, _PooledKernel] = {}
+        self._nr_starting = 0
+
+        # statistics (for tests and logging)
+        self.nr_started = 0
+        self.nr_retired = 0
+
+        for _ in range(size):
+            self._start_in_background()
+
+    def _new_kernel(self) -> _PooledKernel:
+        kernel = self._start_kernel()
+        try:
+            kernel.execute(_preload_code(self.preload_modules))
+            kernel.execute(RESET_CODE)
+        except BaseException:
+            kernel.shutdown()
+            raise
+
+        with self._cv:
+            self.nr_started += 1
+        return _PooledKernel(kernel_id=str(uuid.uuid4()), kernel=kernel)
+
+    def _start_in_background(self):
+        def start():
+            try:
+                pooled_kernel: Optional[_PooledKernel] = self._new_kernel()
+            except Exception as e:
+                print(f"Failed to start kernel for pool: {e}")
+                pooled_kernel = None
+
+            with self._cv:
+                self._nr_starting -= 1
+                if pooled_kernel is not None:
+                    self._idle.append(pooled_kernel)
+                self._cv.notify_all()
+
+        with self._cv:
+            self._nr_starting += 1
+        threading.Thread(target=start, daemon=True).start()
+
+    def _retire(self, pooled_kernel: _PooledKernel):
+        """
+        Shut down kernel, and start a replacement if the pool has fewer than size
+        kernels
+        """
+        try:
+            pooled_kernel.kernel.shutdown()
+        except Exception as e:
+            print(f"Failed to shut down kernel: {e}")
+
+        with self._cv:
+            self.nr_retired += 1
+            nr_kernels = len(self._idle) + len(self._leased) + self._nr_starting
+
+        if nr_kernels < self.size:
+            self._start_in_background()
+
+    def _reap_abandoned_leases(self):
+        """
+        Retire kernels leased by processes that no longer exist. The notebook run in
+        these kernels may still be running (eg. after a timeout).
+        """
+        with self._cv:
+            abandoned = [
+                pooled_kernel
+                for pooled_kernel in self._leased.values()
+                if pooled_kernel.lessee_pid is not None
+                and not _is_pid_alive(pooled_kernel.lessee_pid)
+            ]
+            for pooled_kernel in abandoned:
+                del self._leased[pooled_kernel.kernel_id]
+
+        for pooled_kernel in abandoned:
+            self._retire(pooled_kernel)
+
+    def lease(self, lessee_pid: int, cwd: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Lease a kernel for the process lessee_pid, and change the working directory
+        of the kernel to cwd.
+
+        Returns dict with kernel_id (for release), the kernel's connection info,
+        kernel name and process id.
+        """
+        self._reap_abandoned_leases()
+
+        with self._cv:
+            # wait for kernels being started, rather than starting another one
+            self._cv.wait_for(lambda: len(self._idle) > 0 or self._nr_starting == 0)
+            pooled_kernel = self._idle.pop(0) if len(self._idle) > 0 else None
+
+        if pooled_kernel is None:
+            pooled_kernel = self._new_kernel()
+
+        if cwd is not None:
+            try:
+                pooled_kernel.kernel.execute(f"import os; os.chdir({cwd!r}); del os")
+            except BaseException:
+                self._retire(pooled_kernel)
+                raise
+
+        with self._cv:
+            pooled_kernel.lessee_pid = lessee_pid
+            self._leased[pooled_kernel.kernel_id] = pooled_kernel
+
+        return {
+            "kernel_id": pooled_kernel.kernel_id,
+            "connection_info": pooled_kernel.kernel.connection_info(),
+            "kernel_name": getattr(pooled_kernel.kernel, "kernel_name", "python3"),
+            "pid": pooled_kernel.kernel.pid,
+        }
+
+    def release(self, kernel_id: str):
+        """
+        Return a leased kernel to the pool. Its namespace is reset, or the kernel is
+        retired (after max_uses leases, or if it is not alive).
+        """
+        with self._cv:
+            pooled_kernel = self._leased.pop(kernel_id, None)
+        if pooled_kernel is None:
+            # eg. lease was reaped
+            return
+
+        pooled_kernel.nr_uses += 1
+        pooled_kernel.lessee_pid = None
+
+        reusable = pooled_kernel.nr_uses < self.max_uses
+        if reusable:
+            try:
+                reusable = pooled_kernel.kernel.is_alive()
+                if reusable:
+                    pooled_kernel.kernel.execute(RESET_CODE)
+            except Exception:
+                reusable = False
+
+        with self._cv:
+            if reusable and len(self._idle) < self.size:
+                self._idle.append(pooled_kernel)
+                self._cv.notify_all()
+                return
+
+        self._retire(pooled_kernel)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cv:
+            return {
+                "nr_idle": len(self._idle),
+                "nr_leased": len(self._leased),
+                "nr_starting": self._nr_starting,
+                "nr_started": self.nr_started,
+                "nr_retired": self.nr_retired,
+            }
+
+    def shutdown(self):
+        with self._cv:
+            pooled_kernels = self._idle + list(self._leased.values())
+            self._idle, self._leased = [], {}
+
+        for pooled_kernel in pooled_kernels:
+            pooled_kernel.kernel.shutdown()
+
+
+# ---- kernel pool in a Ray actor ----
+
+
+def start_kernel_pool(size: int, max_uses: int):
+    """
+    Start the kernel pool actor. Should be called by the pipeline driver after the Ray
+    cluster is started. Kernels are shut down when the driver exits.
+    """
+    return (
+        ray.remote(KernelPool)
+        .options(  # type: ignore
+            name=POOL_NAME,
+            namespace=POOL_NAMESPACE,
+            num_cpus=0,
+            # leases and releases from concurrent tasks
+            max_concurrency=32,
+        )
+        .remote(size=size, max_uses=max_uses)
+    )
+
+
+def _get_kernel_pool():
+    return ray.get_actor(POOL_NAME, namespace=POOL_NAMESPACE)
+
+
+def _leased_kernel_manager(lease: Dict[str, Any]):
+    """
+    Return jupyter_client KernelManager for a leased kernel. The kernel is owned by
+    the pool, and is not started or shut down by the kernel manager.
+
+    The kernel manager has no kernel process (has_kernel is False), so nbclient calls
+    start_kernel (a no-op) and then creates a kernel client from the connection info
+    of the leased kernel.
+    """
+    from jupyter_client.manager import KernelManager
+
+    class LeasedKernelManager(KernelManager):
+        def start_kernel(self, **kwargs):
+            pass
+
+        def is_alive(self) -> bool:
+            return _is_pid_alive(lease["pid"])
+
+        def shutdown_kernel(self, now=False, restart=False):
+            pass
+
+    km = LeasedKernelManager(kernel_name=lease["kernel_name"])
+    km.load_connection_info(lease["connection_info"])
+    return km
+
+
+@contextmanager
+def leased_kernel(cwd: Optional[Path] = None):
+    """
+    Lease a kernel from the kernel pool (see start_kernel_pool), and return a kernel
+    manager that can be passed to papermill (see evaluate_notebook_in_kernel).
+    """
+    pool = _get_kernel_pool()
+    lease = ray.get(pool.lease.remote(os.getpid(), None if cwd is None else str(cwd)))
+    try:
+        yield _leased_kernel_manager(lease)
+    finally:
+        ray.get(pool.release.remote(lease["kernel_id"]))
+
+
+def evaluate_notebook_in_kernel(notebook, output, parameters: Dict[str, Any], km):
+    """
+    Evaluate a Jupytext notebook and inject parameters (as JupytextNotebook.evaluate
+    in pynb-dag-runner), but in a running kernel (see leased_kernel).
+    """
+    import papermill
+    from pynb_dag_runner.notebooks_helpers import JupyterIpynbNotebook
+
+    tmp_notebook_ipynb = JupyterIpynbNotebook.temp(output.filepath.parent)
+    try:
+        notebook.to_ipynb(output=tmp_notebook_ipynb)
+
+        papermill.execute_notebook(
+            input_path=tmp_notebook_ipynb.filepath,
+            output_path=output.filepath,
+            parameters=parameters,
+            request_save_on_cell_execute=True,
+            kernel_name="python",
+            language="python",
+            progress_bar=True,
+            stdout_file=None,
+            stderr_file=None,
+            log_output=True,
+            cwd=notebook.filepath.parent,
+            km=km,
+        )
+    except BaseException as e:
+        # Papermill exceptions can not be deserialized by Ray (as in pynb-dag-runner)
+        raise Exception(str(e))
+    finally:
+        if tmp_notebook_ipynb.filepath.is_file():
+            os.remove(tmp_notebook_ipynb.filepath)
@@ -0,0 +1,819 @@
+"""
+Run a pipeline DAG in the driver process, without starting a Ray cluster.
+
+task_from_python_function, run_in_sequence, fan_in and start_and_await_tasks below
+can be used in place of the functions with the same names in
+pynb_dag_runner.core.dag_runner. Tasks log the same OpenTelemetry spans
+(execute-task, retry-wrapper, retry-call, timeout-guard, call-python-function and
+task-dependency) with the same attributes. So the spans of a pipeline run can be
+reported on in the same way.
+
+Each task is run in a thread of the driver, and each call of the task function is
+run in a child process (so calls that exceed the timeout can be terminated). Tasks
+reserve num_cpus cores of the machine while their function is called.
+
+Tasks can optionally be run with hedged retries (see task_from_python_function):
+when an attempt is slow, a duplicate attempt is started in parallel (with the next
+retry number), the first successful attempt wins, and the other attempt is cancelled.
+
+When more tasks are ready than there are free cores, tasks are dispatched in the
+order they became ready, or by critical path length (see set_scheduling).
+
+Spans are written to <spans_dir>/<pid>.txt (one JSON span per line) by each process,
+as with Ray's ray.util.tracing.setup_local_tmp_tracing, see setup_tracing.
+"""
+import os, sys, time, math, queue, signal, itertools, threading, contextvars
+import multiprocessing, subprocess
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+#
+from opentelemetry import baggage, context, trace
+from opentelemetry.trace import StatusCode, Status  # type: ignore
+
+#
+from common.logging import setup_tracing, traced_spans_dir
+
+A = TypeVar("A")
+
+# Seconds a timed out function call is given to exit (eg. to shut down a notebook
+# kernel) before it is killed
+TERMINATE_GRACE_PERIOD_S = 5.0
+
+# Interval for checking if a running function call has been cancelled
+CANCEL_POLL_INTERVAL_S = 0.1
+
+
+# ---- OpenTelemetry helpers ----
+
+
+def _get_span_hexid(span) -> str:
+    # as get_span_hexid in pynb-dag-runner
+    return "0x" + trace.format_span_id(span.get_span_context().span_id)
+
+
+def _add_baggage(key: str, value: Any):
+    _ = context.attach(baggage.set_baggage(key, value))
+
+
+# ---- cores reserved by running tasks ----
+
+
+# Request for cores: (-priority, request nr, num_cpus)
+_CpuRequest = Tuple[float, int, float]
+
+
+class _CpuPool:
+    """
+    Cores of the machine. Waiting requests are granted in order of decreasing
+    priority (and in request order for equal priorities): the first waiting request
+    that fits in the free cores is granted.
+
+    No requests are granted while the pool is held (see hold). So requests of tasks
+    that become ready at the same time are all registered before one is granted.
+    """
+
+    def __init__(self, nr_cpus: float):
+        assert nr_cpus > 0
+        self.nr_cpus = nr_cpus
+        self._available = nr_cpus
+        self._cv = threading.Condition()
+        self._waiting: List[_CpuRequest] = []
+        self._request_nrs = itertools.count()
+        self._nr_holds = 0
+
+    def _next_granted(self) -> Optional[_CpuRequest]:
+        if self._nr_holds > 0:
+            return None
+        for request in sorted(self._waiting):
+            if request[2] <= self._available:
+                return request
+        return None
+
+    @contextmanager
+    def hold(self):
+        with self._cv:
+            self._nr_holds += 1
+        try:
+            yield
+        finally:
+            with self._cv:
+                self._nr_holds -= 1
+                self._cv.notify_all()
+
+    def request(self, num_cpus: float, priority: float = 0.0) -> _CpuRequest:
+        """
+        Register request for cores, see wait
+        """
+        # tasks requesting more cores than available on the machine run alone
+        request = (-priority, next(self._request_nrs), min(num_cpus, self.nr_cpus))
+        with self._cv:
+            self._waiting.append(request)
+            self._cv.notify_all()
+        return request
+
+    def wait(self, request: _CpuRequest) -> float:
+        """
+        Wait until request is granted, and return the number of reserved cores
+        """
+        with self._cv:
+            self._cv.wait_for(lambda: self._next_granted() == request)
+            self._waiting.remove(request)
+            self._available -= request[2]
+
+            # other requests may still fit
+            self._cv.notify_all()
+        return request[2]
+
+    def withdraw(self, request: _CpuRequest):
+        """
+        Remove request if it has not been granted
+        """
+        with self._cv:
+            if request in self._waiting:
+                self._waiting.remove(request)
+                self._cv.notify_all()
+
+    def acquire(self, num_cpus: float, priority: float = 0.0) -> float:
+        return self.wait(self.request(num_cpus, priority))
+
+    def release(self, num_cpus: float):
+        with self._cv:
+            self._available += num_cpus
+            self._cv.notify_all()
+
+
+_CPU_POOL = _CpuPool(float(os.cpu_count() or 1))
+
+
+# ---- scheduling of tasks waiting for cores ----
+
+# Estimated duration of tasks without a duration estimate
+DEFAULT_TASK_DURATION_S = 1.0
+
+SCHEDULING_MODES = ["fifo", "critical-path"]
+
+_SCHEDULING: Dict[str, Any] = {
+    "mode": "fifo",
+    "estimate_duration_s": lambda attributes: None,
+}
+
+
+def set_scheduling(
+    mode: str,
+    estimate_duration_s: Callable[[Mapping[str, Any]], Optional[float]] = (
+        lambda attributes: None
+    ),
+):
+    """
+    Set the order in which tasks waiting for cores are started:
+
+     - "fifo": in the order the tasks became ready to run.
+     - "critical-path": by decreasing critical path length, ie., the estimated
+       duration of the task and of its longest chain of downstream tasks. So tasks
+       on the longest chain to the end of the pipeline are started first, and leaf
+       tasks (like eda) run when cores are free.
+
+    estimate_duration_s returns the estimated duration of a task from its attributes
+    (eg. from durations in previous pipeline runs, see common.timeout_policy), or
+    None if there is no estimate (then DEFAULT_TASK_DURATION_S is used).
+
+    Should be called before tasks are started.
+    """
+    if mode not in SCHEDULING_MODES:
+        raise ValueError(f"Unknown scheduling mode {mode}")
+
+    _SCHEDULING["mode"] = mode
+    _SCHEDULING["estimate_duration_s"] = estimate_duration_s
+
+
+# ---- function calls with timeout in new processes ----
+
+
+class AttemptCancelled(Exception):
+    """
+    A call of a task function was cancelled, since a parallel (hedged) attempt of the
+    task succeeded
+    """
+
+
+def _stop_process(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(TERMINATE_GRACE_PERIOD_S)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def _sigterm_handler(signum, frame):
+    # raise SystemExit, so eg. a running notebook kernel is shut down
+    sys.exit(1)
+
+
+def _process_main(conn_fd: int):
+    """
+    Entry point of the process of a task function call, see _call_in_process
+    """
+    from multiprocessing.connection import Connection
+    import cloudpickle
+
+    signal.signal(signal.SIGTERM, _sigterm_handler)
+
+    conn = Connection(conn_fd)
+    f, arg, num_cpus, spans_dir, span_context, baggage_items = cloudpickle.loads(
+        conn.recv_bytes()
+    )
+
+    # the process does not inherit the tracing setup and context of the caller
+    if spans_dir is not None:
+        setup_tracing(spans_dir)
+    ctx = trace.set_span_in_context(trace.NonRecordingSpan(span_context))
+    for k, v in baggage_items.items():
+        ctx = baggage.set_baggage(k, v, ctx)
+    _ = context.attach(ctx)
+
+    tracer = trace.get_tracer(__name__)
+    with tracer.start_as_current_span("call-python-function") as span:
+        span.set_attribute("task.num_cpus", num_cpus)
+        _add_baggage("task.num_cpus", num_cpus)
+
+        try:
+            result: Tuple[Any, Optional[BaseException]] = (f(arg), None)
+            span.set_status(Status(StatusCode.OK))
+        except BaseException as e:
+            result = (None, e)
+            span.record_exception(e)
+            span.set_status(Status(StatusCode.ERROR, "Failure"))
+
+    try:
+        conn.send(result)
+    except Exception as e:
+        # eg. return value or exception can not be pickled
+        conn.send((None, Exception(f"{result[1] or e!r}")))
+
+
+# Command run by the process of a task function call (with arguments: file
+# descriptor of connection to the caller, and the sys.path of the caller)
+_PROCESS_MAIN_CODE = (
+    "import sys; sys.path = sys.argv[2:]; "
+    "from common.local_executor import _process_main; "
+    "_process_main(int(sys.argv[1]))"
+)
+
+
+def _call_in_process(
+    f: Callable[[Any], Any],
+    arg: Any,
+    num_cpus: float,
+    timeout_s: Optional[float],
+    cancel: Optional[threading.Event] = None,
+) -> Tuple[bool, Any, Optional[BaseException]]:
+    """
+    Call f(arg) in a new Python process (in a call-python-function span), and return
+    tuple (is_timeout, return value, exception).
+
+    The process is not forked from the caller, since the driver runs one thread per
+    task (and locks held by other threads would be copied in a locked state). It is
+    also not started with multiprocessing's spawn or forkserver methods, since these
+    import the main module (the driver) in the new process. So, f and arg are sent to
+    the process pickled with cloudpickle (as for tasks run on Ray), and f can eg. be a
+    closure or a lambda.
+
+    If the cancel event is set before the call has finished, the process is stopped
+    and an AttemptCancelled exception is returned.
+    """
+    import cloudpickle
+
+    recv_conn, child_conn = multiprocessing.Pipe()
+    process = subprocess.Popen(
+        [sys.executable, "-c", _PROCESS_MAIN_CODE, str(child_conn.fileno())] + sys.path,
+        pass_fds=[child_conn.fileno()],
+    )
+    child_conn.close()
+
+    recv_conn.send_bytes(
+        cloudpickle.dumps(
+            (
+                f,
+                arg,
+                num_cpus,
+                traced_spans_dir(),
+                trace.get_current_span().get_span_context(),
+                dict(baggage.get_all()),
+            )
+        )
+    )
+
+    deadline_s: Optional[float] = (
+        None if timeout_s is None else time.monotonic() + timeout_s
+    )
+
+    def remaining_s() -> Optional[float]:
+        return None if deadline_s is None else max(0.0, deadline_s - time.monotonic())
+
+    try:
+        while True:
+            poll_s = remaining_s()
+            if cancel is not None and (
+                poll_s is None or poll_s > CANCEL_POLL_INTERVAL_S
+            ):
+                poll_s = CANCEL_POLL_INTERVAL_S
+
+            if recv_conn.poll(poll_s):
+                break
+            if cancel is not None and cancel.is_set():
+                _stop_process(process)
+                return False, None, AttemptCancelled("Cancelled")
+            if remaining_s() == 0.0:
+                _stop_process(process)
+                return True, None, None
+
+        try:
+            value, error = recv_conn.recv()
+        except EOFError:
+            # process exited without sending a result (eg. it was killed)
+            process.wait()
+            value, error = None, Exception(f"Process exited with {process.returncode}")
+
+        process.wait()
+        return False, value, error
+    finally:
+        recv_conn.close()
+
+
+# ---- tasks ----
+
+# All started tasks (see start_and_await_tasks)
+_STARTED_TASKS: List["LocalTask"] = []
+_STARTED_TASKS_LOCK = threading.Lock()
+
+
+@dataclass(frozen=True, eq=True)
+class TaskOutcome(Generic[A]):
+    # as TaskOutcome in pynb_dag_runner.core.dag_runner
+    span_id: str
+    return_value: Optional[A]
+    error: Optional[BaseException]
+
+
+class LocalTask:
+    """
+    Task that can be run once, see task_from_python_function
+    """
+
+    def __init__(
+        self,
+        f: Callable[[Any], Any],
+        num_cpus: float,
+        max_nr_retries: int,
+        timeout_s: Optional[float],
+        attributes: Dict[str, Any],
+        hedge_after_s: Optional[float] = None,
+        hedge_quantile: float = 0.9,
+        hedge_durations_s: List[float] = [],
+    ):
+        assert max_nr_retries > 0
+        assert hedge_after_s is None or hedge_after_s >= 0
+        assert 0 < hedge_quantile <= 1
+
+        self.f = f
+        self.num_cpus = num_cpus
+        self.max_nr_retries = max_nr_retries
+        self.timeout_s = timeout_s
+        self.attributes = attributes
+        self.hedge_after_s = hedge_after_s
+        self.hedge_quantile = hedge_quantile
+        self.hedge_durations_s = sorted(hedge_durations_s)
+
+        self._lock = threading.Lock()
+        self._started = False
+        self._on_complete_callbacks: List[Callable[[TaskOutcome], None]] = []
+        # tasks started when this task completes (see run_in_sequence, fan_in)
+        self._successors: List["LocalTask"] = []
+        self._critical_path_s: Optional[float] = None
+        self._cpu_request: Optional[_CpuRequest] = None
+        self._span_id: Optional[str] = None
+        self._span_id_set = threading.Event()
+        self._result: Optional[TaskOutcome] = None
+        self._result_set = threading.Event()
+        self._done = threading.Event()
+
+    def add_callback(self, cb: Callable[[TaskOutcome], None]):
+        """
+        Add function called with the task outcome when the task has completed. Can
+        only be called before the task is started.
+        """
+        with self._lock:
+            if self._started:
+                raise Exception("Cannot add callbacks once task has started")
+            self._on_complete_callbacks.append(cb)
+
+    def start(self, arg: Any):
+        """
+        Start task in a new thread. Only the first call starts the task.
+        """
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        with _STARTED_TASKS_LOCK:
+            _STARTED_TASKS.append(self)
+
+        # cores are requested when the task becomes ready (see _CpuPool.hold)
+        self._cpu_request = _CPU_POOL.request(self.num_cpus, self._priority())
+
+        # run in a new (empty) context; execute-task spans are top level spans
+        thread = threading.Thread(
+            target=contextvars.Context().run, args=(self._run, arg), daemon=True
+        )
+        thread.start()
+
+    def has_started(self) -> bool:
+        return self._started
+
+    def has_completed(self) -> bool:
+        return self._result_set.is_set()
+
+    def get_span_id(self) -> str:
+        self._span_id_set.wait()
+        assert self._span_id is not None
+        return self._span_id
+
+    def get_task_result(self, timeout_s: Optional[float] = None) -> TaskOutcome:
+        if not self._result_set.wait(timeout_s):
+            raise TimeoutError("Task did not complete within timeout")
+        assert self._result is not None
+        return self._result
+
+    def wait_done(self, timeout_s: Optional[float] = None) -> bool:
+        """
+        Wait until the task has completed and all callbacks have returned
+        """
+        return self._done.wait(timeout_s)
+
+    def _timeout_guard(
+        self, arg: Any, cancel: threading.Event
+    ) -> Tuple[bool, Any, Optional[BaseException]]:
+        tracer = trace.get_tracer(__name__)
+        with tracer.start_as_current_span("timeout-guard") as span:
+            span.set_attribute("task.timeout_s", self.timeout_s)  # type: ignore
+            _add_baggage("task.timeout_s", self.timeout_s)
+
+            is_timeout, value, error = _call_in_process(
+                self.f, arg, self.num_cpus, self.timeout_s, cancel
+            )
+
+            if is_timeout:
+                span.set_status(Status(StatusCode.ERROR, "Timeout"))
+                return (
+                    True,
+                    None,
+                    Exception(
+                        "Timeout error: execution did not finish within timeout limit"
+                    ),
+                )
+
+            if isinstance(error, AttemptCancelled):
+                span.set_status(Status(StatusCode.ERROR, "Cancelled"))
+            else:
+                span.set_status(Status(StatusCode.OK))
+            return False, value, error
+
+    def _attempt(
+        self,
+        retry_nr: int,
+        is_hedge: bool,
+        arg: Any,
+        cancel: threading.Event,
+        results: "queue.Queue[Tuple[Any, Optional[BaseException]]]",
+    ):
+        """
+        Call task function (in a retry-call span), and put tuple (return value,
+        exception) on the results queue.
+        """
+        tracer = trace.get_tracer(__name__)
+        with tracer.start_as_current_span("retry-call") as span:
+            _add_baggage("run.retry_nr", retry_nr)
+            span.set_attribute("run.retry_nr", retry_nr)
+            if is_hedge:
+                span.set_attribute("run.hedged", True)
+
+            try:
+                _, value, error = self._timeout_guard(arg, cancel)
+            except BaseException as e:
+                value, error = None, e
+
+            if error is None:
+                span.set_status(Status(StatusCode.OK))
+            elif isinstance(error, AttemptCancelled):
+                span.set_status(Status(StatusCode.ERROR, "Cancelled"))
+            else:
+                span.set_status(Status(StatusCode.ERROR, "Run failed"))
+
+        results.put((value, error))
+
+    def _hedge_delay_s(self) -> Optional[float]:
+        """
+        Return seconds after which a duplicate (hedged) attempt is started, when the
+        last started attempt has not finished. This is the hedge_quantile of the
+        durations of successful attempts in previous runs (hedge_durations_s), or
+        hedge_after_s if there are none.
+
+        Durations of attempts in the current run are not used, since these are
+        failed attempts (eg. quick failures would make the delay too short).
+        """
+        if self.hedge_after_s is None or len(self.hedge_durations_s) == 0:
+            return self.hedge_after_s
+
+        idx = math.ceil(self.hedge_quantile * len(self.hedge_durations_s)) - 1
+        return self.hedge_durations_s[idx]
+
+    def critical_path_s(self) -> float:
+        """
+        Return estimated duration of this task and of its longest chain of
+        successor tasks (see set_scheduling)
+        """
+        if self._critical_path_s is None:
+            duration_s = _SCHEDULING["estimate_duration_s"](self.attributes)
+            self._critical_path_s = (
+                DEFAULT_TASK_DURATION_S if duration_s is None else duration_s
+            ) + max([t.critical_path_s() for t in self._successors], default=0.0)
+
+        return self._critical_path_s
+
+    def _priority(self) -> float:
+        if _SCHEDULING["mode"] == "critical-path":
+            return self.critical_path_s()
+        return 0.0
+
+    def _retry(self, arg: Any) -> Tuple[Any, Optional[BaseException]]:
+        tracer = trace.get_tracer(__name__)
+        with tracer.start_as_current_span("retry-wrapper") as top_span:
+            _add_baggage("task.max_nr_retries", self.max_nr_retries)
+            top_span.set_attribute("task.max_nr_retries", self.max_nr_retries)
+            hedge_delay_s: Optional[float] = self._hedge_delay_s()
+            if hedge_delay_s is not None:
+                top_span.set_attribute("task.hedge_after_s", self.hedge_after_s)
+                top_span.set_attribute("task.hedge_quantile", self.hedge_quantile)
+                top_span.set_attribute("task.hedge_delay_s", hedge_delay_s)
+
+            # with hedging, at most two attempts run in parallel
+            max_nr_parallel: int = 1 if hedge_delay_s is None else 2
+
+            results: "queue.Queue[Tuple[Any, Optional[BaseException]]]" = queue.Queue()
+            cancel = threading.Event()
+            attempts: List[threading.Thread] = []
+            last_start_s: float = 0.0
+
+            def start_attempt(is_hedge: bool):
+                nonlocal last_start_s
+
+                # attempts are run in (copies of) the retry-wrapper span context
+                thread = threading.Thread(
+                    target=contextvars.copy_context().run,
+                    args=(self._attempt, len(attempts), is_hedge, arg, cancel, results),
+                    daemon=True,
+                )
+                attempts.append(thread)
+                last_start_s = time.monotonic()
+                thread.start()
+
+            # cores are reserved for all attempts of the task. So a hedged attempt
+            # does not wait for the cores of the (likely stuck) attempt it duplicates
+            assert self._cpu_request is not None
+            top_span.set_attribute("task.scheduling_priority", -self._cpu_request[0])
+            num_cpus = _CPU_POOL.wait(self._cpu_request)
+
+            start_attempt(is_hedge=False)
+            nr_running: int = 1
+            value, error = None, None
+
+            while nr_running > 0:
+                wait_s: Optional[float] = None
+                if nr_running < max_nr_parallel and len(attempts) < self.max_nr_retries:
+                    assert hedge_delay_s is not None
+                    wait_s = max(0.0, last_start_s + hedge_delay_s - time.monotonic())
+
+                try:
+                    value, error = results.get(timeout=wait_s)
+                except queue.Empty:
+                    start_attempt(is_hedge=True)
+                    nr_running += 1
+                    continue
+
+                nr_running -= 1
+                if error is None:
+                    break
+
+                # retry failed attempt at once (also when a hedged attempt is running)
+                if len(attempts) < self.max_nr_retries:
+                    start_attempt(is_hedge=False)
+                    nr_running += 1
+
+            # cancel attempts that are still running, and wait until their spans
+            # have ended
+            cancel.set()
+            for attempt in attempts:
+                attempt.join()
+            _CPU_POOL.release(num_cpus)
+
+            if error is None:
+                top_span.set_status(Status(StatusCode.OK))
+                return value, None
+
+            top_span.set_status(
+                Status(
+                    StatusCode.ERROR,
+                    f"Function called retried {self.max_nr_retries} times; all failed!",
+                )
+            )
+            return None, error
+
+    def _run(self, arg: Any):
+        tracer = trace.get_tracer(__name__)
+        with tracer.start_as_current_span("execute-task") as span:
+            self._span_id = _get_span_hexid(span)
+            self._span_id_set.set()
+
+            try:
+                for k, v in self.attributes.items():
+                    span.set_attribute(k, v)
+
+                value, error = self._retry(arg)
+            except BaseException as e:
+                value, error = None, e
+            finally:
+                assert self._cpu_request is not None
+                _CPU_POOL.withdraw(self._cpu_request)
+
+            if error is None:
+                span.set_status(Status(StatusCode.OK))
+            else:
+                span.record_exception(error)
+                span.set_status(Status(StatusCode.ERROR, "Remote function call failed"))
+
+        # note that result is set before callbacks are called
+        self._result = TaskOutcome(
+            span_id=self._span_id, return_value=value, error=error
+        )
+        self._result_set.set()
+
+        try:
+            # successors started by callbacks are dispatched by priority
+            with _CPU_POOL.hold():
+                for cb in self._on_complete_callbacks:
+                    cb(self._result)
+        finally:
+            self._done.set()
+
+
+def task_from_python_function(
+    f: Callable[[Any], Any],
+    num_cpus: float = 1,
+    max_nr_retries: int = 1,
+    timeout_s: Optional[float] = None,
+    attributes: Dict[str, Any] = {},
+    task_type: str = "Python",
+    hedge_after_s: Optional[float] = None,
+    hedge_quantile: float = 0.9,
+    hedge_durations_s: List[float] = [],
+) -> LocalTask:
+    """
+    Lift a Python function f into a task (as task_from_python_function in
+    pynb-dag-runner)
+
+    hedge_after_s: if set, a retry is also started when the last started attempt has
+    not finished after hedge_after_s seconds. If durations of successful attempts of
+    the task in previous runs are given (hedge_durations_s, eg. from
+    common.timeout_policy.TaskDurationHistory), the retry is instead started after
+    the hedge_quantile of these durations. At most two attempts run in parallel, and
+    at most max_nr_retries attempts are made in total. When an attempt succeeds, the
+    other attempt is cancelled. Each attempt is logged in a retry-call span; hedged
+    attempts have attribute run.hedged=True.
+    """
+    if "task_type" in attributes:
+        raise ValueError("task_type key should not be included in tags")
+
+    return LocalTask(
+        f=f,
+        num_cpus=num_cpus,
+        max_nr_retries=max_nr_retries,
+        timeout_s=timeout_s,
+        attributes={**attributes, "task.task_type": task_type},
+        hedge_after_s=hedge_after_s,
+        hedge_quantile=hedge_quantile,
+        hedge_durations_s=hedge_durations_s,
+    )
+
+
+def _log_task_dependency(from_span_id: str, to_span_id: str):
+    tracer = trace.get_tracer(__name__)
+    with tracer.start_as_current_span("task-dependency") as span:
+        span.set_attribute("from_task_span_id", from_span_id)
+        span.set_attribute("to_task_span_id", to_span_id)
+
+
+def run_in_sequence(*tasks: LocalTask):
+    """
+    Execute tasks in sequence. The outcome of each task is passed as the argument to
+    the next task in the sequence.
+    """
+    if len(tasks) <= 1:
+        raise ValueError("Need at least two input tasks")
+
+    for task1, task2 in zip(tasks[:-1], tasks[1:]):
+
+        def on_complete(outcome: TaskOutcome, task1=task1, task2=task2):
+            task2.start(outcome)
+            _log_task_dependency(task1.get_span_id(), task2.get_span_id())
+
+        task1.add_callback(on_complete)
+        task1._successors.append(task2)
+
+
+def fan_in(parallel_tasks: List[LocalTask], target_task: LocalTask):
+    """
+    Start target_task (with a list of the outcomes of parallel_tasks) when all tasks
+    in parallel_tasks have completed.
+    """
+    if len(parallel_tasks) == 0:
+        raise ValueError("Called with zero length task list.")
+
+    if target_task in parallel_tasks:
+        raise ValueError("Task listed in both arguments of fan_in")
+
+    lock = threading.Lock()
+    completed_tasks: List[LocalTask] = []
+
+    for task in parallel_tasks:
+
+        def on_complete(outcome: TaskOutcome, task=task):
+            with lock:
+                completed_tasks.append(task)
+                if len(completed_tasks) < len(parallel_tasks):
+                    return
+
+            target_task.start([t.get_task_result() for t in parallel_tasks])
+            for completed_task in completed_tasks:
+                _log_task_dependency(
+                    completed_task.get_span_id(), target_task.get_span_id()
+                )
+
+        task.add_callback(on_complete)
+        task._successors.append(target_task)
+
+
+def start_and_await_tasks(
+    tasks_to_start: List[LocalTask],
+    tasks_to_await: List[LocalTask],
+    timeout_s: Optional[float] = None,
+    arg=None,
+) -> List[TaskOutcome]:
+    """
+    Start tasks_to_start, and return the outcomes of tasks_to_await when these have
+    completed.
+
+    Before returning, also wait for the callbacks of all started tasks to return. So
+    all task-dependency spans have been logged.
+    """
+    assert isinstance(tasks_to_start, list)
+    assert isinstance(tasks_to_await, list)
+
+    if len(tasks_to_start) == 0:
+        raise ValueError("No tasks to start")
+
+    if len(tasks_to_await) == 0:
+        raise ValueError("No tasks to await")
+
+    with _CPU_POOL.hold():
+        for task in tasks_to_start:
+            task.start(arg)
+
+    outcomes = [task.get_task_result(timeout_s) for task in tasks_to_await]
+
+    # callbacks may start more tasks
+    nr_waited = 0
+    while True:
+        with _STARTED_TASKS_LOCK:
+            started_tasks = list(_STARTED_TASKS)
+        if nr_waited == len(started_tasks):
+            break
+        for task in started_tasks[nr_waited:]:
+            task.wait_done(timeout_s)
+        nr_waited = len(started_tasks)
+
+    return outcomes
@@ -0,0 +1,107 @@
+"""
+Logging from notebook tasks, and OpenTelemetry setup for the local executor.
+
+Notebooks log values and artefacts with the logger returned by make_pydar_logger.
+This module does not import the local executor (see common.local_executor), or
+pynb-dag-runner before a logger is created.
+"""
+import os
+from pathlib import Path
+from typing import Any, Optional
+
+#
+from opentelemetry import trace
+
+#
+from common.utils import local_executor_enabled
+
+SPANS_DIR = Path("/tmp/spans")
+
+# Directory set by setup_tracing (if called in this process)
+_SPANS_DIR: Optional[Path] = None
+
+
+# ---- OpenTelemetry setup ----
+
+
+class _ProcessSpanFile:
+    """
+    Text file <spans_dir>/<pid>.txt for the current process. After a fork, the child
+    process writes to a file for its own pid.
+    """
+
+    def __init__(self, spans_dir: Path):
+        self.spans_dir = spans_dir
+        self._pid: Optional[int] = None
+        self._f: Optional[Any] = None
+
+    def _file(self):
+        if self._pid != os.getpid():
+            os.makedirs(self.spans_dir, exist_ok=True)
+            self._f = open(self.spans_dir / f"{os.getpid()}.txt", "a")
+            self._pid = os.getpid()
+        return self._f
+
+    def write(self, s: str):
+        return self._file().write(s)
+
+    def flush(self):
+        self._file().flush()
+
+
+def setup_tracing(spans_dir: Path = SPANS_DIR):
+    """
+    Set global OpenTelemetry tracer provider that writes finished spans to
+    <spans_dir>/<pid>.txt, in the format of ray.util.tracing.setup_local_tmp_tracing.
+    So spans can be read with _get_all_spans in pynb-dag-runner.
+    """
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter, SimpleSpanProcessor
+
+    global _SPANS_DIR
+    _SPANS_DIR = spans_dir
+
+    provider = TracerProvider()
+    provider.add_span_processor(
+        SimpleSpanProcessor(
+            ConsoleSpanExporter(
+                out=_ProcessSpanFile(spans_dir),  # type: ignore
+                formatter=lambda span: span.to_json(indent=None) + os.linesep,
+            )
+        )
+    )
+    trace.set_tracer_provider(provider)
+
+
+def traced_spans_dir() -> Optional[Path]:
+    """
+    Return directory that spans are written to by setup_tracing, or None if
+    setup_tracing has not been called in this process
+    """
+    return _SPANS_DIR
+
+
+# ---- loggers for notebooks ----
+
+
+def make_pydar_logger(P):
+    """
+    Return PydarLogger for logging values and artefacts from a notebook.
+
+    With the local executor, spans are written with setup_tracing, and the logger does
+    not connect to (or start) a Ray cluster.
+    """
+    from pynb_dag_runner.tasks.task_opentelemetry_logging import PydarLogger
+
+    if not local_executor_enabled(P):
+        return PydarLogger(P)
+
+    class LocalPydarLogger(PydarLogger):
+        def __init__(self, P):
+            # PydarLogger.__init__ (in pynb-dag-runner 0.0.9) connects to a Ray
+            # cluster (or starts one), and then sets the traceparent below. So it is
+            # not called. The logging methods only need the traceparent.
+            self._traceparent = P.get("_opentelemetry_traceparent", None)
+
+    setup_tracing()
+    return LocalPydarLogger(P)
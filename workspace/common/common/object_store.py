@@ -0,0 +1,150 @@
+"""
+Pass numpy arrays between pipeline tasks using Ray's shared-memory object store.
+
+A task publishes an array under its data lake path. Downstream tasks (on the same Ray
+cluster) then get a zero-copy, read-only view of the array from the object store,
+instead of reading and deserializing the file from the data lake. Writing the array to
+the data lake is done asynchronously in a separate Ray task.
+
+Published arrays are tracked by a named registry actor that is started by the
+pipeline driver (see start_dataset_registry), and that owns all published objects.
+So arrays remain available after the publishing notebook task has finished.
+"""
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+#
+import numpy as np
+import ray
+
+#
+from common.io import write_numpy
+
+REGISTRY_NAME = "mnist-demo-pipeline-dataset-registry"
+REGISTRY_NAMESPACE = "pydar-ray-cluster"
+
+
+@ray.remote(num_cpus=0)
+def _persist_numpy(path: str, numpy_obj, logical_dtype: str) -> str:
+    write_numpy(Path(path), numpy_obj, logical_dtype=logical_dtype)
+    return path
+
+
+@ray.remote(num_cpus=0)
+class DatasetRegistry:
+    """
+    Ray actor with the object references (and logical dtypes, see
+    common.io.compact_dtype) of all published arrays by pipeline run id and data lake
+    path, and of the tasks persisting these to the data lake.
+
+    Note: object references are wrapped in lists, since Ray otherwise resolves
+    references passed as arguments and return values.
+    """
+
+    def __init__(self):
+        self._refs: Dict[str, List[Any]] = {}
+        self._persist_refs: Dict[str, List[Any]] = {}
+
+    def publish(
+        self, key: str, numpy_obj, logical_dtype: str, persist_path: Optional[str]
+    ):
+        # The array is put into the object store (and the persistence task is
+        # started) by the registry, and not by the publishing task. So the registry
+        # owns both objects, and they are not released when the publishing task exits.
+        ref = ray.put(numpy_obj)
+        self._refs[key] = [ref, logical_dtype]
+
+        if persist_path is not None:
+            self._persist_refs[key] = [
+                _persist_numpy.remote(persist_path, ref, logical_dtype)
+            ]
+
+    def lookup(self, key: str) -> Optional[List[Any]]:
+        return self._refs.get(key)
+
+    def persist_refs(self, key_prefix: str) -> List[Any]:
+        return [
+            wrapped_ref[0]
+            for key, wrapped_ref in self._persist_refs.items()
+            if key == key_prefix or key.startswith(key_prefix + "/")
+        ]
+
+
+def start_dataset_registry():
+    """
+    Start the registry actor. Should be called by the pipeline driver after the Ray
+    cluster is started. The registry (and all published arrays) live until the driver
+    exits.
+    """
+    return DatasetRegistry.options(  # type: ignore
+        name=REGISTRY_NAME, namespace=REGISTRY_NAMESPACE
+    ).remote()
+
+
+def _get_registry():
+    if not ray.is_initialized():
+        return None
+
+    try:
+        return ray.get_actor(REGISTRY_NAME, namespace=REGISTRY_NAMESPACE)
+    except ValueError:
+        # no registry started (eg. notebook run outside of pipeline)
+        return None
+
+
+def _key(P, path: Path) -> str:
+    return f"{P['pipeline.pipeline_run_id']}:{os.path.abspath(path)}"
+
+
+def publish_numpy(
+    P, path: Path, numpy_obj, persist: bool = True, logical_dtype: Optional[Any] = None
+):
+    """
+    Publish numpy array in the Ray object store under a data lake path, and (if
+    persist=True) write it to the data lake in a separate Ray task.
+
+    The logical dtype (default: the dtype of numpy_obj) is recorded for arrays stored
+    in a compact dtype, see common.io.write_numpy.
+    """
+    numpy_obj = np.asarray(numpy_obj)
+    logical = np.dtype(numpy_obj.dtype if logical_dtype is None else logical_dtype)
+
+    assert path.suffix == ".numpy"
+
+    registry = _get_registry()
+    if registry is None:
+        raise Exception("Dataset registry not started, see start_dataset_registry")
+
+    ray.get(
+        registry.publish.remote(
+            _key(P, path), numpy_obj, logical.str, str(path) if persist else None
+        )
+    )
+
+
+def lookup_numpy(P, path: Path) -> Optional[Tuple[Any, np.dtype]]:
+    """
+    Return tuple with read-only (zero-copy) array published under data lake path and
+    its logical dtype, or None if no array is published under path.
+    """
+    registry = _get_registry()
+    if registry is None:
+        return None
+
+    wrapped_ref = ray.get(registry.lookup.remote(_key(P, path)))
+    if wrapped_ref is None:
+        return None
+
+    ref, logical_dtype = wrapped_ref
+    return ray.get(ref), np.dtype(logical_dtype)
+
+
+def wait_for_persisted(P, path: Path):
+    """
+    Wait until all published arrays under path (a file or directory in the data lake)
+    have been written to the data lake.
+    """
+    registry = _get_registry()
+    if registry is not None:
+        ray.get(ray.get(registry.persist_refs.remote(_key(P, path))))
@@ -0,0 +1,79 @@
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Sequence
+
+# Function that creates one matplotlib figure. Functions rendered in worker processes
+# are pickled, so these should be defined at module level (eg. in common.figures), or
+# be functools.partial of such functions.
+PlotFunction = Callable[[], Any]
+
+# Modules imported once by the forkserver process (and not by each worker)
+FORKSERVER_PRELOAD = ["matplotlib.pyplot", "common.plotting", "common.figures"]
+
+
+def figure_to_png(fig) -> bytes:
+    """
+    Render matplotlib figure as png (as logger.log_figure in pynb-dag-runner), and
+    close the figure.
+    """
+    import matplotlib.pyplot as plt
+
+    buffer = io.BytesIO()
+
+    # plots are transparent by default.
+    fig.savefig(buffer, format="png", facecolor="white", transparent=False)
+    plt.close(fig)
+
+    return buffer.getvalue()
+
+
+def _render_in_worker(plot_function: PlotFunction) -> bytes:
+    import matplotlib
+
+    # do not render to notebook (or any other interactive) backend
+    matplotlib.use("agg")
+
+    return figure_to_png(plot_function())
+
+
+def _worker_context():
+    # Workers are not forked from the notebook kernel, since it may have running
+    # threads (eg. of Ray or onnxruntime) whose locks would be copied in a locked
+    # state.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(FORKSERVER_PRELOAD)
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def render_figures(
+    plot_functions: Sequence[PlotFunction], max_workers: int
+) -> List[bytes]:
+    """
+    Create and render figures in parallel, and return the png content of each figure
+    (eg. for logging with logger.log_artefact, and for showing with show_png).
+
+    Figures are rendered in a pool of at most max_workers processes (eg. the number of
+    cores reserved for the task, see common.utils.get_num_cpus), started with the
+    forkserver (or spawn) method. Plot functions are pickled, see PlotFunction. With
+    one worker, figures are rendered in this process.
+    """
+    nr_workers: int = min(max_workers, len(plot_functions))
+    if nr_workers <= 1:
+        return [figure_to_png(plot_function()) for plot_function in plot_functions]
+
+    with ProcessPoolExecutor(
+        max_workers=nr_workers, mp_context=_worker_context()
+    ) as executor:
+        return list(executor.map(_render_in_worker, plot_functions))
+
+
+def show_png(png: bytes):
+    """
+    Show png content inline in a notebook (eg. a figure rendered with render_figures)
+    """
+    from IPython.display import Image, display
+
+    display(Image(data=png, format="png"))
@@ -0,0 +1,229 @@
+"""
+Opt-in profiling of notebook tasks with cProfile (cpu) and tracemalloc (memory).
+
+Notebook code runs in a Jupyter kernel, so profiling is done in two parts:
+
+ - In the kernel, start_profiling (called at the start of each notebook) registers
+   IPython hooks that profile every following notebook cell. After each cell, a
+   summary of the profile so far is written to a directory given by the task
+   (parameter "_profile_dir").
+
+ - After the notebook has run, the task reads the summaries with read_profile, and
+   logs them as artefacts of the task run (see make_notebook_task in driver.py):
+
+     profile-cprofile.txt    : functions with the highest cumulative times
+     profile-tracemalloc.txt : peak traced memory, and top allocation sites
+     profile-summary.json    : the same data in JSON format (eg. for reporting)
+
+Memory is traced per cell: the allocation sites are the sites of memory allocated
+during the cell with the highest peak memory use, and still allocated at its end.
+"""
+import io, json, pstats, cProfile, tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+PROFILE_MODES = ["none", "cpu", "memory", "all"]
+
+# Number of functions and allocation sites in the summaries
+NR_TOP_ENTRIES = 30
+
+PROFILE_ARTEFACTS = [
+    "profile-cprofile.txt",
+    "profile-tracemalloc.txt",
+    "profile-summary.json",
+]
+
+# Profiler in the current kernel (if started)
+_PROFILER: Optional["_CellProfiler"] = None
+
+
+def profile_parameters(mode: str, profile_dir: Path) -> Dict[str, Any]:
+    """
+    Return notebook parameters (added to P) that enable profiling in the notebook
+    """
+    assert mode in PROFILE_MODES
+    if mode == "none":
+        return {}
+    return {"_profile_mode": mode, "_profile_dir": str(profile_dir)}
+
+
+def _function_name(func) -> str:
+    filename, lineno, name = func
+    return f"{filename}:{lineno}({name})"
+
+
+def cprofile_summary(stats: pstats.Stats, nr_entries: int) -> Dict[str, Any]:
+    """
+    Return top functions by cumulative time and by own time (tottime)
+    """
+
+    def entries(sort_key: str) -> List[Dict[str, Any]]:
+        rows = []
+        for func, (_, ncalls, tottime, cumtime, _) in stats.stats.items():  # type: ignore
+            rows.append(
+                {
+                    "function": _function_name(func),
+                    "ncalls": ncalls,
+                    "tottime_s": round(tottime, 6),
+                    "cumtime_s": round(cumtime, 6),
+                }
+            )
+        return sorted(rows, key=lambda row: row[sort_key], reverse=True)[:nr_entries]
+
+    return {
+        "total_time_s": round(stats.total_tt, 6),  # type: ignore
+        "top_cumulative": entries("cumtime_s"),
+        "top_own_time": entries("tottime_s"),
+    }
+
+
+def tracemalloc_summary(
+    snapshot: tracemalloc.Snapshot, peak_bytes: int, nr_entries: int
+) -> Dict[str, Any]:
+    """
+    Return peak traced memory, and top allocation sites in snapshot
+    """
+    statistics = snapshot.filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)]
+    ).statistics("lineno")
+
+    return {
+        "peak_memory_mb": round(peak_bytes / 2**20, 3),
+        "top_allocations": [
+            {
+                "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "size_mb": round(stat.size / 2**20, 3),
+                "count": stat.count,
+            }
+            for stat in statistics[:nr_entries]
+        ],
+    }
+
+
+class _CellProfiler:
+    def __init__(self, mode: str, profile_dir: Path):
+        self.mode = mode
+        self.profile_dir = profile_dir
+        self.profiler: Optional[cProfile.Profile] = (
+            cProfile.Profile() if mode in ["cpu", "all"] else None
+        )
+        self.trace_memory: bool = mode in ["memory", "all"]
+        self.memory: Optional[Dict[str, Any]] = None
+
+    def pre_run_cell(self, *args):
+        if self.trace_memory:
+            # restart tracing to reset the peak (tracemalloc.reset_peak requires
+            # Python 3.9+)
+            tracemalloc.stop()
+            tracemalloc.start()
+        if self.profiler is not None:
+            self.profiler.enable()
+
+    def post_run_cell(self, *args):
+        if self.profiler is not None:
+            self.profiler.disable()
+
+        summary: Dict[str, Any] = {"mode": self.mode}
+
+        if self.profiler is not None:
+            stats = pstats.Stats(self.profiler)
+            summary["cpu"] = cprofile_summary(stats, NR_TOP_ENTRIES)
+
+            text = io.StringIO()
+            stats.stream = text  # type: ignore
+            stats.sort_stats("cumulative").print_stats(NR_TOP_ENTRIES)
+            (self.profile_dir / "profile-cprofile.txt").write_text(text.getvalue())
+
+        if self.trace_memory and tracemalloc.is_tracing():
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            if self.memory is None or peak_bytes > self.memory["peak_bytes"]:
+                self.memory = {
+                    "peak_bytes": peak_bytes,
+                    **tracemalloc_summary(
+                        tracemalloc.take_snapshot(), peak_bytes, NR_TOP_ENTRIES
+                    ),
+                }
+
+        if self.memory is not None:
+            summary["memory"] = {
+                k: v for k, v in self.memory.items() if k != "peak_bytes"
+            }
+            (self.profile_dir / "profile-tracemalloc.txt").write_text(
+                "\n".join(
+                    [f"Peak traced memory: {summary['memory']['peak_memory_mb']} MB"]
+                    + [
+                        f"{a['size_mb']:>12.3f} MB {a['count']:>10} {a['location']}"
+                        for a in summary["memory"]["top_allocations"]
+                    ]
+                )
+                + "\n"
+            )
+
+        (self.profile_dir / "profile-summary.json").write_text(json.dumps(summary))
+
+    def stop(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self.trace_memory:
+            tracemalloc.stop()
+
+
+def start_profiling(P):
+    """
+    Profile all following cells of the notebook if profiling is enabled in the run
+    parameters P (see profile_parameters). Should be called in a Jupyter kernel.
+    """
+    global _PROFILER
+
+    if P.get("_profile_mode", "none") == "none":
+        return
+
+    from IPython import get_ipython
+
+    ip = get_ipython()
+    if ip is None:
+        return
+
+    stop_profiling()
+
+    profile_dir = Path(P["_profile_dir"])
+    profile_dir.mkdir(parents=True, exist_ok=True)
+
+    _PROFILER = _CellProfiler(P["_profile_mode"], profile_dir)
+    ip.events.register("pre_run_cell", _PROFILER.pre_run_cell)
+    ip.events.register("post_run_cell", _PROFILER.post_run_cell)
+
+    # also profile the rest of the current cell
+    _PROFILER.pre_run_cell()
+
+
+def stop_profiling():
+    """
+    Stop profiling started in this kernel (eg. before a pooled kernel is reused, see
+    common.kernel_pool)
+    """
+    global _PROFILER
+
+    if _PROFILER is None:
+        return
+
+    from IPython import get_ipython
+
+    ip = get_ipython()
+    if ip is not None:
+        ip.events.unregister("pre_run_cell", _PROFILER.pre_run_cell)
+        ip.events.unregister("post_run_cell", _PROFILER.post_run_cell)
+
+    _PROFILER.stop()
+    _PROFILER = None
+
+
+def read_profile(profile_dir: Path) -> Dict[str, str]:
+    """
+    Return the profile artefacts (name -> content) written by a profiled notebook
+    """
+    return {
+        name: (profile_dir / name).read_text()
+        for name in PROFILE_ARTEFACTS
+        if (profile_dir / name).is_file()
+    }
@@ -0,0 +1,43 @@
+"""
+Adapter for the non-public helpers of pynb-dag-runner used by this pipeline.
+
+The driver replicates make_jupytext_task_ot in pynb-dag-runner (to add task caching,
+kernel pooling and profiling), and the summary notebook reads all spans logged in
+the pipeline run. These depend on helpers that are not part of the public API of
+pynb-dag-runner, so all uses are collected here.
+
+Written against pynb-dag-runner 0.0.9. When upgrading pynb-dag-runner, check that
+the helpers imported below still exist with the same behaviour (see
+tests/test_pydar_internals.py).
+"""
+from typing import Any, Dict, List
+
+#
+from pynb_dag_runner.tasks.tasks import _get_traceparent
+from pynb_dag_runner.tasks.task_opentelemetry_logging import _log_named_value
+from pynb_dag_runner.opentelemetry_helpers import _get_all_spans
+
+PYNB_DAG_RUNNER_VERSION = "0.0.9"
+
+
+def get_traceparent() -> str:
+    """
+    Return the current span context as a W3C traceparent string (this is passed to
+    notebooks as the parameter _opentelemetry_traceparent)
+    """
+    return _get_traceparent()
+
+
+def get_all_spans() -> List[Dict[str, Any]]:
+    """
+    Return all spans written to the span files (in /tmp/spans) of the pipeline run
+    """
+    return _get_all_spans()
+
+
+def log_text_artefact(name: str, content: str):
+    """
+    Log text artefact in the current span context (as the evaluated notebook is
+    logged by make_jupytext_task_ot)
+    """
+    _log_named_value(name=name, content=content, content_type="utf-8", is_file=True)
@@ -0,0 +1,153 @@
+from collections import defaultdict
+from typing import Any, DefaultDict, Dict, Iterable, List, Mapping, Optional
+
+# Span in OpenTelemetry JSON format (as read with _get_all_spans in pynb-dag-runner)
+SpanDict = Dict[str, Any]
+
+
+def _hashable(value: Any) -> Any:
+    # attribute values logged as lists (eg. shapes) are indexed as tuples
+    if isinstance(value, list):
+        return tuple(_hashable(v) for v in value)
+    return value
+
+
+def _matches(
+    span: SpanDict, name: Optional[str], attributes: Mapping[str, Any]
+) -> bool:
+    if name is not None and span["name"] != name:
+        return False
+
+    span_attributes = span.get("attributes", {})
+    return all(
+        key in span_attributes and _hashable(span_attributes[key]) == _hashable(value)
+        for key, value in attributes.items()
+    )
+
+
+class SpanIndex:
+    """
+    Index for querying a collection of OpenTelemetry spans. The index is built once
+    (in linear time), and then answers lookups by span_id, span name, attribute
+    values and parent-child relationships without scanning all spans.
+
+    This replaces the corresponding queries on pynb_dag_runner's Spans container:
+
+        spans.filter(["name"], name).filter(["attributes", key], value)
+          -> index.filter(name, {key: value})
+
+        spans.bound_under(span)
+          -> index.descendants(span)
+
+        get_logged_values(spans.bound_under(span))
+          -> index.logged_values(span)
+    """
+
+    def __init__(self, spans: Iterable[SpanDict]):
+        self._spans: List[SpanDict] = list(spans)
+
+        self._by_id: Dict[str, SpanDict] = {}
+        self._by_name: DefaultDict[str, List[SpanDict]] = defaultdict(list)
+        self._children: DefaultDict[str, List[SpanDict]] = defaultdict(list)
+
+        for span in self._spans:
+            self._by_id[span["context"]["span_id"]] = span
+            self._by_name[span["name"]].append(span)
+            if span.get("parent_id") is not None:
+                self._children[span["parent_id"]].append(span)
+
+        # attribute key -> attribute value -> spans, built on first lookup by key
+        self._by_attribute: Dict[str, DefaultDict[Any, List[SpanDict]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+    def __iter__(self):
+        return iter(self._spans)
+
+    def get(self, span_id: str) -> Optional[SpanDict]:
+        return self._by_id.get(span_id)
+
+    def children(self, span: SpanDict) -> List[SpanDict]:
+        return list(self._children.get(span["context"]["span_id"], []))
+
+    def descendants(self, span: SpanDict) -> List[SpanDict]:
+        """
+        Return all spans that are connected to span by one or more parent-child
+        relationships (not including span itself). Same as Spans.bound_under.
+        """
+        result: List[SpanDict] = []
+        to_visit: List[SpanDict] = [span]
+
+        while to_visit:
+            for child in self._children.get(to_visit.pop()["context"]["span_id"], []):
+                result.append(child)
+                to_visit.append(child)
+
+        return result
+
+    def _attribute_index(self, key: str) -> DefaultDict[Any, List[SpanDict]]:
+        if key not in self._by_attribute:
+            index: DefaultDict[Any, List[SpanDict]] = defaultdict(list)
+            for span in self._spans:
+                if key in span.get("attributes", {}):
+                    index[_hashable(span["attributes"][key])].append(span)
+
+            self._by_attribute[key] = index
+
+        return self._by_attribute[key]
+
+    def filter(
+        self, name: Optional[str] = None, attributes: Mapping[str, Any] = {}
+    ) -> List[SpanDict]:
+        """
+        Return spans with given name (if provided) and attribute values, in the order
+        of the indexed spans.
+        """
+        candidates: List[List[SpanDict]] = []
+        if name is not None:
+            candidates.append(self._by_name.get(name, []))
+        for key, value in attributes.items():
+            candidates.append(self._attribute_index(key).get(_hashable(value), []))
+
+        if len(candidates) == 0:
+            return list(self._spans)
+
+        # only check the spans in the smallest candidate list
+        return [
+            span
+            for span in min(candidates, key=len)
+            if _matches(span, name, attributes)
+        ]
+
+    def _logged_data(self, span: SpanDict, span_name: str) -> Dict[str, Any]:
+        # same as _read_logged_serialized_data in pynb-dag-runner
+        from pynb_dag_runner.tasks.task_opentelemetry_logging import SerializedData
+
+        logged_spans = [s for s in self.descendants(span) if s["name"] == span_name]
+
+        result: Dict[str, Any] = {}
+        # if a value is logged multiple times under the same name, use the last one
+        # (timestamps are ISO 8601 strings in UTC, so they sort chronologically)
+        for s in sorted(logged_spans, key=lambda s: s["start_time"], reverse=True):
+            attributes = s["attributes"]
+            if attributes["name"] not in result:
+                result[attributes["name"]] = SerializedData(
+                    type=attributes["type"],
+                    encoding=attributes["encoding"],
+                    encoded_content=attributes["content_encoded"],
+                ).decode()
+
+        return result
+
+    def logged_values(self, span: SpanDict) -> Dict[str, Any]:
+        """
+        Return values logged under span, as get_logged_values in pynb-dag-runner
+        """
+        return self._logged_data(span, "named-value")
+
+    def logged_artifacts(self, span: SpanDict) -> Dict[str, Any]:
+        """
+        Return artifacts logged under span, as get_logged_artifacts in pynb-dag-runner
+        """
+        return self._logged_data(span, "artefact")
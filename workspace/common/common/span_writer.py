@@ -0,0 +1,155 @@
+import os, json, threading
+from pathlib import Path
+from typing import Any, Dict, IO, List, Optional
+
+#
+from common.compression import compress, find_path, open_text
+
+
+def read_jsonl(path: Path) -> List[Any]:
+    with open_text(path) as f:
+        return [json.loads(line) for line in f if line.strip() != ""]
+
+
+def read_spans(path: Path) -> List[Any]:
+    """
+    Read spans from a JSON array file (eg. opentelemetry-spans.json) or a JSONL file
+    (eg. opentelemetry-spans.jsonl). The file may be compressed, and path may be
+    given without compression suffix (see common.compression.find_path).
+    """
+    path = find_path(path)
+    if ".jsonl" in path.suffixes:
+        return read_jsonl(path)
+
+    with open_text(path) as f:
+        return json.load(f)
+
+
+def write_json_array_from_jsonl(jsonl_path: Path, json_path: Path):
+    """
+    Convert JSONL file (one JSON object per line) into a file with one JSON array.
+    The conversion is streamed, so the objects are not all loaded into memory.
+    """
+    json_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open_text(jsonl_path) as f_in, open_text(json_path, "wt") as f_out:
+        f_out.write("[")
+        is_first = True
+        for line in f_in:
+            if line.strip() == "":
+                continue
+            f_out.write("\n  " if is_first else ",\n  ")
+            # re-serialize to validate each line
+            f_out.write(json.dumps(json.loads(line)))
+            is_first = False
+        f_out.write("\n]\n")
+
+
+class StreamingSpanWriter:
+    """
+    Copy OpenTelemetry spans to a JSONL output file while they are recorded.
+
+    Spans are written by each Ray process to its own file <spans_dir>/<pid>.txt (one
+    JSON span per line, see ray.util.tracing.setup_local_tmp_tracing). A background
+    thread polls these files, and appends new complete lines to the output file. So,
+    memory use does not grow with the number of spans, and an interrupted run leaves
+    all spans copied so far.
+
+    If the output path has a compression suffix (.gz or .zst), the spans copied in
+    each poll are compressed as a separate member. So, the output is a valid
+    compressed file after every poll.
+
+    Usage:
+
+        with StreamingSpanWriter(Path("spans.jsonl")) as span_writer:
+            # code emitting OpenTelemetry spans
+
+    Spans already in spans_dir when the writer is started are not copied (as for
+    SpanRecorder in pynb-dag-runner).
+    """
+
+    def __init__(
+        self,
+        output_path: Path,
+        spans_dir: Path = Path("/tmp/spans"),
+        poll_interval_s: float = 1.0,
+    ):
+        self.output_path = output_path
+        self.spans_dir = spans_dir
+        self.poll_interval_s = poll_interval_s
+
+        self.nr_spans: int = 0
+        self.exception_events: List[Dict[str, Any]] = []
+
+        # bytes read so far from each span file
+        self._offsets: Dict[Path, int] = {}
+        self._out: Optional[IO[bytes]] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _span_files(self) -> List[Path]:
+        if not self.spans_dir.is_dir():
+            return []
+        return sorted(self.spans_dir.glob("*.txt"))
+
+    def _read_new_lines(self, path: Path) -> List[str]:
+        with open(path, "rb") as f:
+            f.seek(self._offsets.get(path, 0))
+            data: bytes = f.read()
+
+        # only consume complete lines; the last line may still be written
+        end = data.rfind(b"\n") + 1
+        self._offsets[path] = self._offsets.get(path, 0) + end
+
+        return [line for line in data[:end].decode().splitlines() if line != ""]
+
+    def poll(self) -> int:
+        """
+        Copy new spans to the output file, and return the number of copied spans
+        """
+        with self._lock:
+            assert self._out is not None
+
+            new_lines: List[str] = []
+            for path in self._span_files():
+                for line in self._read_new_lines(path):
+                    span = json.loads(line)
+                    self.exception_events.extend(
+                        e
+                        for e in span.get("events", [])
+                        if e.get("name") == "exception"
+                    )
+                    new_lines.append(json.dumps(span) + "\n")
+
+            if len(new_lines) > 0:
+                self._out.write(compress("".join(new_lines).encode(), self.output_path))
+                self._out.flush()
+
+            self.nr_spans += len(new_lines)
+            return len(new_lines)
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval_s):
+            self.poll()
+
+    def __enter__(self):
+        # skip spans recorded before the writer is started
+        for path in self._span_files():
+            self._offsets[path] = os.path.getsize(path)
+
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        self._out = open(self.output_path, "wb")
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        assert self._thread is not None and self._out is not None
+
+        self._stop.set()
+        self._thread.join()
+
+        self.poll()
+        self._out.close()
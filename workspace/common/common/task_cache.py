@@ -0,0 +1,179 @@
+import os, json, hashlib, shutil, uuid
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+# Pipeline parameters that change the outputs of tasks, and that are part of the
+# cache key (together with the task parameters). Other run attributes (eg.
+# pipeline.pipeline_run_id, pipeline.executor, task.num_cpus or task.timeout_s)
+# only describe how a task is run, and do not invalidate cached task outputs.
+CACHE_KEY_PIPELINE_PARAMETERS: Sequence[str] = (
+    "pipeline.run_environment",
+    "pipeline.compact_dtypes",
+)
+
+
+def _is_ignored(path: Path) -> bool:
+    return path.name in ["__pycache__", ".ipynb_checkpoints"] or path.suffix == ".pyc"
+
+
+def digest_file(path: Path) -> str:
+    """
+    Return sha256 hex digest of the content of a file
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(2**20), b""):
+            h.update(block)
+
+    return h.hexdigest()
+
+
+def digest_path(path: Path) -> str:
+    """
+    Return sha256 hex digest of a file, or of a directory (including names and
+    content of all files in the directory, recursively).
+
+    A non-existent path has a fixed digest (distinct from an empty directory).
+    """
+    h = hashlib.sha256()
+
+    if path.is_file():
+        h.update(b"file:" + digest_file(path).encode())
+    elif path.is_dir():
+        h.update(b"dir:")
+        for p in sorted(path.iterdir()):
+            if not _is_ignored(p):
+                h.update(f"{p.name}:{digest_path(p)};".encode())
+    else:
+        h.update(b"missing")
+
+    return h.hexdigest()
+
+
+def task_cache_key(
+    notebook_path: Path,
+    task_parameters: Mapping[str, Any],
+    input_paths: List[Path],
+    code_paths: List[Path] = [],
+    pipeline_parameters: Mapping[str, Any] = {},
+) -> str:
+    """
+    Return content-addressed cache key for one notebook task run. The key depends on:
+
+     - the content of the notebook (and any other code the notebook depends on,
+       listed in code_paths, eg. the common package)
+     - the task parameters, and the pipeline parameters listed in
+       CACHE_KEY_PIPELINE_PARAMETERS (other pipeline parameters are ignored)
+     - the content of all data lake inputs read by the task.
+    """
+    key_data = {
+        "notebook": digest_file(notebook_path),
+        "code": [digest_path(p) for p in code_paths],
+        "parameters": {
+            **task_parameters,
+            **{
+                k: pipeline_parameters[k]
+                for k in CACHE_KEY_PIPELINE_PARAMETERS
+                if k in pipeline_parameters
+            },
+        },
+        "inputs": [digest_path(p) for p in input_paths],
+    }
+
+    return hashlib.sha256(
+        json.dumps(key_data, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+class TaskCache:
+    """
+    On-disk cache for outputs of notebook tasks. Each cache entry is stored in a
+    directory named by the cache key:
+
+        <cache_dir>/<cache key>/cache-entry.json   (list of outputs)
+        <cache_dir>/<cache key>/logged-spans.json  (values logged by the task)
+        <cache_dir>/<cache key>/outputs/...        (copy of data lake outputs)
+
+    Outputs are given as paths relative to the data lake root, and are restored into
+    the data lake of the pipeline run reading the cache.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key
+
+    def contains(self, key: str) -> bool:
+        return (self._entry_path(key) / "cache-entry.json").is_file()
+
+    def store(
+        self,
+        key: str,
+        data_lake_root: Path,
+        outputs: List[str],
+        logged_spans: List[Dict[str, Any]],
+    ):
+        """
+        Store outputs (relative to data_lake_root) and logged spans under key.
+
+        The entry is first written to a temp directory, and then renamed. So, a
+        concurrent or killed run never leaves a partially written entry.
+        """
+        if self.contains(key):
+            return
+
+        tmp_path = self.cache_dir / f".tmp-{key}-{uuid.uuid4()}"
+        os.makedirs(tmp_path)
+
+        for output in outputs:
+            src, dst = data_lake_root / output, tmp_path / "outputs" / output
+
+            if src.is_dir():
+                shutil.copytree(src, dst)
+            elif src.is_file():
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(src, dst)
+            else:
+                raise FileNotFoundError(f"Task output {src} not found")
+
+        (tmp_path / "logged-spans.json").write_text(json.dumps(logged_spans))
+        (tmp_path / "cache-entry.json").write_text(
+            json.dumps({"key": key, "outputs": outputs}, indent=2)
+        )
+
+        try:
+            os.rename(tmp_path, self._entry_path(key))
+        except OSError:
+            # entry was written by another task run with the same key
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def restore(self, key: str, data_lake_root: Path) -> Optional[List[Dict[str, Any]]]:
+        """
+        On cache hit, copy cached outputs into data_lake_root and return the logged
+        spans for the cached task run. On cache miss, return None.
+
+        Existing outputs in data_lake_root (eg. from a previous run) are replaced, so
+        no stale files are left in restored output directories.
+        """
+        if not self.contains(key):
+            return None
+
+        entry_path = self._entry_path(key)
+        entry = json.loads((entry_path / "cache-entry.json").read_text())
+
+        for output in entry["outputs"]:
+            src, dst = entry_path / "outputs" / output, data_lake_root / output
+
+            if dst.is_dir():
+                shutil.rmtree(dst)
+            elif dst.exists():
+                dst.unlink()
+
+            if src.is_dir():
+                shutil.copytree(src, dst)
+            else:
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(src, dst)
+
+        return json.loads((entry_path / "logged-spans.json").read_text())
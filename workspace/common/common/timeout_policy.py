@@ -0,0 +1,139 @@
+"""
+Timeouts for notebook tasks learned from the spans of previous pipeline runs.
+
+For each task (identified by its notebook and task parameters, see task_history_key),
+the durations of successful attempts in previous runs are collected. The timeout of
+an attempt is then set to a high quantile of these durations plus a margin. So an
+attempt that hangs is stopped (and retried) soon after it is clearly slower than
+healthy runs, and slow-but-healthy tasks are not killed by a too short constant.
+Tasks without enough history use the timeout given in the pipeline definition.
+"""
+import json
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, DefaultDict, Iterable, List, Mapping, Optional
+
+#
+import numpy as np
+
+#
+from common.span_index import SpanDict, SpanIndex
+from common.span_writer import read_spans
+
+# Task attributes that do not identify a task across pipeline runs
+NON_HISTORY_KEY_ATTRIBUTES = ["task.notebook", "task.task_type"]
+
+
+def task_history_key(attributes: Mapping[str, Any]) -> str:
+    """
+    Return key identifying a notebook task across pipeline runs: the notebook file
+    name, the task parameters (attributes task.*) and the run environment.
+    """
+    key_data = {
+        "notebook": Path(attributes.get("task.notebook", "")).name,
+        "pipeline.run_environment": attributes.get("pipeline.run_environment"),
+        **{
+            k: v
+            for k, v in attributes.items()
+            if k.startswith("task.") and k not in NON_HISTORY_KEY_ATTRIBUTES
+        },
+    }
+    return json.dumps(key_data, sort_keys=True, default=str)
+
+
+def _parse_time(timestamp: str) -> datetime:
+    # eg. "2022-11-14T10:23:34.123456Z" (ISO 8601, in UTC)
+    return datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+
+
+def span_duration_s(span: SpanDict) -> float:
+    return (
+        _parse_time(span["end_time"]) - _parse_time(span["start_time"])
+    ).total_seconds()
+
+
+def _is_ok(span: SpanDict) -> bool:
+    return span.get("status", {}).get("status_code") == "OK"
+
+
+class TaskDurationHistory:
+    """
+    Durations (in seconds) of successful attempts of notebook tasks, by task history
+    key, in the spans of previous pipeline runs.
+
+    An attempt is a retry-call span (under the execute-task span of the task). Failed
+    and timed out attempts, and attempts where outputs were restored from the task
+    cache (so the notebook was not run), are not included.
+    """
+
+    def __init__(self, spans: Iterable[SpanDict]):
+        index = SpanIndex(spans)
+        self._durations_s: DefaultDict[str, List[float]] = defaultdict(list)
+
+        for task_span in index.filter("execute-task", {"task.task_type": "jupytext"}):
+            key = task_history_key(task_span["attributes"])
+
+            for span in index.descendants(task_span):
+                if span["name"] != "retry-call" or not _is_ok(span):
+                    continue
+                if any(
+                    s["attributes"].get("task.cache_hit", False)
+                    for s in index.descendants(span)
+                ):
+                    continue
+                self._durations_s[key].append(span_duration_s(span))
+
+    @classmethod
+    def from_files(cls, paths: List[Path]) -> "TaskDurationHistory":
+        """
+        Read history from span files of previous runs (eg. opentelemetry-spans.json,
+        see common.span_writer.read_spans). Missing files are skipped.
+        """
+        spans: List[SpanDict] = []
+        for path in paths:
+            try:
+                spans += read_spans(path)
+            except FileNotFoundError:
+                print(f"Skipping span history file {path} (not found)")
+
+        return cls(spans)
+
+    def durations_s(self, attributes: Mapping[str, Any]) -> List[float]:
+        return list(self._durations_s.get(task_history_key(attributes), []))
+
+    def estimate_duration_s(self, attributes: Mapping[str, Any]) -> Optional[float]:
+        """
+        Return median duration of the task in the history, or None if the task has no
+        history (eg. for task scheduling, see common.local_executor.set_scheduling)
+        """
+        durations_s: List[float] = self.durations_s(attributes)
+        if len(durations_s) == 0:
+            return None
+        return float(np.median(durations_s))
+
+
+@dataclass(frozen=True)
+class TimeoutPolicy:
+    """
+    Timeout of a task attempt: the quantile of the durations of successful attempts
+    in the history, times (1 + relative_margin), plus margin_s. If the history has
+    fewer than min_nr_samples durations for the task, the static timeout is used.
+    """
+
+    history: TaskDurationHistory
+    quantile: float = 0.95
+    relative_margin: float = 0.5
+    margin_s: float = 2.0
+    min_nr_samples: int = 3
+
+    def timeout_s(
+        self, attributes: Mapping[str, Any], static_timeout_s: Optional[float]
+    ) -> Optional[float]:
+        durations_s: List[float] = self.history.durations_s(attributes)
+        if len(durations_s) < self.min_nr_samples:
+            return static_timeout_s
+
+        duration_s = float(np.quantile(durations_s, self.quantile))
+        return round(duration_s * (1 + self.relative_margin) + self.margin_s, 3)
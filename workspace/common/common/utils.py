@@ -1,17 +1,66 @@
 import itertools as it
+from typing import Any, Iterator
 
 
 #
 import numpy as np
 
 
-def chunkify(arr, chunk_size: int):
+def get_num_cpus(P) -> int:
+    """
+    Return number of cores reserved for a notebook task (from run parameters P, see
+    num_cpus in driver.py). For fractional reservations, at least one is returned.
+    """
+    return max(1, int(P.get("task.num_cpus", 1)))
+
+
+def local_executor_enabled(P) -> bool:
+    """
+    Return True if the pipeline is run with the local executor (ie., without a Ray
+    cluster), see common.local_executor and driver.py
+    """
+    return P.get("pipeline.executor", "ray") == "local"
+
+
+def _chunkify_sized(arr, chunk_size: int, drop_last: bool) -> Iterator[Any]:
+    n = len(arr)
+    nr_full_chunks = n // chunk_size
+
+    for k in range(nr_full_chunks):
+        yield arr[k * chunk_size : (k + 1) * chunk_size]
+
+    if (n % chunk_size > 0 or n == 0) and not drop_last:
+        yield arr[nr_full_chunks * chunk_size :]
+
+
+def _chunkify_iterator(xs: Iterator[Any], chunk_size: int, drop_last: bool):
+    for k in it.count():
+        chunk = list(it.islice(xs, chunk_size))
+
+        # as for sized inputs, an empty input is returned as one empty chunk
+        if len(chunk) == chunk_size or ((len(chunk) > 0 or k == 0) and not drop_last):
+            yield chunk
+
+        if len(chunk) < chunk_size:
+            return
+
+
+def chunkify(arr, chunk_size: int, drop_last: bool = False) -> Iterator[Any]:
     """
     Split a list (or numpy array) into chunks of equal sizes (chunk_size), and a last
     chunk with any remaining entries.
 
-     - The chunks are returned as an iterator.
-     - For a numpy array, the chunks are split on the first axis.
+     - The chunks are returned as an iterator (and are computed lazily).
+     - For a numpy array, the chunks are split on the first axis. Each chunk is a
+       view into the input array (no data is copied).
+     - For other sequences (eg. lists, tuples, ranges) the chunks are slices of the
+       input.
+     - Other iterables (eg. generators) are consumed lazily, and chunks are returned
+       as lists.
+     - If drop_last=True, a last chunk with fewer than chunk_size entries is not
+       returned.
+     - An empty input is returned as one empty chunk (or no chunks, if
+       drop_last=True).
 
     Numpy has a similar function, but it does not guarantee that all chunks (except
     the last one) are of equal length. It attemts to adjust the chunk lengths to have
@@ -23,62 +72,102 @@ def chunkify(arr, chunk_size: int):
     if not chunk_size > 0:
         raise Exception("chunk_size should be positive integer")
 
-    next_chunk, rest = arr[:chunk_size], arr[chunk_size:]
-
-    if len(rest) > 0:
-        return it.chain(iter([next_chunk]), chunkify(rest, chunk_size))
+    if hasattr(arr, "__len__") and hasattr(arr, "__getitem__"):
+        return _chunkify_sized(arr, chunk_size, drop_last)
     else:
-        return iter([next_chunk])
+        return _chunkify_iterator(iter(arr), chunk_size, drop_last)
+
 
+def downsample_images(X, factor: int):
+    """
+    Downsample an array of images X (with axes: image index, x-dim, y-dim) by
+    averaging over blocks of factor x factor pixels. Pixels that do not fit into a
+    full block (at the right/bottom edges) are dropped.
+    """
+    assert len(X.shape) == 3
+    if not factor > 0:
+        raise Exception("factor should be positive integer")
 
-def make_panel_image(X, pad_width: int, background_fill: int, images_per_row: int):
+    if factor == 1:
+        return X
+
+    n, dim_x, dim_y = X.shape[0], X.shape[1] // factor, X.shape[2] // factor
+    return (
+        X[:, : dim_x * factor, : dim_y * factor]
+        .reshape(n, dim_x, factor, dim_y, factor)
+        .mean(axis=(2, 4))
+    )
+
+
+def make_panel_image(
+    X, pad_width: int, background_fill: int, images_per_row: int, downsample: int = 1
+):
     """
     From an array of images X (with axes: image index, x-dim, y-dim) return a 2d
     numpy array suitable for displaying all images.
 
+    The output panel image is allocated once, and all images are written into it
+    with one assignment.
+
+    If downsample > 1, each image is first downsampled by this factor (see
+    downsample_images). This is useful for panels with many images.
+
     See unit test for examples.
     """
     assert len(X.shape) == 3
-    image_dims = tuple(X.shape)[1:]
+    X = downsample_images(X, downsample)
+
+    nr_images, dim_x, dim_y = X.shape
+    nr_rows: int = max(1, -(-nr_images // images_per_row))
 
     # compute size of one padded individual image in the output panel image
-    padded_image_dim = np.array(
-        (image_dims[0] + pad_width * 2, image_dims[1] + pad_width * 2)
+    padded_dim_x, padded_dim_y = dim_x + 2 * pad_width, dim_y + 2 * pad_width
+
+    # Panel image with axes (row, x-dim in row, column, y-dim in column). In C-order,
+    # this has the same memory layout as the final 2d panel image. The panel is a
+    # float64 array (independent of the dtype of X, eg. uint8 for compact datasets),
+    # so any background_fill value can be used.
+    panel = np.full(
+        (nr_rows, padded_dim_x, images_per_row, padded_dim_y),
+        background_fill,
+        dtype=np.float64,
     )
 
-    # store images arrays for each rows (with each image containing cols_per_row
-    # smaller images)
-    row_images = []
-
-    for X_chunk in chunkify(X, chunk_size=images_per_row):
-        current_row_images = []
+    image_idxs = np.arange(nr_images)
+    panel[
+        image_idxs // images_per_row,
+        pad_width : pad_width + dim_x,
+        image_idxs % images_per_row,
+        pad_width : pad_width + dim_y,
+    ] = X
 
-        for img in X_chunk:
-            assert img.shape == image_dims
-            img_padded = np.pad(
-                img,
-                pad_width=pad_width,
-                constant_values=(background_fill, background_fill),
-                mode="constant",
-            )
+    panel_image = panel.reshape(nr_rows * padded_dim_x, images_per_row * padded_dim_y)
+    return panel_image
 
-            assert tuple(img_padded.shape) == tuple(padded_image_dim)
-            current_row_images.append(img_padded)
 
-        while len(current_row_images) < images_per_row:
-            current_row_images.append(np.zeros(padded_image_dim) + background_fill)
+def iter_panel_images(
+    X,
+    pad_width: int,
+    background_fill: int,
+    images_per_row: int,
+    max_images_per_panel: int,
+    downsample: int = 1,
+) -> Iterator[Any]:
+    """
+    Split an array of images X into tiles of at most max_images_per_panel images,
+    and return an iterator of panel images (see make_panel_image) for each tile.
 
-        current_row_image = np.concatenate(current_row_images, axis=1)
-        assert tuple(current_row_image.shape) == (
-            padded_image_dim[0],
-            images_per_row * padded_image_dim[1],
+    For tens of thousands of images, this avoids rendering one panel image that is
+    too large to display.
+    """
+    if not max_images_per_panel % images_per_row == 0:
+        raise Exception("max_images_per_panel should be multiple of images_per_row")
+
+    for X_tile in chunkify(X, chunk_size=max_images_per_panel):
+        yield make_panel_image(
+            X_tile,
+            pad_width=pad_width,
+            background_fill=background_fill,
+            images_per_row=images_per_row,
+            downsample=downsample,
         )
-        row_images.append(current_row_image)
-
-    panel_image = np.concatenate(row_images)
-    assert tuple(panel_image.shape) == (
-        len(row_images) * padded_image_dim[0],
-        images_per_row * padded_image_dim[1],
-    )
-
-    return panel_image
@@ -0,0 +1,65 @@
+from pathlib import Path
+
+#
+import pytest
+
+#
+from common.compression import (
+    compress,
+    find_path,
+    open_text,
+    read_text,
+    with_compression,
+)
+
+
+@pytest.fixture(params=["none", "gzip", "zstd"])
+def compression(request):
+    if request.param == "zstd":
+        pytest.importorskip("zstandard")
+    return request.param
+
+
+def test_open_text_roundtrip(tmp_path: Path, compression: str):
+    path = with_compression(tmp_path / "notebook.ipynb", compression)
+    assert (
+        path.name
+        == {
+            "none": "notebook.ipynb",
+            "gzip": "notebook.ipynb.gz",
+            "zstd": "notebook.ipynb.zst",
+        }[compression]
+    )
+
+    text = '{"cells": []}\n' * 1000
+    with open_text(path, "wt") as f:
+        f.write(text)
+
+    with open_text(path) as f:
+        assert f.read() == text
+
+    if compression != "none":
+        # repetitive text is compressed
+        assert path.stat().st_size < len(text) / 10
+
+    # transparent reader finds compressed version of the file
+    assert find_path(tmp_path / "notebook.ipynb") == path
+    assert read_text(tmp_path / "notebook.ipynb") == text
+
+
+def test_read_concatenated_members(tmp_path: Path, compression: str):
+    path = with_compression(tmp_path / "spans.jsonl", compression)
+
+    with open(path, "wb") as f:
+        for k in range(3):
+            f.write(compress(f"line {k}\n".encode(), path))
+
+    assert read_text(path) == "line 0\nline 1\nline 2\n"
+
+
+def test_find_path_missing(tmp_path: Path):
+    with pytest.raises(FileNotFoundError):
+        find_path(tmp_path / "spans.json")
+
+    with pytest.raises(ValueError):
+        with_compression(tmp_path / "spans.json", "lz4")
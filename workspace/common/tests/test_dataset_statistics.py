@@ -0,0 +1,80 @@
+import collections
+from pathlib import Path
+
+#
+import numpy as np
+import pytest
+
+#
+from common.dataset_statistics import compute_dataset_statistics
+from common.io import write_numpy, read_numpy, write_sharded_numpy, read_sharded_numpy
+
+
+def get_X_y():
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 10, size=1000)
+    X = rng.integers(0, 17, size=(1000, 64)).astype(np.float64)
+    # make pixel distributions depend on label
+    X[:, 0] = y
+    return X, y
+
+
+def check_statistics(stats, X, y):
+    assert stats.nr_rows == len(y)
+    assert stats.label_counts == dict(sorted(collections.Counter(y.tolist()).items()))
+    assert stats.pixel_value_counts == dict(
+        sorted(collections.Counter(X.reshape(-1).tolist()).items())
+    )
+
+    assert np.allclose(stats.pixel_mean, X.mean(axis=0))
+    assert np.allclose(stats.pixel_var, X.var(axis=0))
+
+    labels = sorted(stats.label_counts.keys())
+    assert np.allclose(stats.class_pixel_mean, [X[y == k].mean(axis=0) for k in labels])
+    assert np.allclose(stats.class_pixel_var, [X[y == k].var(axis=0) for k in labels])
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000, 5000])
+def test_compute_dataset_statistics(chunk_size: int):
+    X, y = get_X_y()
+    check_statistics(compute_dataset_statistics(X, y, chunk_size=chunk_size), X, y)
+
+
+def test_compute_dataset_statistics_memory_mapped_and_sharded(tmp_path: Path):
+    X, y = get_X_y()
+
+    write_numpy(tmp_path / "digits.numpy", X)
+    write_numpy(tmp_path / "labels.numpy", y)
+    check_statistics(
+        compute_dataset_statistics(
+            read_numpy(tmp_path / "digits.numpy", mmap=True),
+            read_numpy(tmp_path / "labels.numpy", mmap=True),
+            chunk_size=300,
+        ),
+        X,
+        y,
+    )
+
+    # shard boundaries of X and y need not be aligned with chunks
+    write_sharded_numpy(tmp_path / "digits.shards", X, shard_size=128)
+    write_sharded_numpy(tmp_path / "labels.shards", y, shard_size=100)
+    check_statistics(
+        compute_dataset_statistics(
+            read_sharded_numpy(tmp_path / "digits.shards"),
+            read_sharded_numpy(tmp_path / "labels.shards"),
+            chunk_size=300,
+        ),
+        X,
+        y,
+    )
+
+
+def test_compute_dataset_statistics_non_integer_pixels():
+    X = np.array([[0.5, 1.0], [0.5, -2.0], [3.25, 1.0]])
+    y = np.array([2, 2, 5])
+
+    stats = compute_dataset_statistics(X, y, chunk_size=2)
+    assert stats.label_counts == {2: 2, 5: 1}
+    assert stats.pixel_value_counts == {-2.0: 1, 0.5: 2, 1.0: 2, 3.25: 1}
+    assert stats.class_pixel_mean.shape == (2, 2)
+    check_statistics(stats, X, y)
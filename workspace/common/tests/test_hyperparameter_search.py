@@ -0,0 +1,73 @@
+#
+import numpy as np
+
+#
+from common.hyperparameter_search import (
+    search_svc_hyperparameters,
+    serial_map,
+    make_process_map,
+)
+
+
+def get_X_y():
+    rng = np.random.default_rng(1)
+    centers = np.array([[0, 0], [3, 0], [0, 3]])
+    y = np.repeat([0, 1, 2], 30)
+    X = centers[y] + rng.normal(size=(len(y), 2))
+    return X, y
+
+
+def test_search_svc_hyperparameters():
+    X, y = get_X_y()
+
+    candidates = [
+        {"C": C, "kernel": kernel}
+        for C in [1e-6, 1e-4, 1e-2, 1.0]
+        for kernel in ["linear", "rbf"]
+    ]
+
+    nr_fits_per_round = []
+
+    def counting_map(f, X, y, jobs):
+        nr_fits_per_round.append(len(jobs))
+        return serial_map(f, X, y, jobs)
+
+    best, results = search_svc_hyperparameters(
+        X, y, candidates, nr_folds=4, reduction_factor=2, jobs_map=counting_map
+    )
+
+    # 8 candidates -> 4 -> 2 -> 1
+    assert nr_fits_per_round == [8, 4, 2, 1]
+
+    assert len(results) == len(candidates)
+    assert [r["params"] for r in results] == candidates
+    assert sorted(len(r["fold_scores"]) for r in results) == [1, 1, 1, 1, 2, 2, 3, 4]
+
+    # candidate evaluated on all folds is the best candidate
+    [best_result] = [r for r in results if r["stopped_after_fold"] is None]
+    assert best_result["params"] == best
+    assert len(best_result["fold_scores"]) == 4
+    assert best["C"] == 1.0
+    assert best_result["mean_score"] > 0.8
+
+
+def test_search_without_early_stopping():
+    X, y = get_X_y()
+
+    candidates = [{"C": C, "kernel": "linear"} for C in [0.1, 1.0]]
+    best, results = search_svc_hyperparameters(
+        X, y, candidates, nr_folds=3, reduction_factor=1
+    )
+
+    assert best in candidates
+    assert all(len(r["fold_scores"]) == 3 for r in results)
+    assert all(r["stopped_after_fold"] is None for r in results)
+
+
+def test_search_svc_hyperparameters_in_process_pool():
+    X, y = get_X_y()
+    candidates = [{"C": C, "kernel": "rbf"} for C in [1e-2, 1.0]]
+
+    assert search_svc_hyperparameters(
+        X, y, candidates, jobs_map=make_process_map(max_parallel=2)
+    ) == search_svc_hyperparameters(X, y, candidates, jobs_map=serial_map)
@@ -0,0 +1,81 @@
+import sys, subprocess
+from typing import Dict, List, Tuple
+
+#
+import pytest
+
+# Modules imported by light notebook tasks (eg. ingest, eda and split-train-test)
+LIGHT_MODULES = [
+    "common.utils",
+    "common.compression",
+    "common.io",
+    "common.span_writer",
+    "common.span_index",
+    "common.dataset_statistics",
+]
+
+# Heavy backends that should only be imported on first use
+HEAVY_PACKAGES = [
+    "onnx",
+    "onnxruntime",
+    "skl2onnx",
+    "sklearn",
+    "ray",
+    "matplotlib",
+    "pandas",
+    "opentelemetry",
+]
+
+# Budget for importing a light module, excluding the time to import numpy (that is
+# needed by all tasks), relative to the time to import numpy. A relative budget
+# scales with the speed of the machine running the tests. Note: the test above (no
+# heavy packages are imported) is the main check; this budget is generous.
+RELATIVE_IMPORT_TIME_BUDGET = 1.0
+
+
+def import_times(module: str) -> List[Tuple[str, int]]:
+    """
+    Import module in a new Python process, and return list of (name of imported
+    module, cumulative import time in microseconds), see python -X importtime.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    times: List[Tuple[str, int]] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        if cumulative_us.strip().isdigit():
+            times.append((name.strip(), int(cumulative_us)))
+    return times
+
+
+@pytest.mark.parametrize("module", LIGHT_MODULES)
+def test_light_modules_do_not_import_heavy_packages(module: str):
+    imported_modules = [name for name, _ in import_times(module)]
+    assert module in imported_modules
+
+    imported = {name.split(".")[0] for name in imported_modules}
+    assert imported.isdisjoint(HEAVY_PACKAGES), imported & set(HEAVY_PACKAGES)
+
+
+def import_time_s(module: str, excluded: List[str] = []) -> float:
+    """
+    Return time to import module, excluding the time to import excluded modules
+    """
+    times: Dict[str, int] = dict(import_times(module))
+    return (times[module] - sum(times.get(name, 0) for name in excluded)) / 1e6
+
+
+@pytest.mark.parametrize("module", LIGHT_MODULES)
+def test_light_modules_import_time_budget(module: str):
+    # best of a few runs, to reduce noise from other processes
+    module_s = min(import_time_s(module, excluded=["numpy"]) for _ in range(3))
+    numpy_s = min(import_time_s("numpy") for _ in range(3))
+
+    assert module_s < RELATIVE_IMPORT_TIME_BUDGET * numpy_s, (module_s, numpy_s)
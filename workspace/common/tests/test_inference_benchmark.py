@@ -0,0 +1,45 @@
+from pathlib import Path
+
+#
+import numpy as np
+
+#
+from common.io import write_onnx, convert_sklearn_to_onnx
+from common.inference_benchmark import benchmark_onnx_model
+
+
+def test_benchmark_onnx_model(tmp_path: Path):
+    from sklearn.linear_model import LogisticRegression
+
+    X = np.array(10 * [[1, 0]] + 10 * [[0, 1]])
+    y = np.array(10 * [0] + 10 * [1])
+
+    model_path = tmp_path / "model.onnx"
+    write_onnx(
+        model_path,
+        convert_sklearn_to_onnx(LogisticRegression().fit(X, y), "float_input", 2),
+    )
+
+    result = benchmark_onnx_model(
+        model_path,
+        X,
+        batch_sizes=[1, 8, 64, None],
+        thread_counts=[1, 2],
+        nr_warmup=1,
+        nr_repeats=5,
+    )
+
+    assert [(r["nr_threads"], r["batch_size"]) for r in result] == [
+        (1, 1),
+        (1, 8),
+        (1, 64),
+        (1, 20),
+        (2, 1),
+        (2, 8),
+        (2, 64),
+        (2, 20),
+    ]
+
+    for r in result:
+        assert 0 < r["latency_p50_ms"] <= r["latency_p95_ms"] <= r["latency_p99_ms"]
+        assert r["rows_per_s"] > 0
@@ -1,17 +1,32 @@
+import os
 from pathlib import Path
 
 #
 import numpy as np
+import pytest
 
 #
 from common.io import (
     write_numpy,
     read_numpy,
+    compact_dtype,
+    logical_dtype,
+    CastArray,
+    write_numpy_dataset,
+    read_numpy_dataset,
+    dataset_logical_dtype,
+    write_sharded_numpy,
+    read_sharded_numpy,
+    ShardedNumpyWriter,
     datalake_root,
     read_onnx,
     write_onnx,
+    OnnxSessionFactory,
+    OnnxSessionOptions,
     get_onnx_inputs,
     get_onnx_outputs,
+    convert_sklearn_to_onnx,
+    run_onnx_classifier,
 )
 
 
@@ -35,6 +50,173 @@ def test_numpy_read_write(tmp_path: Path):
     assert (v1 == v2).all()
 
 
+def test_numpy_read_mmap(tmp_path: Path):
+    filepath = tmp_path / "foo" / "bar.numpy"
+
+    v1 = np.arange(100 * 64).reshape(100, 64)
+    write_numpy(filepath, v1)
+
+    v2 = read_numpy(filepath, mmap=True)
+    assert isinstance(v2, np.memmap)
+    assert v2.dtype == v1.dtype
+    assert v1.shape == v2.shape
+    assert (v1 == v2).all()
+
+    # subsets of rows can be selected without reading the full array
+    idxs = np.array([3, 50, 99])
+    assert (v2[idxs] == v1[idxs]).all()
+
+    # memory-mapped arrays are read-only
+    with pytest.raises(ValueError):
+        v2[0, 0] = 123
+
+    assert (read_numpy(filepath) == v1).all()
+
+
+@pytest.mark.parametrize(
+    "values, expected_dtype",
+    [
+        (np.arange(17, dtype=np.float64), np.uint8),
+        (np.arange(10, dtype=np.int64), np.uint8),
+        (np.array([-1, 0, 100]), np.int8),
+        (np.array([0, 1000]), np.uint16),
+        (np.array([-(2**20), 2**20], dtype=np.float64), np.int32),
+        (np.array([0, 2**40]), np.int64),
+        (np.array([0.5, 1.0]), np.float64),
+        (np.array([0.0, np.nan]), np.float64),
+        (np.array([True, False]), np.bool_),
+        (np.array([], dtype=np.float64), np.float64),
+        (np.array([1, 2], dtype=np.uint8), np.uint8),
+    ],
+)
+def test_compact_dtype(values, expected_dtype):
+    assert compact_dtype(values) == np.dtype(expected_dtype)
+
+
+def test_numpy_compact_read_write(tmp_path: Path):
+    filepath = tmp_path / "digits.numpy"
+    v1 = np.random.RandomState(0).randint(0, 17, size=(100, 64)).astype(np.float64)
+
+    write_numpy(filepath, v1, compact=True)
+    assert filepath.stat().st_size < v1.nbytes / 7
+    assert logical_dtype(filepath) == np.float64
+
+    assert read_numpy(filepath).dtype == np.uint8
+    assert read_numpy(filepath, dtype="logical").dtype == np.float64
+    assert (read_numpy(filepath, dtype=np.float32) == v1).all()
+
+    # with mmap, rows are cast lazily
+    v2 = read_numpy(filepath, mmap=True, dtype=np.float32)
+    assert isinstance(v2, CastArray)
+    assert v2.shape == v1.shape and len(v2) == len(v1)
+    assert v2[3:5].dtype == np.float32
+    assert (v2[3:5] == v1[3:5]).all()
+    assert (np.asarray(v2) == v1).all()
+
+    # rewriting without compaction removes the logical dtype metadata
+    write_numpy(filepath, v1)
+    assert read_numpy(filepath).dtype == np.float64
+    assert logical_dtype(filepath) == np.float64
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["digits.numpy"]
+
+
+def test_numpy_datasets_are_compact(tmp_path: Path):
+    path = tmp_path / "labels.numpy"
+    y = np.arange(10, dtype=np.int64)
+
+    write_numpy_dataset({}, path, y)
+    assert read_numpy_dataset({}, path).dtype == np.uint8
+    assert read_numpy_dataset({}, path, dtype="logical")[:].dtype == np.int64
+
+    write_numpy_dataset({"pipeline.compact_dtypes": False}, path, y)
+    assert read_numpy_dataset({}, path).dtype == np.int64
+
+
+def test_numpy_datasets_keep_logical_dtype_when_rewritten(tmp_path: Path):
+    # eg. split-train-test reads compact datasets and writes subsets of them
+    path_in, path_out = tmp_path / "raw.numpy", tmp_path / "train.numpy"
+    X = np.arange(20, dtype=np.float64).reshape(10, 2)
+    write_numpy_dataset({}, path_in, X)
+
+    X_read = read_numpy_dataset({}, path_in)
+    assert X_read.dtype == np.uint8
+    assert dataset_logical_dtype({}, path_in) == np.float64
+
+    write_numpy_dataset(
+        {}, path_out, X_read[:5], logical_dtype=dataset_logical_dtype({}, path_in)
+    )
+    assert read_numpy_dataset({}, path_out).dtype == np.uint8
+    assert dataset_logical_dtype({}, path_out) == np.float64
+    assert (read_numpy_dataset({}, path_out, dtype="logical")[:] == X[:5]).all()
+    assert read_numpy_dataset({}, path_out, dtype="logical")[:].dtype == np.float64
+
+
+def test_sharded_numpy_streaming_append(tmp_path: Path):
+    path = tmp_path / "data" / "digits.shards"
+    xs = np.arange(1000 * 2 * 3).reshape(1000, 2, 3)
+
+    with ShardedNumpyWriter(path, shard_size=64) as writer:
+        # append batches of varying sizes (smaller and larger than shard size)
+        for batch_size, start in zip([1, 10, 200], [0, 1, 11]):
+            writer.append(xs[start : start + batch_size])
+
+        # rows are readable after each full shard is written
+        assert len(read_sharded_numpy(path)) == 3 * 64
+
+        writer.append(xs[211:])
+
+    sharded = read_sharded_numpy(path)
+    assert sharded.shape == xs.shape
+    assert sharded.dtype == xs.dtype
+    assert len(sharded) == 1000
+    assert sharded.nr_shards == 16
+    assert sharded.manifest["nr_rows"] == 1000
+
+    # iterate over shard-sized batches
+    batches = list(sharded.iter_batches())
+    assert [len(b) for b in batches] == 15 * [64] + [1000 - 15 * 64]
+    assert (np.concatenate(batches) == xs).all()
+
+    assert (sharded.to_numpy() == xs).all()
+
+
+def test_sharded_numpy_random_access(tmp_path: Path):
+    path = tmp_path / "labels.shards"
+    xs = np.arange(100) * 10
+    write_sharded_numpy(path, xs, shard_size=7)
+
+    sharded = read_sharded_numpy(path)
+    assert sharded.nr_shards == 15
+
+    for k in [0, 6, 7, 8, 98, 99, -1, -100]:
+        assert sharded[k] == xs[k]
+
+    for idx in [
+        slice(5, 30),
+        slice(None, None, -3),
+        np.array([99, 0, 7, 7, 50, 6]),
+        xs % 3 == 0,
+    ]:
+        assert (sharded[idx] == xs[idx]).all()
+
+    with pytest.raises(IndexError):
+        sharded[100]
+
+    # writing to an existing path overwrites the previous sharded array
+    write_sharded_numpy(path, xs[:10], shard_size=7)
+    assert (read_sharded_numpy(path).to_numpy() == xs[:10]).all()
+    assert sorted(p.name for p in path.glob("*.numpy")) == [
+        "shard-00000.numpy",
+        "shard-00001.numpy",
+    ]
+
+    # rows with different dtype or row shapes can not be appended
+    with pytest.raises(ValueError):
+        with ShardedNumpyWriter(path, shard_size=7) as writer:
+            writer.append(xs)
+            writer.append(xs.astype(np.float32))
+
+
 def test_onnx_io_for_a_svc_model(tmp_path: Path):
     from sklearn.svm import SVC
 
@@ -122,3 +304,104 @@ def test_onnx_io_for_a_svc_model(tmp_path: Path):
     assert np.allclose(
         sk_pred_probabilities, onnx_pred_probabilities, atol=1e-6, rtol=0
     )
+
+
+def test_onnx_session_factory(tmp_path: Path):
+    from sklearn.linear_model import LogisticRegression
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType
+
+    X = np.array(10 * [[1, 0]] + 10 * [[0, 1]], dtype=np.float32)
+    y = np.array(10 * [0] + 10 * [1])
+
+    def write_model(path: Path, C: float):
+        model = LogisticRegression(C=C).fit(X, y)
+        write_onnx(
+            path,
+            convert_sklearn(
+                model, initial_types=[("float_input", FloatTensorType([None, 2]))]
+            ),
+        )
+
+    model_path = tmp_path / "models" / "model.onnx"
+    write_model(model_path, C=1.0)
+
+    factory = OnnxSessionFactory(max_sessions=2)
+    optimized_model_dir = tmp_path / "optimized"
+    options = OnnxSessionOptions(
+        intra_op_num_threads=1,
+        inter_op_num_threads=1,
+        graph_optimization_level="extended",
+        optimized_model_dir=str(optimized_model_dir),
+    )
+
+    session = factory.get(model_path, options)
+    assert factory.get(model_path, options) is session
+    assert len(factory) == 1
+
+    # optimized model is persisted in the given directory (not next to model file)
+    optimized_paths = list(optimized_model_dir.glob("model.*.opt-extended.onnx"))
+    assert len(optimized_paths) == 1
+    assert list(model_path.parent.iterdir()) == [model_path]
+
+    # a new factory loads the persisted optimized model, with same predictions
+    session2 = OnnxSessionFactory().get(model_path, options)
+    assert session2 is not session
+    assert (session.run(None, {"float_input": X})[0] == y).all()
+    assert (session2.run(None, {"float_input": X})[0] == y).all()
+
+    # different options give different sessions
+    session3 = factory.get(
+        model_path, OnnxSessionOptions(graph_optimization_level="disabled")
+    )
+    assert session3 is not session
+    assert len(factory) == 2
+
+    # updating the model file gives a new session, and evicts least recently used.
+    # This holds also if the size and modification time of the file are unchanged.
+    stat = model_path.stat()
+    write_model(model_path, C=0.5)
+    os.utime(model_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert model_path.stat().st_size == stat.st_size
+    session4 = factory.get(model_path, options)
+    assert session4 is not session
+    assert len(factory) == 2
+    assert factory.get(model_path, options) is session4
+    assert len(list(optimized_model_dir.glob("model.*.opt-extended.onnx"))) == 2
+
+    # by default, optimized models are not persisted
+    OnnxSessionFactory().get(tmp_path / "models" / "model.onnx")
+    assert list(model_path.parent.iterdir()) == [model_path]
+
+    # hardware specific optimizations (level "all") are not persisted
+    with pytest.raises(ValueError):
+        OnnxSessionOptions(optimized_model_dir=str(optimized_model_dir))
+
+
+def test_onnx_classifier_tensor_outputs(tmp_path: Path):
+    from sklearn.svm import SVC
+
+    X = np.array(10 * [[1, 0]] + 20 * [[0, 1]] + 30 * [[0, 2]])
+    y = np.array(10 * [0] + 20 * [1] + 30 * [2])
+
+    model = SVC(C=1, kernel="linear", probability=True).fit(X, y)
+
+    model_path: Path = tmp_path / "model.onnx"
+    write_onnx(model_path, convert_sklearn_to_onnx(model, "float_input", 2))
+    onnx_inference_session = read_onnx(model_path)
+
+    assert get_onnx_outputs(onnx_inference_session) == [
+        {"name": "output_label", "shape": [None], "type": "tensor(int64)"},
+        {"name": "output_probability", "shape": [None, 3], "type": "tensor(float)"},
+    ]
+
+    for batch_size in [1, 7, 60, 1000]:
+        labels, probs = run_onnx_classifier(
+            onnx_inference_session, X, batch_size=batch_size
+        )
+        assert (labels == y).all()
+
+        assert probs.dtype == np.float32
+        assert probs.flags["C_CONTIGUOUS"]
+        assert probs.shape == (len(y), 3)
+        assert np.allclose(probs, model.predict_proba(X), atol=1e-6, rtol=0)
@@ -0,0 +1,182 @@
+import os, subprocess, sys, time
+from pathlib import Path
+from typing import List
+
+#
+import pytest
+
+pytest.importorskip("ray")
+
+#
+from common.kernel_pool import (
+    KernelPool,
+    RESET_CODE,
+    _leased_kernel_manager,
+    evaluate_notebook_in_kernel,
+)
+
+
+class FakeKernel:
+    next_pid = 10**6
+
+    def __init__(self):
+        self.executed: List[str] = []
+        self.alive = True
+        self.kernel_name = "python3"
+        self.pid = FakeKernel.next_pid
+        FakeKernel.next_pid += 1
+
+    def execute(self, code: str, timeout_s: float = 60):
+        self.executed.append(code)
+
+    def connection_info(self):
+        return {"pid": self.pid}
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+    def shutdown(self):
+        self.alive = False
+
+
+def make_pool(size: int, max_uses: int):
+    kernels: List[FakeKernel] = []
+
+    def start_kernel():
+        kernels.append(FakeKernel())
+        return kernels[-1]
+
+    pool = KernelPool(size=size, max_uses=max_uses, start_kernel=start_kernel)
+
+    # wait for kernels started in background
+    for _ in range(100):
+        if pool.stats()["nr_starting"] == 0:
+            break
+        time.sleep(0.01)
+
+    return pool, kernels
+
+
+def test_kernel_pool_reuses_and_resets_kernels():
+    pool, kernels = make_pool(size=2, max_uses=3)
+    assert pool.stats()["nr_idle"] == 2
+
+    lease1 = pool.lease(lessee_pid=1, cwd="/tmp/notebooks")
+    lease2 = pool.lease(lessee_pid=1)
+    assert lease1["kernel_id"] != lease2["kernel_id"]
+    assert pool.stats()["nr_idle"] == 0
+
+    [kernel1] = [k for k in kernels if k.pid == lease1["pid"]]
+    assert kernel1.executed[-1] == "import os; os.chdir('/tmp/notebooks'); del os"
+
+    # kernels are started with modules preloaded, and with a reset namespace
+    assert "importlib.import_module(_module)" in kernel1.executed[0]
+    assert kernel1.executed[1] == RESET_CODE
+
+    # all kernels are leased; a new kernel is started on demand
+    lease3 = pool.lease(lessee_pid=1)
+    assert len(kernels) == 3
+
+    # returned kernels are reset; kernels exceeding the pool size are shut down
+    for lease in [lease1, lease2, lease3]:
+        pool.release(lease["kernel_id"])
+    assert kernel1.executed[-1] == RESET_CODE
+    assert pool.stats()["nr_idle"] == 2
+    assert sum(k.alive for k in kernels) == 2
+
+    # idle kernels are leased again (no new kernel is started)
+    lease4 = pool.lease(lessee_pid=1)
+    assert lease4["kernel_id"] in {lease1["kernel_id"], lease2["kernel_id"]}
+    assert len(kernels) == 3
+
+
+def test_kernel_pool_recycles_kernels():
+    pool, kernels = make_pool(size=1, max_uses=2)
+
+    pids = []
+    for _ in range(4):
+        lease = pool.lease(lessee_pid=1)
+        pids.append(lease["pid"])
+        pool.release(lease["kernel_id"])
+
+        # replacement kernels are started in background
+        for _ in range(100):
+            if pool.stats()["nr_starting"] == 0:
+                break
+            time.sleep(0.01)
+
+    # each kernel is used at most max_uses times
+    assert pids[0] == pids[1] != pids[2] == pids[3]
+    assert not kernels[0].alive
+
+    # dead kernels are not reused
+    lease = pool.lease(lessee_pid=1)
+    [kernel] = [k for k in kernels if k.pid == lease["pid"]]
+    kernel.alive = False
+    pool.release(lease["kernel_id"])
+    assert pool.lease(lessee_pid=1)["pid"] != kernel.pid
+
+
+def test_kernel_pool_retires_kernels_of_killed_lessees():
+    pool, kernels = make_pool(size=1, max_uses=10)
+
+    # lease kernel for a process that has exited (eg. killed by a task timeout)
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    lease = pool.lease(lessee_pid=process.pid)
+
+    # next lease retires the abandoned kernel
+    assert pool.lease(lessee_pid=1)["pid"] != lease["pid"]
+    assert not kernels[0].alive
+    assert pool.stats()["nr_retired"] == 1
+
+    # release of a reaped lease is ignored
+    pool.release(lease["kernel_id"])
+
+
+NOTEBOOK = """
+# %% tags=["parameters"]
+x = None
+
+# %%
+import os
+from pathlib import Path
+
+Path(f"result-{x}.txt").write_text(str(os.getpid()))
+"""
+
+
+def test_notebook_evaluated_in_leased_kernel(tmp_path: Path):
+    pytest.importorskip("jupyter_client")
+    pytest.importorskip("papermill")
+    notebooks_helpers = pytest.importorskip("pynb_dag_runner.notebooks_helpers")
+
+    notebook_path = tmp_path / "notebook.py"
+    notebook_path.write_text(NOTEBOOK)
+
+    pool = KernelPool(size=1, max_uses=10, preload_modules=[])
+    try:
+        kernel_pids = []
+        for x in [1, 2]:
+            lease = pool.lease(lessee_pid=os.getpid(), cwd=str(tmp_path))
+            km = _leased_kernel_manager(lease)
+            evaluate_notebook_in_kernel(
+                notebooks_helpers.JupytextNotebook(notebook_path),
+                notebooks_helpers.JupyterIpynbNotebook(tmp_path / f"output-{x}.ipynb"),
+                {"x": x},
+                km,
+            )
+
+            # the leased kernel is not shut down after the notebook is evaluated
+            assert km.is_alive()
+            pool.release(lease["kernel_id"])
+            kernel_pids.append(lease["pid"])
+
+        # both notebooks were evaluated in the same (pooled) kernel
+        assert kernel_pids[0] == kernel_pids[1]
+        for x in [1, 2]:
+            assert (tmp_path / f"result-{x}.txt").read_text() == str(kernel_pids[0])
+            assert (tmp_path / f"output-{x}.ipynb").is_file()
+        assert pool.stats()["nr_started"] == 1
+    finally:
+        pool.shutdown()
@@ -0,0 +1,327 @@
+import json, time, threading
+from pathlib import Path
+from typing import Callable
+
+#
+import pytest
+
+pytest.importorskip("opentelemetry.sdk")
+
+#
+from opentelemetry import baggage, trace
+
+#
+from common.logging import setup_tracing
+from common.local_executor import (
+    _CpuPool,
+    set_scheduling,
+    task_from_python_function,
+    run_in_sequence,
+    fan_in,
+    start_and_await_tasks,
+)
+
+
+@pytest.fixture(scope="module")
+def spans_dir(tmp_path_factory) -> Path:
+    spans_dir = tmp_path_factory.mktemp("spans")
+    setup_tracing(spans_dir)
+    return spans_dir
+
+
+def read_spans(spans_dir: Path):
+    assert trace.get_tracer_provider().force_flush()  # type: ignore
+    return [
+        json.loads(line)
+        for path in spans_dir.glob("*.txt")
+        for line in path.read_text().splitlines()
+    ]
+
+
+def get_task_spans(spans, test_name: str):
+    return {
+        span["attributes"]["test.task"]: span
+        for span in spans
+        if span["name"] == "execute-task"
+        and span["attributes"].get("test.name") == test_name
+    }
+
+
+def make_task(test_name: str, task_name: str, f, **kwargs):
+    return task_from_python_function(
+        f,
+        attributes={"test.name": test_name, "test.task": task_name},
+        task_type="jupytext",
+        **kwargs,
+    )
+
+
+def test_local_executor_runs_dag(spans_dir: Path):
+    #  t1 -> t2 --> t4
+    #    \         ^
+    #     -> t3 --/
+    t1 = make_task("dag", "t1", lambda _: 1)
+    t2 = make_task("dag", "t2", lambda outcome: outcome.return_value + 1)
+    t3 = make_task("dag", "t3", lambda outcome: outcome.return_value + 2)
+    t4 = make_task(
+        "dag", "t4", lambda outcomes: [o.return_value for o in outcomes], num_cpus=0.5
+    )
+
+    run_in_sequence(t1, t2)
+    run_in_sequence(t1, t3)
+    fan_in([t2, t3], t4)
+
+    [outcome] = start_and_await_tasks([t1], [t4], timeout_s=60, arg={})
+    assert outcome.error is None
+    assert outcome.return_value == [2, 3]
+
+    spans = read_spans(spans_dir)
+    task_spans = get_task_spans(spans, "dag")
+    assert task_spans.keys() == {"t1", "t2", "t3", "t4"}
+
+    def span_id(task_name):
+        return task_spans[task_name]["context"]["span_id"]
+
+    assert outcome.span_id == span_id("t4")
+    for span in task_spans.values():
+        assert span["status"]["status_code"] == "OK"
+        assert span["attributes"]["task.task_type"] == "jupytext"
+
+    dependencies = {
+        (s["attributes"]["from_task_span_id"], s["attributes"]["to_task_span_id"])
+        for s in spans
+        if s["name"] == "task-dependency"
+    }
+    assert {
+        (span_id("t1"), span_id("t2")),
+        (span_id("t1"), span_id("t3")),
+        (span_id("t2"), span_id("t4")),
+        (span_id("t3"), span_id("t4")),
+    } <= dependencies
+
+    # span hierarchy is as for tasks run with pynb-dag-runner on Ray
+    by_id = {s["context"]["span_id"]: s for s in spans}
+
+    def ancestors(span):
+        result = []
+        while span["parent_id"] is not None:
+            span = by_id[span["parent_id"]]
+            result.append(span)
+        return result
+
+    [call_span] = [
+        s
+        for s in spans
+        if s["name"] == "call-python-function"
+        and ancestors(s)[-1]["context"]["span_id"] == span_id("t4")
+    ]
+    assert call_span["attributes"]["task.num_cpus"] == 0.5
+    assert [s["name"] for s in ancestors(call_span)] == [
+        "timeout-guard",
+        "retry-call",
+        "retry-wrapper",
+        "execute-task",
+    ]
+
+
+def test_local_executor_retries_and_timeouts(spans_dir: Path):
+    def f(_):
+        # retry number is passed as baggage (as for tasks run on Ray)
+        retry_nr = int(baggage.get_all()["run.retry_nr"])
+        if retry_nr == 0:
+            raise Exception("failure")
+        if retry_nr == 1:
+            time.sleep(1e6)
+        return retry_nr
+
+    task = make_task("retries", "t", f, timeout_s=1.0, max_nr_retries=3)
+
+    start_s = time.perf_counter()
+    [outcome] = start_and_await_tasks([task], [task], timeout_s=60, arg={})
+    assert time.perf_counter() - start_s < 30
+
+    assert outcome.error is None
+    assert outcome.return_value == 2
+
+    spans = read_spans(spans_dir)
+    task_span = get_task_spans(spans, "retries")["t"]
+    assert task_span["status"]["status_code"] == "OK"
+
+    timeout_guard_statuses = sorted(
+        (s["status"]["status_code"], s["status"].get("description"))
+        for s in spans
+        if s["name"] == "timeout-guard"
+        and s["attributes"]["task.timeout_s"] == 1.0
+        and s["context"]["trace_id"] == task_span["context"]["trace_id"]
+    )
+    assert timeout_guard_statuses == [("ERROR", "Timeout"), ("OK", None), ("OK", None)]
+
+
+def test_local_executor_failing_task(spans_dir: Path):
+    def f(_):
+        raise ValueError("failure in task")
+
+    t1 = make_task("failure", "t1", f, max_nr_retries=2)
+    t2 = make_task("failure", "t2", lambda outcome: outcome.error is not None)
+    run_in_sequence(t1, t2)
+
+    outcome1, outcome2 = start_and_await_tasks([t1], [t1, t2], timeout_s=60, arg={})
+    assert isinstance(outcome1.error, ValueError)
+    assert outcome2.return_value is True
+
+    task_spans = get_task_spans(read_spans(spans_dir), "failure")
+    assert task_spans["t1"]["status"]["status_code"] == "ERROR"
+    assert [e["name"] for e in task_spans["t1"]["events"]] == ["exception"]
+
+
+def test_local_executor_hedged_retries(spans_dir: Path):
+    def f(_):
+        retry_nr = int(baggage.get_all()["run.retry_nr"])
+        if retry_nr == 0:
+            raise Exception("failure")
+        if retry_nr == 1:
+            time.sleep(1e6)
+        return retry_nr
+
+    task = make_task(
+        "hedging", "t", f, timeout_s=60, max_nr_retries=5, hedge_after_s=1.0
+    )
+
+    start_s = time.perf_counter()
+    [outcome] = start_and_await_tasks([task], [task], timeout_s=60, arg={})
+    assert time.perf_counter() - start_s < 30
+
+    # the hanging attempt did not wait for the timeout, or use more attempts
+    assert outcome.error is None
+    assert outcome.return_value == 2
+
+    spans = read_spans(spans_dir)
+    task_span = get_task_spans(spans, "hedging")["t"]
+    retry_calls = sorted(
+        (
+            s["attributes"]["run.retry_nr"],
+            s["attributes"].get("run.hedged", False),
+            s["status"]["status_code"],
+            s["status"].get("description"),
+        )
+        for s in spans
+        if s["name"] == "retry-call"
+        and s["context"]["trace_id"] == task_span["context"]["trace_id"]
+    )
+    assert retry_calls == [
+        (0, False, "ERROR", "Run failed"),
+        (1, False, "ERROR", "Cancelled"),
+        (2, True, "OK", None),
+    ]
+
+
+def test_local_executor_hedge_delay():
+    def hedge_delay_s(**kwargs):
+        return make_task("hedging", "t", lambda _: None, **kwargs)._hedge_delay_s()
+
+    assert hedge_delay_s(hedge_after_s=5.0) == 5.0
+    assert hedge_delay_s(hedge_after_s=5.0, hedge_durations_s=[3.0, 1.0, 2.0]) == 3.0
+    assert (
+        hedge_delay_s(
+            hedge_after_s=5.0, hedge_durations_s=[float(k) for k in range(1, 11)]
+        )
+        == 9.0
+    )
+
+    # hedging is disabled without hedge_after_s
+    assert hedge_delay_s(hedge_durations_s=[1.0]) is None
+
+
+def wait_until(condition: Callable[[], bool], timeout_s: float = 10.0):
+    deadline_s = time.monotonic() + timeout_s
+    while not condition():
+        assert time.monotonic() < deadline_s, "Timeout waiting for condition"
+        time.sleep(0.01)
+
+
+def test_cpu_pool_grants_requests_by_priority():
+    pool = _CpuPool(nr_cpus=2)
+    granted = []
+
+    def wait(name, request):
+        pool.wait(request)
+        granted.append(name)
+
+    with pool.hold():
+        requests = {
+            name: pool.request(num_cpus, priority)
+            for name, num_cpus, priority in [
+                ("low", 1, 1.0),
+                ("high", 2, 3.0),
+                ("medium", 1, 2.0),
+            ]
+        }
+        threads = [
+            threading.Thread(target=wait, args=(name, request))
+            for name, request in requests.items()
+        ]
+        for thread in threads:
+            thread.start()
+
+        # no requests are granted while the pool is held
+        assert granted == []
+        assert len(pool._waiting) == 3
+
+    # high priority request is granted first (and uses all cores) ...
+    wait_until(lambda: granted == ["high"])
+    assert sorted(pool._waiting) == [requests["medium"], requests["low"]]
+
+    # ... and lower priority requests are granted when cores are released
+    pool.release(1)
+    wait_until(lambda: granted == ["high", "medium"])
+    assert pool._waiting == [requests["low"]]
+
+    pool.release(1)
+    for thread in threads:
+        thread.join()
+    assert granted == ["high", "medium", "low"]
+    assert pool._waiting == []
+
+
+@pytest.mark.parametrize("mode", ["fifo", "critical-path"])
+def test_local_executor_critical_path_scheduling(spans_dir: Path, mode: str):
+    #  t0 -> leaf
+    #    \
+    #     -> b -> c (long running)
+    set_scheduling(mode, lambda attributes: attributes.get("test.duration_s"))
+    try:
+
+        def make_timed_task(name: str, duration_s: float):
+            # tasks reserve all cores, so they run one at a time
+            return task_from_python_function(
+                lambda _: time.time(),
+                num_cpus=1e6,
+                attributes={
+                    "test.name": f"scheduling-{mode}",
+                    "test.task": name,
+                    "test.duration_s": duration_s,
+                },
+            )
+
+        t0 = make_timed_task("t0", 1)
+        leaf, b, c = (
+            make_timed_task("leaf", 1),
+            make_timed_task("b", 1),
+            make_timed_task("c", 5),
+        )
+        run_in_sequence(t0, leaf)
+        run_in_sequence(t0, b, c)
+
+        assert b.critical_path_s() == 6
+        assert t0.critical_path_s() == 7
+
+        outcomes = start_and_await_tasks([t0], [leaf, b, c], timeout_s=60, arg={})
+    finally:
+        set_scheduling("fifo")
+
+    leaf_time, b_time, _ = [outcome.return_value for outcome in outcomes]
+    assert leaf_time is not None and b_time is not None
+    if mode == "fifo":
+        assert leaf_time < b_time
+    else:
+        assert b_time < leaf_time
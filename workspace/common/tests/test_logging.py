@@ -0,0 +1,27 @@
+import sys
+
+#
+import pytest
+
+pytest.importorskip("pynb_dag_runner")
+
+#
+import common.logging
+from common.logging import make_pydar_logger
+
+
+def test_make_local_pydar_logger(monkeypatch):
+    # do not replace the tracer provider of the test process
+    tracing_setups = []
+    monkeypatch.setattr(
+        common.logging, "setup_tracing", lambda: tracing_setups.append(1)
+    )
+
+    P = {"pipeline.executor": "local", "_opentelemetry_traceparent": "00-abc-def-01"}
+    logger = make_pydar_logger(P)
+
+    assert logger._traceparent == "00-abc-def-01"
+    assert tracing_setups == [1]
+
+    # the local logger does not connect to (or start) a Ray cluster
+    assert "ray" not in sys.modules or not sys.modules["ray"].is_initialized()
@@ -0,0 +1,62 @@
+from pathlib import Path
+
+#
+import numpy as np
+import pytest
+
+ray = pytest.importorskip("ray")
+
+#
+from common.io import write_numpy_dataset, read_numpy_dataset, read_numpy
+from common.object_store import start_dataset_registry, wait_for_persisted
+
+
+@pytest.fixture(scope="module")
+def ray_cluster():
+    ray.init(num_cpus=2, namespace="pydar-ray-cluster", include_dashboard=False)
+    yield
+    ray.shutdown()
+
+
+def test_numpy_datasets_without_object_store(tmp_path: Path):
+    P = {"pipeline.pipeline_run_id": "run-1"}
+    path = tmp_path / "train-data" / "digits.numpy"
+
+    write_numpy_dataset(P, path, np.arange(10))
+    assert (read_numpy(path) == np.arange(10)).all()
+    assert (read_numpy_dataset(P, path) == np.arange(10)).all()
+
+
+def test_numpy_datasets_in_object_store(ray_cluster, tmp_path: Path):
+    registry = start_dataset_registry()
+
+    P = {"pipeline.pipeline_run_id": "run-1", "pipeline.object_store_datasets": True}
+    path1 = tmp_path / "train-data" / "digits.numpy"
+    path2 = tmp_path / "test-data" / "digits.numpy"
+
+    xs = np.arange(64 * 1000).reshape(1000, 64)
+    write_numpy_dataset(P, path1, xs)
+    write_numpy_dataset({**P, "pipeline.persist_datasets": False}, path2, xs[:10])
+
+    # arrays are read from object store (read-only)
+    v1 = read_numpy_dataset(P, path1)
+    assert (v1 == xs).all()
+    assert not v1.flags.writeable
+
+    assert (read_numpy_dataset(P, path2) == xs[:10]).all()
+
+    # arrays are stored in compact dtypes, and can be cast when read
+    assert v1.dtype == np.uint16
+    assert read_numpy_dataset(P, path1, dtype="logical")[:2].dtype == xs.dtype
+
+    # arrays are persisted to the data lake (unless disabled)
+    wait_for_persisted(P, tmp_path)
+    assert (read_numpy(path1) == xs).all()
+    assert read_numpy(path1, dtype="logical").dtype == xs.dtype
+    assert not path2.is_file()
+
+    # published arrays are scoped per pipeline run
+    with pytest.raises(AssertionError):
+        read_numpy_dataset({**P, "pipeline.pipeline_run_id": "run-2"}, path2)
+
+    ray.kill(registry)
@@ -0,0 +1,80 @@
+import functools
+
+#
+import numpy as np
+import pytest
+
+#
+from common.plotting import figure_to_png, render_figures
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+
+def plot_histogram(values, title: str):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(4, 3))
+    ax.hist(values, bins=10)
+    ax.set_title(title)
+    return fig
+
+
+def failing_plot():
+    raise ValueError("plot failed")
+
+
+def test_figure_to_png():
+    import matplotlib.pyplot as plt
+
+    fig = plot_histogram(np.arange(10), "foo")
+    png = figure_to_png(fig)
+
+    assert png.startswith(PNG_HEADER)
+    assert not plt.fignum_exists(fig.number)
+
+
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_render_figures(max_workers: int):
+    rng = np.random.default_rng(0)
+    plot_functions = [
+        functools.partial(plot_histogram, rng.normal(size=100), f"digit {digit}")
+        if digit % 2 == 0
+        else functools.partial(plot_histogram, np.zeros(10), "zeros")
+        for digit in range(5)
+    ]
+
+    pngs = render_figures(plot_functions, max_workers=max_workers)
+    assert len(pngs) == 5
+    assert all(png.startswith(PNG_HEADER) for png in pngs)
+
+    # figures are rendered in order
+    assert pngs[1] == pngs[3]
+    assert pngs[0] != pngs[2]
+
+
+def test_render_figures_propagates_errors():
+    with pytest.raises(ValueError):
+        render_figures([failing_plot, failing_plot], max_workers=2)
+
+
+def test_render_pipeline_figures():
+    from common.figures import (
+        plot_digit_images,
+        plot_per_digit_probabilities,
+        plot_roc_curves,
+    )
+
+    rng = np.random.default_rng(0)
+    X = rng.integers(0, 17, size=(30, 64))
+    y = np.arange(30) % 10
+    y_pred_probs = rng.uniform(size=(30, 10))
+
+    pngs = render_figures(
+        [
+            functools.partial(plot_digit_images, X[y == 3], 3),
+            functools.partial(plot_per_digit_probabilities, y_pred_probs),
+            functools.partial(plot_roc_curves, y, y_pred_probs),
+        ],
+        max_workers=3,
+    )
+    assert all(png.startswith(PNG_HEADER) for png in pngs)
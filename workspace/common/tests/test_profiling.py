@@ -0,0 +1,106 @@
+import json
+from pathlib import Path
+
+#
+import pytest
+
+#
+from common.profiling import (
+    _CellProfiler,
+    profile_parameters,
+    read_profile,
+    start_profiling,
+    stop_profiling,
+)
+
+
+def busy_function(n: int) -> int:
+    return sum(k * k for k in range(n))
+
+
+def allocating_function(n: int):
+    return [bytearray(1024) for _ in range(n)]
+
+
+def test_profile_parameters(tmp_path: Path):
+    assert profile_parameters("none", tmp_path) == {}
+    assert profile_parameters("all", tmp_path) == {
+        "_profile_mode": "all",
+        "_profile_dir": str(tmp_path),
+    }
+
+    # not profiling outside of a kernel, or when not enabled
+    start_profiling({})
+    start_profiling(profile_parameters("all", tmp_path))
+    assert read_profile(tmp_path) == {}
+
+
+def test_cell_profiler(tmp_path: Path):
+    profiler = _CellProfiler("all", tmp_path)
+
+    # allocations in the first cell are held, and the peak is higher in second cell
+    profiler.pre_run_cell()
+    busy_function(10**5)
+    held = allocating_function(1000)
+    profiler.post_run_cell()
+
+    profiler.pre_run_cell()
+    _ = allocating_function(4000)
+    profiler.post_run_cell()
+    profiler.stop()
+
+    artefacts = read_profile(tmp_path)
+    assert artefacts.keys() == {
+        "profile-cprofile.txt",
+        "profile-tracemalloc.txt",
+        "profile-summary.json",
+    }
+    assert "busy_function" in artefacts["profile-cprofile.txt"]
+
+    summary = json.loads(artefacts["profile-summary.json"])
+    assert summary["mode"] == "all"
+    assert any(
+        "busy_function" in row["function"] for row in summary["cpu"]["top_cumulative"]
+    )
+    assert len(summary["cpu"]["top_own_time"]) > 0
+
+    # peak of second cell
+    assert summary["memory"]["peak_memory_mb"] >= 4000 * 1024 / 2**20
+    assert "test_profiling.py" in summary["memory"]["top_allocations"][0]["location"]
+    assert len(held) == 1000
+
+
+def test_cell_profiler_cpu_only(tmp_path: Path):
+    profiler = _CellProfiler("cpu", tmp_path)
+    profiler.pre_run_cell()
+    busy_function(1000)
+    profiler.post_run_cell()
+    profiler.stop()
+
+    summary = json.loads(read_profile(tmp_path)["profile-summary.json"])
+    assert summary.keys() == {"mode", "cpu"}
+    assert not (tmp_path / "profile-tracemalloc.txt").exists()
+
+
+def test_profiling_in_ipython_shell(tmp_path: Path):
+    interactiveshell = pytest.importorskip("IPython.core.interactiveshell")
+
+    shell = interactiveshell.InteractiveShell.instance()
+    try:
+        start_profiling(profile_parameters("cpu", tmp_path))
+        shell.run_cell("def notebook_function(): return sum(range(10**7))")
+        shell.run_cell("notebook_function()")
+        stop_profiling()
+
+        summary = json.loads(read_profile(tmp_path)["profile-summary.json"])
+        assert any(
+            "notebook_function" in row["function"]
+            for row in summary["cpu"]["top_cumulative"]
+        )
+
+        # cells are not profiled after profiling is stopped
+        (tmp_path / "profile-summary.json").unlink()
+        shell.run_cell("notebook_function()")
+        assert read_profile(tmp_path).keys() == {"profile-cprofile.txt"}
+    finally:
+        interactiveshell.InteractiveShell.clear_instance()
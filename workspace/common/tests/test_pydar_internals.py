@@ -0,0 +1,27 @@
+import importlib.metadata
+
+#
+import pytest
+
+pytest.importorskip("pynb_dag_runner")
+
+#
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+
+#
+from common.pydar_internals import PYNB_DAG_RUNNER_VERSION, get_traceparent
+
+
+def test_pinned_pynb_dag_runner_version():
+    # the adapter uses non-public helpers; recheck them when this fails
+    assert importlib.metadata.version("pynb-dag-runner") == PYNB_DAG_RUNNER_VERSION
+
+
+def test_get_traceparent():
+    tracer = TracerProvider().get_tracer(__name__)
+    with tracer.start_as_current_span("span") as span:
+        trace_id = trace.format_trace_id(span.get_span_context().trace_id)
+        span_id = trace.format_span_id(span.get_span_context().span_id)
+
+        assert get_traceparent().startswith(f"00-{trace_id}-{span_id}-")
@@ -0,0 +1,136 @@
+import json
+
+#
+import pytest
+
+#
+from common.span_index import SpanIndex
+
+
+def make_span(span_id, parent_id, name, attributes={}, start_time="2022-01-01T00"):
+    return {
+        "name": name,
+        "context": {"span_id": span_id},
+        "parent_id": parent_id,
+        "start_time": start_time,
+        "attributes": attributes,
+    }
+
+
+def make_named_value(span_id, parent_id, name, value, start_time="2022-01-01T00"):
+    return make_span(
+        span_id,
+        parent_id,
+        "named-value",
+        {
+            "name": name,
+            "type": "json",
+            "encoding": "json",
+            "content_encoded": json.dumps(value),
+        },
+        start_time,
+    )
+
+
+def get_test_spans():
+    #   0x1 (execute-task, benchmark-model.py, n=100)
+    #    └ 0x2 (call-python-function)
+    #       ├ 0x3 (named-value auc=0.1)
+    #       └ 0x4 (named-value auc=0.2, logged after 0x3)
+    #   0x5 (execute-task, train-model.py, n=100)
+    #    └ 0x6 (named-value auc=0.9)
+    return [
+        make_span(
+            "0x1",
+            None,
+            "execute-task",
+            {"task.notebook": "notebooks/benchmark-model.py", "task.n": 100},
+        ),
+        make_span("0x2", "0x1", "call-python-function"),
+        make_named_value("0x3", "0x2", "auc", 0.1, "2022-01-01T01"),
+        make_named_value("0x4", "0x2", "auc", 0.2, "2022-01-01T02"),
+        make_span(
+            "0x5",
+            None,
+            "execute-task",
+            {"task.notebook": "notebooks/train-model.py", "task.n": 100},
+        ),
+        make_named_value("0x6", "0x5", "auc", 0.9),
+    ]
+
+
+def test_span_index_lookups():
+    index = SpanIndex(get_test_spans())
+    assert len(index) == 6
+
+    def ids(spans):
+        return [s["context"]["span_id"] for s in spans]
+
+    assert index.get("0x4")["parent_id"] == "0x2"
+    assert index.get("0x99") is None
+
+    assert ids(index.filter("execute-task")) == ["0x1", "0x5"]
+    assert ids(index.filter("execute-task", {"task.n": 100})) == ["0x1", "0x5"]
+    assert ids(
+        index.filter("execute-task", {"task.notebook": "notebooks/benchmark-model.py"})
+    ) == ["0x1"]
+    assert ids(index.filter(attributes={"name": "auc"})) == ["0x3", "0x4", "0x6"]
+    assert index.filter("no-such-span") == []
+    assert len(index.filter()) == 6
+
+    assert ids(index.children(index.get("0x1"))) == ["0x2"]
+    assert sorted(ids(index.descendants(index.get("0x1")))) == ["0x2", "0x3", "0x4"]
+    assert index.descendants(index.get("0x4")) == []
+
+
+def test_span_index_logged_values():
+    pytest.importorskip("pynb_dag_runner")
+
+    index = SpanIndex(get_test_spans())
+
+    # last logged value is returned
+    assert index.logged_values(index.get("0x1")) == {"auc": 0.2}
+    assert index.logged_values(index.get("0x5")) == {"auc": 0.9}
+
+
+class CountingSpan(dict):
+    """
+    Span that counts how often its fields are read
+    """
+
+    nr_reads = 0
+
+    def __getitem__(self, key):
+        CountingSpan.nr_reads += 1
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        CountingSpan.nr_reads += 1
+        return super().get(key, default)
+
+
+def test_span_index_lookups_do_not_scan_all_spans():
+    spans = []
+    for task_nr in range(1000):
+        task_id, fn_id = f"0x{task_nr}a", f"0x{task_nr}b"
+        spans.append(make_span(task_id, None, "execute-task", {"task.nr": task_nr}))
+        spans.append(make_span(fn_id, task_id, "call-python-function"))
+        for value_nr in range(20):
+            spans.append(make_span(f"0x{task_nr}v{value_nr}", fn_id, "named-value"))
+
+    index = SpanIndex([CountingSpan(span) for span in spans])
+    task_spans = index.filter("execute-task")
+
+    # attribute index is built on first lookup by attribute key
+    assert index.filter("execute-task", {"task.nr": 0}) == [task_spans[0]]
+
+    for span in task_spans:
+        # lookups only read the spans they return (not all 22000 spans)
+        CountingSpan.nr_reads = 0
+        assert len(index.descendants(span)) == 21
+        assert CountingSpan.nr_reads <= 2 * 22
+
+        CountingSpan.nr_reads = 0
+        task_nr = span["attributes"]["task.nr"]
+        assert index.filter("execute-task", {"task.nr": task_nr}) == [span]
+        assert CountingSpan.nr_reads <= 2 * 2
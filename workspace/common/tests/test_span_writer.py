@@ -0,0 +1,82 @@
+import json
+from pathlib import Path
+
+#
+import pytest
+
+#
+from common.span_writer import (
+    StreamingSpanWriter,
+    read_jsonl,
+    read_spans,
+    write_json_array_from_jsonl,
+)
+
+
+def make_span(span_id: str, events=[]):
+    return {"name": "foo", "context": {"span_id": span_id}, "events": events}
+
+
+def append_spans(path: Path, spans, partial_line: str = ""):
+    with open(path, "a") as f:
+        for span in spans:
+            f.write(json.dumps(span) + "\n")
+        f.write(partial_line)
+
+
+@pytest.mark.parametrize(
+    "output_name", ["spans.jsonl", "spans.jsonl.gz", "spans.jsonl.zst"]
+)
+def test_streaming_span_writer(tmp_path: Path, output_name: str):
+    if output_name.endswith(".zst"):
+        pytest.importorskip("zstandard")
+
+    spans_dir = tmp_path / "spans"
+    spans_dir.mkdir()
+    output_path = tmp_path / "out" / output_name
+
+    # spans written before the writer is started are skipped
+    append_spans(spans_dir / "1.txt", [make_span("0x0")])
+
+    exception = {"name": "exception", "attributes": {"exception.message": "boom"}}
+
+    with StreamingSpanWriter(output_path, spans_dir, poll_interval_s=60) as writer:
+        append_spans(spans_dir / "1.txt", [make_span("0x1")])
+        append_spans(
+            spans_dir / "2.txt",
+            [make_span("0x2", [exception])],
+            # span not fully written yet
+            partial_line='{"name": "foo", "context": {"sp',
+        )
+        assert writer.poll() == 2
+
+        # spans are readable while the writer is running
+        assert [s["context"]["span_id"] for s in read_jsonl(output_path)] == [
+            "0x1",
+            "0x2",
+        ]
+
+        with open(spans_dir / "2.txt", "a") as f:
+            f.write('an_id": "0x3"}, "events": []}\n')
+
+    assert writer.nr_spans == 3
+    assert writer.exception_events == [exception]
+    assert read_jsonl(output_path) == [
+        make_span("0x1"),
+        make_span("0x2", [exception]),
+        make_span("0x3"),
+    ]
+
+    json_path = tmp_path / "out" / ("spans.json" + "".join(output_path.suffixes[1:]))
+    write_json_array_from_jsonl(output_path, json_path)
+    assert read_spans(json_path) == read_jsonl(output_path)
+
+    # spans can be read without giving the compression suffix
+    assert read_spans(tmp_path / "out" / "spans.json") == read_jsonl(output_path)
+    assert read_spans(tmp_path / "out" / "spans.jsonl") == read_jsonl(output_path)
+
+
+def test_json_array_from_empty_jsonl(tmp_path: Path):
+    (tmp_path / "empty.jsonl").write_text("")
+    write_json_array_from_jsonl(tmp_path / "empty.jsonl", tmp_path / "empty.json")
+    assert json.loads((tmp_path / "empty.json").read_text()) == []
@@ -0,0 +1,113 @@
+from pathlib import Path
+
+#
+import numpy as np
+
+#
+from common.io import write_numpy, read_numpy
+from common.task_cache import TaskCache, task_cache_key, digest_path
+
+
+def test_digest_path(tmp_path: Path):
+    d = tmp_path / "data"
+    write_numpy(d / "a" / "x.numpy", np.arange(10))
+    write_numpy(d / "y.numpy", np.arange(5))
+
+    digest0 = digest_path(d)
+    assert digest0 == digest_path(d)
+    assert digest0 != digest_path(d / "a")
+
+    # python caches do not change the digest
+    (d / "__pycache__").mkdir()
+    (d / "__pycache__" / "foo.pyc").write_bytes(b"123")
+    assert digest0 == digest_path(d)
+
+    # changing content of a file changes the digest
+    write_numpy(d / "a" / "x.numpy", np.arange(10) + 1)
+    assert digest0 != digest_path(d)
+
+    # missing paths and empty directories have distinct digests
+    (tmp_path / "empty").mkdir()
+    assert digest_path(tmp_path / "empty") != digest_path(tmp_path / "missing")
+
+
+def test_task_cache_key(tmp_path: Path):
+    nb_path = tmp_path / "notebook.py"
+    nb_path.write_text("print(1)")
+    input_path = tmp_path / "data-lake" / "raw"
+    write_numpy(input_path / "x.numpy", np.arange(10))
+
+    P = {
+        "pipeline.pipeline_run_id": "abc",
+        "pipeline.github.sha": "123",
+        "pipeline.executor": "ray",
+        "pipeline.run_environment": "dev",
+        "task.num_cpus": 1,
+        "task.timeout_s": 10.0,
+    }
+    task_parameters = {"task.nr_train_images": 600}
+
+    def get_key(P, task_parameters=task_parameters):
+        return task_cache_key(
+            nb_path, task_parameters, input_paths=[input_path], pipeline_parameters=P
+        )
+
+    key0 = get_key(P)
+
+    # per-run parameters, and how a task is run, are not part of the cache key
+    for k, v in [
+        ("pipeline.pipeline_run_id", "def"),
+        ("pipeline.github.sha", "456"),
+        ("pipeline.executor", "local"),
+        ("task.num_cpus", 2),
+        ("task.timeout_s", 20.0),
+    ]:
+        assert key0 == get_key({**P, k: v})
+
+    # task parameters, allowlisted pipeline parameters, notebook and input data are
+    # part of the cache key
+    assert key0 != get_key(P, {"task.nr_train_images": 800})
+    assert key0 != get_key({**P, "pipeline.run_environment": "ci"})
+
+    write_numpy(input_path / "x.numpy", np.arange(11))
+    key1 = get_key(P)
+    assert key0 != key1
+
+    nb_path.write_text("print(2)")
+    assert key1 != get_key(P)
+
+
+def test_task_cache_store_restore(tmp_path: Path):
+    cache = TaskCache(tmp_path / "cache")
+    data_lake_1 = tmp_path / "data-lake-1"
+    data_lake_2 = tmp_path / "data-lake-2"
+
+    write_numpy(data_lake_1 / "train-data" / "digits.numpy", np.arange(10))
+    write_numpy(data_lake_1 / "test-data" / "digits.numpy", np.arange(5))
+    logged_spans = [{"name": "named-value", "attributes": {"name": "nr_digits"}}]
+
+    assert cache.restore("key-1", data_lake_2) is None
+
+    cache.store("key-1", data_lake_1, ["train-data", "test-data"], logged_spans)
+    assert cache.contains("key-1")
+    assert not cache.contains("key-2")
+
+    assert cache.restore("key-1", data_lake_2) == logged_spans
+    for split, expected in [("train-data", np.arange(10)), ("test-data", np.arange(5))]:
+        assert (read_numpy(data_lake_2 / split / "digits.numpy") == expected).all()
+
+    # restored outputs replace existing outputs (eg. of a previous run)
+    write_numpy(data_lake_2 / "train-data" / "stale.numpy", np.arange(3))
+    (data_lake_2 / "test-data" / "digits.numpy").unlink()
+    (data_lake_2 / "test-data" / "digits.numpy").mkdir()
+
+    assert cache.restore("key-1", data_lake_2) == logged_spans
+    assert sorted(p.name for p in (data_lake_2 / "train-data").iterdir()) == [
+        "digits.numpy"
+    ]
+    assert (
+        read_numpy(data_lake_2 / "test-data" / "digits.numpy") == np.arange(5)
+    ).all()
+
+    # no temp directories are left in the cache directory
+    assert [p.name for p in (tmp_path / "cache").iterdir()] == ["key-1"]
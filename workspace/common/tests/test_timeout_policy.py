@@ -0,0 +1,125 @@
+import json
+from pathlib import Path
+
+#
+from common.timeout_policy import (
+    TaskDurationHistory,
+    TimeoutPolicy,
+    span_duration_s,
+    task_history_key,
+)
+
+
+def make_span(span_id, parent_id, name, attributes={}, duration_s=0, ok=True):
+    return {
+        "name": name,
+        "context": {"span_id": span_id},
+        "parent_id": parent_id,
+        "start_time": "2022-11-14T10:00:00.000000Z",
+        "end_time": f"2022-11-14T10:00:{duration_s:09.6f}Z",
+        "attributes": attributes,
+        "status": {"status_code": "OK" if ok else "ERROR"},
+    }
+
+
+def make_task_spans(run_nr: int, attributes, attempts, cache_hit=False):
+    """
+    Return spans of a task run with attempts given as list of (duration, is_ok)
+    """
+    prefix = f"0x{run_nr}"
+    spans = [
+        make_span(
+            f"{prefix}-task",
+            None,
+            "execute-task",
+            {**attributes, "task.task_type": "jupytext"},
+        ),
+        make_span(f"{prefix}-retry", f"{prefix}-task", "retry-wrapper"),
+    ]
+    for k, (duration_s, is_ok) in enumerate(attempts):
+        spans += [
+            make_span(
+                f"{prefix}-{k}",
+                f"{prefix}-retry",
+                "retry-call",
+                {"run.retry_nr": k},
+                duration_s=duration_s,
+                ok=is_ok,
+            ),
+            make_span(
+                f"{prefix}-{k}-call",
+                f"{prefix}-{k}",
+                "call-python-function",
+                {"task.cache_hit": cache_hit},
+            ),
+        ]
+    return spans
+
+
+def task_attributes(notebook_dir: str, n: int):
+    return {
+        "task.notebook": f"{notebook_dir}/notebooks/train-model.py",
+        "task.nr_train_images": n,
+        "task.num_cpus": 2,
+        "pipeline.run_environment": "ci",
+        "pipeline.pipeline_run_id": notebook_dir,
+    }
+
+
+def test_span_duration_s():
+    assert span_duration_s(make_span("0x1", None, "s", duration_s=12.5)) == 12.5
+
+
+def test_task_history_key():
+    # per-run attributes, and the location of the notebook, are ignored
+    assert task_history_key(task_attributes("/a", 100)) == task_history_key(
+        {**task_attributes("/b", 100), "task.task_type": "jupytext"}
+    )
+    assert task_history_key(task_attributes("/a", 100)) != task_history_key(
+        task_attributes("/a", 200)
+    )
+
+
+def test_task_duration_history(tmp_path: Path):
+    spans = (
+        # failed attempts are not included
+        make_task_spans(1, task_attributes("/a", 100), [(1, False), (10, True)])
+        + make_task_spans(2, task_attributes("/b", 100), [(20, True)])
+        # attempts where outputs were restored from the task cache are not included
+        + make_task_spans(3, task_attributes("/c", 100), [(0.1, True)], cache_hit=True)
+        + make_task_spans(4, task_attributes("/d", 200), [(30, True)])
+    )
+
+    spans_path = tmp_path / "opentelemetry-spans.json"
+    spans_path.write_text(json.dumps(spans))
+
+    history = TaskDurationHistory.from_files([spans_path, tmp_path / "missing.json"])
+    assert sorted(history.durations_s(task_attributes("/e", 100))) == [10, 20]
+    assert history.durations_s(task_attributes("/e", 200)) == [30]
+    assert history.durations_s(task_attributes("/e", 300)) == []
+
+    assert history.estimate_duration_s(task_attributes("/e", 100)) == 15
+    assert history.estimate_duration_s(task_attributes("/e", 300)) is None
+
+
+def test_timeout_policy():
+    spans = [
+        span
+        for run_nr, duration_s in enumerate([10, 10, 12, 20])
+        for span in make_task_spans(
+            run_nr, task_attributes("/a", 100), [(duration_s, True)]
+        )
+    ]
+
+    policy = TimeoutPolicy(
+        TaskDurationHistory(spans), quantile=1.0, relative_margin=0.5, margin_s=2
+    )
+    assert policy.timeout_s(task_attributes("/b", 100), None) == 32.0
+    assert policy.timeout_s(task_attributes("/b", 100), 10) == 32.0
+
+    # static timeout is used for tasks with too little history
+    assert policy.timeout_s(task_attributes("/b", 200), 10) == 10
+    assert policy.timeout_s(task_attributes("/b", 200), None) is None
+
+    policy = TimeoutPolicy(TaskDurationHistory(spans), min_nr_samples=5)
+    assert policy.timeout_s(task_attributes("/b", 100), 10) == 10
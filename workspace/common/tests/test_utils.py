@@ -1,9 +1,24 @@
-from common.utils import chunkify, make_panel_image
+import itertools as it
+
+#
+from common.utils import (
+    chunkify,
+    make_panel_image,
+    iter_panel_images,
+    downsample_images,
+    get_num_cpus,
+)
 
 #
 import numpy as np
 
 
+def test_get_num_cpus():
+    assert get_num_cpus({}) == 1
+    assert get_num_cpus({"task.num_cpus": 0.5}) == 1
+    assert get_num_cpus({"task.num_cpus": 2}) == 2
+
+
 def test_chunkify_list():
     assert list(chunkify([1, 2, 3], 1)) == [[1], [2], [3]]
     assert list(chunkify([1, 2, 3], 2)) == [[1, 2], [3]]
@@ -41,6 +56,65 @@ def test_chunkify_numpy():
     assert_list_of_arrs_eq(list(chunkify(xs, chunk_size=N + 1)), [xs])
 
 
+def test_chunkify_drop_last():
+    assert list(chunkify([1, 2, 3], 2, drop_last=True)) == [[1, 2]]
+    assert list(chunkify([1, 2, 3, 4], 2, drop_last=True)) == [[1, 2], [3, 4]]
+    assert list(chunkify([1, 2, 3], 4, drop_last=True)) == []
+
+    xs = np.arange(10).reshape(5, 2)
+    assert [c.shape for c in chunkify(xs, 2, drop_last=True)] == 2 * [(2, 2)]
+
+
+def test_chunkify_iterators():
+    def gen(n):
+        yield from range(n)
+
+    assert list(chunkify(gen(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(chunkify(gen(4), 2)) == [[0, 1], [2, 3]]
+    assert list(chunkify(gen(5), 2, drop_last=True)) == [[0, 1], [2, 3]]
+
+    # chunks are computed lazily
+    chunks = chunkify(it.count(), 3)
+    assert next(chunks) == [0, 1, 2]
+    assert next(chunks) == [3, 4, 5]
+
+
+def test_chunkify_empty_sized_inputs():
+    assert list(chunkify([], 2)) == [[]]
+    assert list(chunkify([], 2, drop_last=True)) == []
+
+    [chunk] = chunkify(np.zeros((0, 3)), 2)
+    assert chunk.shape == (0, 3)
+
+
+def test_chunkify_empty_iterators():
+    assert list(chunkify(iter([]), 2)) == [[]]
+    assert list(chunkify(iter([]), 2, drop_last=True)) == []
+
+
+def test_chunkify_large_inputs():
+    N = 10**6
+
+    # list with one chunk per element (this would exceed Python's max recursion
+    # depth for a recursive implementation)
+    xs = list(range(N))
+    chunk_count = 0
+    for k, chunk in enumerate(chunkify(xs, 1)):
+        assert chunk == [k]
+        chunk_count += 1
+    assert chunk_count == N
+
+    assert [len(c) for c in chunkify(range(N + 3), 1000)] == 1000 * [1000] + [3]
+
+    # chunks of numpy arrays are views into the input array
+    arr = np.arange(4 * N).reshape(N, 4)
+    chunks = list(chunkify(arr, 7))
+    assert len(chunks) == N // 7 + 1
+    assert all(chunk.base is arr.base for chunk in chunks)
+    assert (np.concatenate(chunks) == arr).all()
+    assert len(chunks[-1]) == N % 7
+
+
 def test_make_panel_image():
     def get_2x3(start_int: int):
         return (np.arange(6) + start_int).reshape(2, 3)
@@ -117,3 +191,64 @@ def test_make_panel_image():
             [b, b, b, b, b, b, b, b, b, b, b, b, b, b],
             [b, b, b, b, b, b, b, b, b, b, b, b, b, b],
         ]
+
+
+def test_make_panel_image_many_images():
+    N, images_per_row, pad_width = 20_000, 150, 1
+    xs = np.random.randint(0, 17, size=(N, 8, 8)).astype(np.uint8)
+
+    panel = make_panel_image(
+        xs, pad_width=pad_width, background_fill=6, images_per_row=images_per_row
+    )
+    assert panel.dtype == np.float64
+    assert panel.shape == ((N // images_per_row + 1) * 10, images_per_row * 10)
+
+    # check location of some images in panel
+    for k in [0, 1, images_per_row, N - 1]:
+        r, c = k // images_per_row, k % images_per_row
+        assert (panel[r * 10 + 1 : r * 10 + 9, c * 10 + 1 : c * 10 + 9] == xs[k]).all()
+
+    # last row is padded with background
+    assert (panel[-10:, (N % images_per_row) * 10 :] == 6).all()
+
+
+def test_make_panel_image_uint8_images_negative_fill():
+    xs = np.array([[[0, 16]], [[255, 1]]], dtype=np.uint8)
+
+    panel = make_panel_image(xs, pad_width=1, background_fill=-1, images_per_row=2)
+    assert panel.dtype == np.float64
+    assert panel.tolist() == [
+        [-1, -1, -1, -1, -1, -1, -1, -1],
+        [-1, 0, 16, -1, -1, 255, 1, -1],
+        [-1, -1, -1, -1, -1, -1, -1, -1],
+    ]
+
+
+def test_downsample_images():
+    xs = np.arange(2 * 4 * 5).reshape(2, 4, 5)
+
+    assert downsample_images(xs, 1) is xs
+    assert downsample_images(xs, 2).tolist() == [
+        [[3, 5], [13, 15]],
+        [[23, 25], [33, 35]],
+    ]
+
+
+def test_iter_panel_images():
+    xs = np.arange(5 * 2 * 2).reshape(5, 2, 2)
+
+    panels = list(
+        iter_panel_images(
+            xs,
+            pad_width=0,
+            background_fill=-1,
+            images_per_row=2,
+            max_images_per_panel=2,
+            downsample=2,
+        )
+    )
+    assert [p.tolist() for p in panels] == [
+        [[1.5, 5.5]],
+        [[9.5, 13.5]],
+        [[17.5, -1]],
+    ]
@@ -1,30 +1,36 @@
 from pathlib import Path
-import uuid, shutil
+import os, uuid, shutil, tempfile
 from functools import lru_cache
-from typing import List
+from typing import Any, Dict, List, Optional
 
 #
 import ray
+import opentelemetry as otel
+from opentelemetry.trace import StatusCode, Status  # type: ignore
 
 #
-from pynb_dag_runner.tasks.tasks import make_jupytext_task_ot
-from pynb_dag_runner.opentelemetry_helpers import SpanRecorder
-from pynb_dag_runner.core.dag_runner import (
-    run_in_sequence,
-    fan_in,
-    start_and_await_tasks,
-)
+from pynb_dag_runner.opentelemetry_helpers import get_span_hexid
+import pynb_dag_runner.core.dag_runner
 from pynb_dag_runner.run_pipeline_helpers import get_github_env_variables
 
-from pynb_dag_runner.notebooks_helpers import JupytextNotebook
-from pynb_dag_runner.helpers import write_json
-
-print("---- Initialize Ray cluster ----")
+from pynb_dag_runner.notebooks_helpers import JupytextNotebook, JupyterIpynbNotebook
 
-# Setup Ray and enable tracing using default OpenTelemetry support; traces are
-# written to files /tmp/spans/<pid>.txt in JSON format.
-shutil.rmtree("/tmp/spans", ignore_errors=True)
-ray.init(_tracing_startup_hook="ray.util.tracing.setup_local_tmp_tracing:setup_tracing")
+#
+import common
+from common.io import datalake_root
+from common.task_cache import TaskCache, task_cache_key
+from common.pydar_internals import get_all_spans, get_traceparent, log_text_artefact
+from common.object_store import start_dataset_registry, wait_for_persisted
+from common.span_writer import StreamingSpanWriter, write_json_array_from_jsonl
+from common.compression import with_compression
+from common.timeout_policy import TaskDurationHistory, TimeoutPolicy
+from common.profiling import PROFILE_MODES, profile_parameters, read_profile
+from common.kernel_pool import (
+    start_kernel_pool,
+    leased_kernel,
+    evaluate_notebook_in_kernel,
+)
+import common.local_executor
 
 
 @lru_cache
@@ -37,6 +43,26 @@ def args():
         type=str,
         help="output file path for logging OpenTelemetry spans of pipeline run",
     )
+    parser.add_argument(
+        "--otel_spans_jsonl_outputfile",
+        type=str,
+        default=None,
+        help=(
+            "output file path where spans are written (one JSON span per line) while "
+            "the pipeline runs. If not set, otel_spans_outputfile with suffix .jsonl "
+            "is used, and the file is removed when otel_spans_outputfile is written"
+        ),
+    )
+    parser.add_argument(
+        "--otel_spans_compression",
+        type=str,
+        choices=["none", "gzip", "zstd"],
+        default="none",
+        help=(
+            "compress span output files (the compression suffix .gz or .zst is added "
+            "to the output file paths)"
+        ),
+    )
     parser.add_argument(
         "--data_lake_root",
         type=str,
@@ -48,52 +74,476 @@ def args():
         choices=["ci", "dev"],
         help="run environment for running pipeline",
     )
+    parser.add_argument(
+        "--executor",
+        type=str,
+        choices=["ray", "local"],
+        default="ray",
+        help=(
+            "run tasks on a Ray cluster started by the driver (ray), or in local "
+            "processes without starting Ray (local, faster startup for dev runs)"
+        ),
+    )
+    parser.add_argument(
+        "--task_cache_dir",
+        type=str,
+        default=None,
+        help=(
+            "optional directory for caching task outputs across pipeline runs. "
+            "Tasks with unchanged notebook, parameters and inputs are not rerun."
+        ),
+    )
+    parser.add_argument(
+        "--dataset_transport",
+        type=str,
+        choices=["data-lake", "object-store", "object-store-no-persist"],
+        default="data-lake",
+        help=(
+            "how datasets are passed between tasks: via files in the data lake, or "
+            "via the Ray object store (with or without persisting datasets to the "
+            "data lake)"
+        ),
+    )
+    parser.add_argument(
+        "--kernel_pool_size",
+        type=int,
+        default=0,
+        help=(
+            "number of pre-started Python kernels (with common modules imported) "
+            "used to evaluate notebooks. Default 0: each notebook is evaluated in a "
+            "new kernel"
+        ),
+    )
+    parser.add_argument(
+        "--kernel_pool_max_uses",
+        type=int,
+        default=5,
+        help="number of notebooks evaluated in a pooled kernel before it is replaced",
+    )
+    parser.add_argument(
+        "--hedge_after_s",
+        type=float,
+        default=None,
+        help=(
+            "run flaky tasks (ingest) with hedged retries: start a parallel attempt "
+            "when an attempt has not finished after this many seconds (or, with "
+            "--timeout_history, after the hedge_quantile of durations of successful "
+            "runs of the task). Only supported with --executor local (the Ray "
+            "executor does not hedge)"
+        ),
+    )
+    parser.add_argument(
+        "--hedge_quantile",
+        type=float,
+        default=0.9,
+        help=(
+            "quantile of durations of successful runs (see --timeout_history) after "
+            "which a hedged attempt is started"
+        ),
+    )
+    parser.add_argument(
+        "--timeout_history",
+        type=str,
+        nargs="*",
+        default=[],
+        help=(
+            "span files of previous pipeline runs (eg. opentelemetry-spans.json). If "
+            "provided, task timeouts are set from the durations of successful runs of "
+            "the same task (see common.timeout_policy), instead of the static "
+            f"timeouts. A task needs at least {TimeoutPolicy.min_nr_samples} "
+            "successful runs in the history (eg. span files of as many pipeline runs), "
+            "otherwise its static timeout is used. Also used to estimate task "
+            "durations for --scheduling and --hedge_after_s"
+        ),
+    )
+    parser.add_argument(
+        "--timeout_quantile",
+        type=float,
+        default=0.95,
+        help="quantile of historical task durations used for adaptive timeouts",
+    )
+    parser.add_argument(
+        "--scheduling",
+        type=str,
+        choices=common.local_executor.SCHEDULING_MODES,
+        default="fifo",
+        help=(
+            "order in which ready tasks are started when cores are busy: in the order "
+            "they became ready (fifo), or by longest estimated critical path "
+            "(critical-path, using durations from --timeout_history when available). "
+            "Only supported with --executor local (with the Ray executor, tasks are "
+            "dispatched by the Ray scheduler)"
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        choices=PROFILE_MODES,
+        default="none",
+        help=(
+            "profile notebook tasks with cProfile (cpu), tracemalloc (memory) or both "
+            "(all). Profiles are logged as artefacts of each task run. Note: "
+            "profiling (in particular memory) slows down tasks"
+        ),
+    )
+    parser.add_argument(
+        "--profile_notebooks",
+        type=str,
+        nargs="*",
+        default=[],
+        help="notebooks to profile (eg. train-model.py). Default: all notebooks",
+    )
 
     return parser.parse_args()
 
 
+# Traces are written to files /tmp/spans/<pid>.txt in JSON format (one span per line)
+shutil.rmtree("/tmp/spans", ignore_errors=True)
+
+if args().executor == "ray":
+    print("---- Initialize Ray cluster ----")
+
+    # Setup Ray and enable tracing using default OpenTelemetry support
+    ray.init(
+        _tracing_startup_hook="ray.util.tracing.setup_local_tmp_tracing:setup_tracing"
+    )
+    dag_runner: Any = pynb_dag_runner.core.dag_runner
+else:
+    print("---- Initialize local executor ----")
+
+    # Tasks run in local processes, and log the same spans as when run on Ray
+    common.local_executor.setup_tracing()
+    dag_runner = common.local_executor
+
+task_from_python_function = dag_runner.task_from_python_function
+run_in_sequence = dag_runner.run_in_sequence
+fan_in = dag_runner.fan_in
+start_and_await_tasks = dag_runner.start_and_await_tasks
+
+
 GLOBAL_PARAMETERS = {
     # data lake root is pipeline-scoped parameter
     "pipeline.data_lake_root": args().data_lake_root,
     "pipeline.run_environment": args().run_environment,
     "pipeline.pipeline_run_id": str(uuid.uuid4()),
+    "pipeline.executor": args().executor,
+    "pipeline.object_store_datasets": args().dataset_transport != "data-lake",
+    "pipeline.persist_datasets": args().dataset_transport != "object-store-no-persist",
     **get_github_env_variables(),
 }
 
+# The object store is part of the Ray cluster
+assert (
+    args().executor == "ray" or args().dataset_transport == "data-lake"
+), "--executor local can only be used with --dataset_transport data-lake"
+
+if GLOBAL_PARAMETERS["pipeline.object_store_datasets"]:
+    # registry owning datasets published to the Ray object store by tasks
+    dataset_registry = start_dataset_registry()
+
+# The kernel pool is run in a Ray actor
+assert (
+    args().executor == "ray" or args().kernel_pool_size == 0
+), "--kernel_pool_size can only be used with --executor ray"
+
+USE_KERNEL_POOL: bool = args().kernel_pool_size > 0
+
+# Hedged retries are implemented by the local executor
+assert (
+    args().executor == "local" or args().hedge_after_s is None
+), "--hedge_after_s can only be used with --executor local"
+
+if USE_KERNEL_POOL:
+    kernel_pool = start_kernel_pool(
+        size=args().kernel_pool_size, max_uses=args().kernel_pool_max_uses
+    )
+
+
+TASK_DURATION_HISTORY = TaskDurationHistory.from_files(
+    [Path(p) for p in args().timeout_history]
+)
+
+TIMEOUT_POLICY: Optional[TimeoutPolicy] = (
+    TimeoutPolicy(TASK_DURATION_HISTORY, quantile=args().timeout_quantile)
+    if len(args().timeout_history) > 0
+    else None
+)
+
+# Tasks are dispatched by the local executor (on Ray, by the Ray scheduler)
+assert (
+    args().executor == "local" or args().scheduling == "fifo"
+), "--scheduling critical-path can only be used with --executor local"
+
+if args().executor == "local":
+    common.local_executor.set_scheduling(
+        args().scheduling, TASK_DURATION_HISTORY.estimate_duration_s
+    )
+
+TASK_CACHE: Optional[TaskCache] = (
+    TaskCache(Path(args().task_cache_dir)) if args().task_cache_dir else None
+)
+
+# Cache keys and cached outputs are computed from files in the data lake
+assert TASK_CACHE is None or GLOBAL_PARAMETERS["pipeline.persist_datasets"], (
+    "--task_cache_dir can not be combined with --dataset_transport "
+    "object-store-no-persist"
+)
+
+# ---- task caching ----
+#
+# make_notebook_task replicates make_jupytext_task_ot in pynb-dag-runner, to add
+# task caching, kernel pooling and profiling. The non-public pynb-dag-runner helpers
+# this needs are only used via common.pydar_internals.
+
+
+def _flush_spans():
+    """
+    Write spans recorded by this process to the span files in /tmp/spans
+    """
+    assert otel.trace.get_tracer_provider().force_flush()  # type: ignore
+
+
+def _read_all_spans() -> List[Dict[str, Any]]:
+    """
+    Return all spans recorded so far in the pipeline run
+    """
+    _flush_spans()
+    return get_all_spans()
+
+
+# Names of spans logged by a notebook that are stored in the task cache
+CACHED_SPAN_NAMES = ["named-value", "artefact"]
+
+
+def _get_logged_spans(parent_span_id: str) -> List[Dict[str, Any]]:
+    """
+    Return (name and attributes of) all values and artefacts logged directly under
+    the span with the provided span_id.
+    """
+    return [
+        {"name": span["name"], "attributes": span["attributes"]}
+        for span in _read_all_spans()
+        if span["parent_id"] == parent_span_id and span["name"] in CACHED_SPAN_NAMES
+    ]
+
+
+def _replay_logged_spans(logged_spans: List[Dict[str, Any]]):
+    """
+    Log cached values and artefacts (see _get_logged_spans) again as new spans in the
+    current span context.
+    """
+    tracer = otel.trace.get_tracer(__name__)  # type: ignore
+    for logged_span in logged_spans:
+        with tracer.start_as_current_span(logged_span["name"]) as span:
+            for k, v in logged_span["attributes"].items():
+                span.set_attribute(k, v)
+            span.set_status(Status(StatusCode.OK))
+
+
+def _validate_num_cpus(num_cpus: float) -> float:
+    """
+    Return number of cores to reserve for a task. Ray reserves fractions of one core
+    (eg. 0.5), or whole numbers of cores (eg. 2, but not 1.5).
+    """
+    if num_cpus < 0 or (num_cpus > 1 and num_cpus != int(num_cpus)):
+        raise ValueError(f"num_cpus should be at most 1, or whole, got {num_cpus}")
+    return int(num_cpus) if num_cpus >= 1 else num_cpus
+
 
 def make_notebook_task(
-    nb_name: str, timeout_s=None, max_nr_retries: int = 1, task_parameters={}
+    nb_name: str,
+    timeout_s: Optional[float] = None,
+    max_nr_retries: int = 1,
+    task_parameters={},
+    inputs: List[str] = [],
+    outputs: List[str] = [],
+    cacheable: bool = True,
+    num_cpus: float = 1,
+    hedged: bool = False,
+    profile: Optional[str] = None,
 ):
-    nb_path: Path = (Path(__file__).parent) / "notebooks"
+    """
+    Create task that evaluates a Jupytext notebook (as make_jupytext_task_ot in
+    pynb-dag-runner), but with optional caching of task outputs.
 
-    return make_jupytext_task_ot(
-        notebook=JupytextNotebook(nb_path / nb_name),
-        tmp_dir=nb_path,
-        timeout_s=timeout_s,
+    num_cpus: cores reserved for the notebook when the task is scheduled (fractions
+    of one core can be used for light tasks). The value is passed to the notebook as
+    parameter "task.num_cpus", so the notebook can size thread pools accordingly.
+
+    inputs/outputs: data lake paths (relative to data lake root) read and written by
+    the notebook. If the pipeline is run with a task cache directory, a cacheable
+    task is skipped when its notebook, parameters and inputs are unchanged since a
+    previous run. Then, the cached outputs are restored into the data lake, and
+    values and artefacts logged by the previous run are logged again.
+
+    timeout_s: timeout of each attempt. With --timeout_history, this is replaced by a
+    timeout learned from previous runs of the task (if there are enough of them).
+
+    profile: profiling mode for this task (see common.profiling). Default: as set by
+    --profile and --profile_notebooks.
+
+    hedged: run task with hedged retries if enabled (see --hedge_after_s). Attempts
+    may then run in parallel, and the notebook should write its outputs idempotently.
+    """
+    num_cpus = _validate_num_cpus(num_cpus)
+
+    nb_path: Path = (Path(__file__).parent) / "notebooks"
+    notebook = JupytextNotebook(nb_path / nb_name)
+
+    run_attributes: Dict[str, Any] = {
+        **GLOBAL_PARAMETERS,
+        **task_parameters,
+        "task.notebook": str(notebook.filepath),
+        "task.num_cpus": num_cpus,
+    }
+
+    if profile is None:
+        profile = (
+            args().profile
+            if len(args().profile_notebooks) == 0 or nb_name in args().profile_notebooks
+            else "none"
+        )
+    if profile != "none":
+        run_attributes["task.profile"] = profile
+
+    task_cache: Optional[TaskCache] = TASK_CACHE if cacheable else None
+
+    if TIMEOUT_POLICY is not None:
+        static_timeout_s = timeout_s
+        timeout_s = TIMEOUT_POLICY.timeout_s(run_attributes, static_timeout_s)
+        print(f"  - timeout of {nb_name}: {timeout_s} (static: {static_timeout_s})")
+    common_package_path: Path = Path(common.__file__).parent
+    use_kernel_pool: bool = USE_KERNEL_POOL
+
+    hedging_kwargs: Dict[str, Any] = {}
+    if hedged and args().hedge_after_s is not None:
+        hedging_kwargs = {
+            "hedge_after_s": args().hedge_after_s,
+            "hedge_quantile": args().hedge_quantile,
+            "hedge_durations_s": TASK_DURATION_HISTORY.durations_s(run_attributes),
+        }
+
+    def evaluate_notebook():
+        tmp_filepath: Path = (nb_path / notebook.filepath.name).with_suffix(".ipynb")
+        if len(hedging_kwargs) > 0:
+            # parallel attempts write separate evaluated notebooks
+            retry_nr = otel.baggage.get_all()["run.retry_nr"]
+            tmp_filepath = tmp_filepath.with_suffix(f".retry_nr={retry_nr}.ipynb")
+        evaluated_notebook = JupyterIpynbNotebook(tmp_filepath)
+
+        profile_dir = Path(tempfile.mkdtemp(prefix="pydar-profile-"))
+        parameters: Dict[str, Any] = {
+            "P": {
+                **run_attributes,
+                **otel.baggage.get_all(),
+                "_opentelemetry_traceparent": get_traceparent(),
+                **profile_parameters(profile, profile_dir),
+            }
+        }
+
+        try:
+            if use_kernel_pool:
+                with leased_kernel(cwd=nb_path) as km:
+                    evaluate_notebook_in_kernel(
+                        notebook, evaluated_notebook, parameters, km
+                    )
+            else:
+                notebook.evaluate(output=evaluated_notebook, parameters=parameters)
+        finally:
+            # this is not run if notebook is killed by timeout
+            log_text_artefact("notebook.ipynb", evaluated_notebook.filepath.read_text())
+
+            # profiles of notebook cells that were run (also if the notebook failed)
+            for name, content in read_profile(profile_dir).items():
+                log_text_artefact(name, content)
+            shutil.rmtree(profile_dir, ignore_errors=True)
+
+    def run_notebook(arg):
+        if task_cache is None:
+            return evaluate_notebook()
+
+        # inputs published to the object store may still be written to data lake
+        for p in inputs:
+            wait_for_persisted(run_attributes, datalake_root(run_attributes) / p)
+
+        cache_key: str = task_cache_key(
+            notebook_path=notebook.filepath,
+            task_parameters=task_parameters,
+            pipeline_parameters=run_attributes,
+            input_paths=[datalake_root(run_attributes) / p for p in inputs],
+            code_paths=[common_package_path],
+        )
+        logged_spans = task_cache.restore(cache_key, datalake_root(run_attributes))
+
+        span = otel.trace.get_current_span()
+        span.set_attribute("task.cache_key", cache_key)
+        span.set_attribute("task.cache_hit", logged_spans is not None)
+
+        if logged_spans is not None:
+            _replay_logged_spans(logged_spans)
+        else:
+            evaluate_notebook()
+            for p in outputs:
+                wait_for_persisted(run_attributes, datalake_root(run_attributes) / p)
+
+            task_cache.store(
+                cache_key,
+                datalake_root(run_attributes),
+                outputs,
+                _get_logged_spans(parent_span_id=get_span_hexid(span)),
+            )
+
+    return task_from_python_function(
+        f=run_notebook,
+        num_cpus=num_cpus,
         max_nr_retries=max_nr_retries,
-        parameters={
-            **GLOBAL_PARAMETERS,
-            **task_parameters,
-        },
+        timeout_s=timeout_s,
+        attributes=run_attributes,
+        task_type="jupytext",
+        **hedging_kwargs,
     )
 
 
 print("---- Command line parameters ----")
-print(f"  - otel_spans_outputfile : {args().otel_spans_outputfile}")
-print(f"  - data_lake_root        : {args().data_lake_root}")
-print(f"  - run_environment       : {args().run_environment}")
+print(f"  - otel_spans_outputfile       : {args().otel_spans_outputfile}")
+print(f"  - otel_spans_jsonl_outputfile : {args().otel_spans_jsonl_outputfile}")
+print(f"  - otel_spans_compression      : {args().otel_spans_compression}")
+print(f"  - data_lake_root              : {args().data_lake_root}")
+print(f"  - run_environment             : {args().run_environment}")
+print(f"  - executor                    : {args().executor}")
+print(f"  - task_cache_dir              : {args().task_cache_dir}")
+print(f"  - dataset_transport           : {args().dataset_transport}")
+print(f"  - kernel_pool_size            : {args().kernel_pool_size}")
+print(f"  - kernel_pool_max_uses        : {args().kernel_pool_max_uses}")
+print(f"  - hedge_after_s               : {args().hedge_after_s}")
+print(f"  - hedge_quantile              : {args().hedge_quantile}")
+print(f"  - timeout_history             : {args().timeout_history}")
+print(f"  - timeout_quantile            : {args().timeout_quantile}")
+print(f"  - scheduling                  : {args().scheduling}")
+print(f"  - profile                     : {args().profile}")
+print(f"  - profile_notebooks           : {args().profile_notebooks}")
 
 
 print("---- Setting up tasks and task dependencies ----")
 
-task_ingest = make_notebook_task(nb_name="ingest.py", timeout_s=10, max_nr_retries=15)
+task_ingest = make_notebook_task(
+    nb_name="ingest.py", timeout_s=10, max_nr_retries=15, outputs=["raw"], hedged=True
+)
 
-task_eda = make_notebook_task(nb_name="eda.py")
+task_eda = make_notebook_task(
+    nb_name="eda.py",
+    inputs=["raw"],
+    # reserve cores for rendering digit figures in parallel, but only on hosts with
+    # cores to spare (on eg. 2-core CI runners, eda should not block other tasks)
+    num_cpus=2 if (os.cpu_count() or 1) >= 4 else 0.5,
+)
 run_in_sequence(task_ingest, task_eda)
 
 task_split_train_test = make_notebook_task(
     nb_name="split-train-test.py",
     task_parameters={"task.train_test_ratio": 0.7},
+    inputs=["raw"],
+    outputs=["train-data", "test-data"],
 )
 run_in_sequence(task_ingest, task_split_train_test)
 
@@ -108,6 +558,10 @@ task_trainers = [
     make_notebook_task(
         nb_name="train-model.py",
         task_parameters={"task.nr_train_images": k},
+        inputs=["train-data"],
+        outputs=[f"models/nr_train_images={k}"],
+        # reserve cores for the parallel hyperparameter search
+        num_cpus=2,
     )
     for k in nr_train_digits
 ]
@@ -116,6 +570,9 @@ task_benchmarks = [
     make_notebook_task(
         nb_name="benchmark-model.py",
         task_parameters={"task.nr_train_images": k},
+        inputs=["test-data", f"models/nr_train_images={k}"],
+        # reserve cores for multi-threaded inference benchmarks
+        num_cpus=2,
     )
     for k in nr_train_digits
 ]
@@ -126,6 +583,9 @@ for task_train, task_benchmark in zip(task_trainers, task_benchmarks):
 task_summary = make_notebook_task(
     nb_name="summary.py",
     task_parameters={},
+    # summary reads values logged by the benchmark tasks in this pipeline run
+    cacheable=False,
+    num_cpus=0.5,
 )
 
 fan_in(task_benchmarks, task_summary)
@@ -133,7 +593,21 @@ fan_in(task_benchmarks, task_summary)
 
 print("---- Running mnist-demo-pipeline ----")
 
-with SpanRecorder() as rec:
+# Spans are copied to the jsonl output file while the pipeline runs, and the JSON
+# array output file is derived from it when the run has finished.
+spans_jsonl_path: Path = with_compression(
+    (
+        Path(args().otel_spans_jsonl_outputfile)
+        if args().otel_spans_jsonl_outputfile
+        else Path(args().otel_spans_outputfile).with_suffix(".jsonl")
+    ),
+    args().otel_spans_compression,
+)
+spans_json_path: Path = with_compression(
+    Path(args().otel_spans_outputfile), args().otel_spans_compression
+)
+
+with StreamingSpanWriter(spans_jsonl_path) as span_writer:
     _ = start_and_await_tasks(
         # Note: here it should not be necessary to await task_benchmarks. fan_in
         # target task only starts after all dependent tasks are finished, but
@@ -143,18 +617,29 @@ with SpanRecorder() as rec:
         [task_eda, task_summary] + task_benchmarks,
         arg={},
     )
+    _flush_spans()
 
-ray.shutdown()
+if args().executor == "ray":
+    # datasets in the object store are lost when the Ray cluster is shut down
+    wait_for_persisted(GLOBAL_PARAMETERS, datalake_root(GLOBAL_PARAMETERS))
+
+    if USE_KERNEL_POOL:
+        ray.get(kernel_pool.shutdown.remote())
+
+    ray.shutdown()
 
 print("---- Exceptions ----")
 
-for s in rec.spans.exception_events():
+for s in span_writer.exception_events:
     print(80 * "=")
     print(s)
 
 print("---- Writing spans ----")
 
-print(" - Total number of spans recorded   :", len(rec.spans))
-write_json(Path(args().otel_spans_outputfile), list(rec.spans))
+print(" - Total number of spans recorded   :", span_writer.nr_spans)
+write_json_array_from_jsonl(spans_jsonl_path, spans_json_path)
+
+if not args().otel_spans_jsonl_outputfile:
+    spans_jsonl_path.unlink()
 
 print("---- Done ----")
@@ -12,6 +12,7 @@
 P = {
     "pipeline.data_lake_root": "/pipeline-outputs/data-lake",
     "task.nr_train_images": 600,
+    "task.num_cpus": 2,
 }
 # %% tags=["parameters"]
 # - During automated runs parameters will be injected in the below cell -
@@ -25,33 +26,42 @@ P = {
 
 
 # %%
-import itertools as it
-
-#
 import numpy as np
+import pandas as pd
 import matplotlib.pyplot as plt
 
 #
-from pynb_dag_runner.tasks.task_opentelemetry_logging import PydarLogger
+from common.logging import make_pydar_logger
+from common.profiling import start_profiling
 
 #
 from common.io import datalake_root
 
-logger = PydarLogger(P)
+start_profiling(P)
+logger = make_pydar_logger(P)
 
 # %% [markdown]
 # ## Load persisted onnx-model and evaluation data
 
 # %%
-from common.io import read_onnx, get_onnx_inputs, get_onnx_outputs, read_numpy
+from common.io import read_onnx, get_onnx_inputs, get_onnx_outputs, read_numpy_dataset
+from common.io import OnnxSessionOptions
+from common.utils import get_num_cpus
 
 # %%
-onnx_inference_session = read_onnx(
+# number of cores reserved for this task (when run as part of pipeline)
+num_cpus: int = get_num_cpus(P)
+
+model_path = (
     datalake_root(P)
     / "models"
     / f"nr_train_images={P['task.nr_train_images']}"
     / "model.onnx"
 )
+onnx_inference_session = read_onnx(
+    model_path,
+    OnnxSessionOptions(intra_op_num_threads=num_cpus, inter_op_num_threads=num_cpus),
+)
 # %% [markdown]
 # ### Record structure of inputs and outputs for ONNX model
 #
@@ -76,19 +86,23 @@ print(onnx_io)
 # ### Evaluate model performance on evaluation data set
 
 # %%
-# load evaluation data
-X_test = read_numpy(datalake_root(P) / "test-data" / "digits.numpy")
-y_test = read_numpy(datalake_root(P) / "test-data" / "labels.numpy")
+# load evaluation data. Pixels are stored as uint8 (see common.io.compact_dtype), and
+# are cast to float32 model inputs when rows are accessed.
+X_test = read_numpy_dataset(
+    P, datalake_root(P) / "test-data" / "digits.numpy", dtype=np.float32
+)
+y_test = read_numpy_dataset(P, datalake_root(P) / "test-data" / "labels.numpy")
 
 
 # %%
+from common.io import run_onnx_classifier
+
+
 def get_model_outputs(X, onnx_inference_session):
-    y_pred_labels, y_pred_map = onnx_inference_session.run(
-        ["output_label", "output_probability"],
-        {"float_input_8x8_image": X.astype(np.float32)},
-    )
-    y_pred_probs = np.array(
-        [[probabilities[digit] for digit in range(10)] for probabilities in y_pred_map]
+    # evaluate model in fixed-size batches; probabilities are returned by the model
+    # as a float32 tensor
+    y_pred_labels, y_pred_probs = run_onnx_classifier(
+        onnx_inference_session, X, batch_size=1024
     )
 
     assert y_pred_labels.shape == (X.shape[0],)
@@ -111,100 +125,55 @@ y_pred_labels_test, y_pred_probs_test = get_model_outputs(
 # TODO
 
 # %% [markdown]
-# ### Plot predicted probabilities for each classifier over all evaluation digit images
+# ### Plot predicted probabilities and ROC curves
+#
+# The two plots are independent, and are rendered in parallel using the cores reserved
+# for this task (see `common.plotting.render_figures`). The plot functions are
+# defined in `common.figures`.
 
 # %%
-def plot_per_digit_probabilities(y_pred_probs):
-    fig, axs = plt.subplots(nrows=2, ncols=5, figsize=(16, 6))
-
-    for (r, c), digit, ax in zip(
-        it.product(range(2), range(5)), range(10), axs.reshape(-1)
-    ):
-        ax.hist(y_pred_probs_test[:, digit], bins=20)
-
-        ax.set_title(f"Digit {digit}")
-        if r == 1 and c == 2:
-            ax.set_xlabel("probability", fontsize=16)
-
-        if c == 0:
-            ax.set_ylabel("counts", fontsize=16)
-        ax.set_yscale("log")
-
-    fig.tight_layout()
-    fig.suptitle(
-        f"Distributions of prediction probabilities for each digit "
-        f"(on evaluation data, n={y_pred_probs.shape[0]})",
-        fontsize=20,
-    )
-    fig.tight_layout()
-    fig.show()
-
-    return fig
+import functools
 
+#
+from sklearn import metrics
 
-fig = plot_per_digit_probabilities(y_pred_probs_test)
+#
+from common.plotting import render_figures, show_png
+from common.figures import plot_per_digit_probabilities, plot_roc_curves
+
+probabilities_png, roc_curves_png = render_figures(
+    [
+        functools.partial(plot_per_digit_probabilities, y_pred_probs_test),
+        functools.partial(plot_roc_curves, y_test, y_pred_probs_test),
+    ],
+    max_workers=num_cpus,
+)
 
 # %% [markdown]
-# From the above distributions we see that most digits have clear separation between
-# high and lower probabilities. Morover, in each case there is roughly an order of
-# magnitude more of digits with low probabilities. This is compatible with digits
-# being roughly evenly distributed in the data.
+# ### Predicted probabilities for each classifier over all evaluation digit images
 
 # %%
-logger.log_figure("per-digit-probabilities.png", fig)
+logger.log_artefact("per-digit-probabilities.png", probabilities_png)
+show_png(probabilities_png)
 
 # %% [markdown]
-# ### Plot ROC curves for individual one-vs-rest classifiers
-
-# %%
-from sklearn import metrics
+# From the distributions (logged as per-digit-probabilities.png) we see that most
+# digits have clear separation between high and lower probabilities. Morover, in each
+# case there is roughly an order of magnitude more of digits with low probabilities.
+# This is compatible with digits being roughly evenly distributed in the data.
 
+# %% [markdown]
+# ### ROC curves for individual one-vs-rest classifiers
 
 # %%
-def plot_roc_curves(y, y_pred_probs):
-    # based on example code
-    # https://scikit-learn.org/stable/auto_examples/model_selection/plot_roc.html
-
-    fig, axs = plt.subplots(nrows=2, ncols=5, figsize=(16, 8))
-
-    roc_auc_dict = {}
-
-    for (r, c), digit, ax in zip(
-        it.product(range(2), range(5)), range(10), axs.reshape(-1)
-    ):
-        fpr, tpr, _ = metrics.roc_curve(y == digit, y_pred_probs[:, digit])
-        auc = metrics.auc(fpr, tpr)
-        roc_auc_dict[str(digit)] = auc
-
-        ax.plot(fpr, tpr, label=f"ROC AUC={round(auc, 3)}")
-
-        ax.set_title(f"\nDigit {digit}", fontsize=16)
-        if r == 1:
-            ax.set_xlabel("FPR", fontsize=18)
-
-        if c == 0:
-            ax.set_ylabel("TPR", fontsize=18)
-
-        ax.set_xlim([-0.05, 1.05])
-        ax.set_ylim([-0.05, 1.05])
-        ax.legend(loc="lower right", frameon=False, fontsize=14)
-
-    fig.tight_layout()
-    fig.suptitle(
-        f"ROC plots for one-vs-rest performances "
-        f"(on evaluation data, n={y_pred_probs_test.shape[1]}",
-        fontsize=22,
-    )
-    fig.tight_layout()
-    fig.show()
-
-    return roc_auc_dict, fig
-
-
-roc_auc_dict, fig = plot_roc_curves(y_test, y_pred_probs_test)
+logger.log_artefact("per-digit-roc-curves.png", roc_curves_png)
+show_png(roc_curves_png)
 
 # %%
-logger.log_figure("per-digit-roc-curves.png", fig)
+roc_auc_dict = {
+    str(digit): metrics.roc_auc_score(y_test == digit, y_pred_probs_test[:, digit])
+    for digit in range(10)
+}
 
 # %%
 roc_auc_dict
@@ -225,6 +194,77 @@ assert roc_auc_macro == metrics.roc_auc_score(
     y_test, y_pred_probs_test, average="macro", multi_class="ovr"
 )
 
+# %% [markdown]
+# ### Benchmark inference latency and throughput
+#
+# Measure how fast the persisted model serves predictions for different batch sizes
+# and number of threads (on evaluation data). Each measurement is done after a few
+# warmup evaluations.
+
+# %%
+from common.inference_benchmark import benchmark_onnx_model
+
+inference_benchmark = benchmark_onnx_model(
+    model_path,
+    X_test,
+    batch_sizes=[1, 8, 64, 512, None],
+    thread_counts=sorted({1, num_cpus}),
+    nr_warmup=5,
+    nr_repeats=50,
+)
+
+pd.DataFrame(inference_benchmark).round(4)
+
+# %%
+logger.log_value("inference_benchmark", inference_benchmark)
+
+# log single row latency and maximum throughput (used in summary notebook)
+logger.log_float(
+    "latency_p95_ms_batch_1",
+    min(r["latency_p95_ms"] for r in inference_benchmark if r["batch_size"] == 1),
+)
+logger.log_float("max_rows_per_s", max(r["rows_per_s"] for r in inference_benchmark))
+
+
+# %%
+def plot_inference_benchmark(inference_benchmark):
+    df = pd.DataFrame(inference_benchmark)
+
+    fig, axs = plt.subplots(nrows=1, ncols=2, figsize=(16, 5))
+
+    for nr_threads, df_threads in df.groupby("nr_threads"):
+        axs[0].plot(
+            df_threads["batch_size"],
+            df_threads["latency_p95_ms"],
+            marker="o",
+            label=f"{nr_threads} thread(s)",
+        )
+        axs[1].plot(
+            df_threads["batch_size"],
+            df_threads["rows_per_s"],
+            marker="o",
+            label=f"{nr_threads} thread(s)",
+        )
+
+    for ax, y_label in zip(axs, ["p95 latency (ms)", "Throughput (rows/s)"]):
+        ax.set_xscale("log")
+        ax.set_yscale("log")
+        ax.set_xlabel("Batch size", fontsize=14)
+        ax.set_ylabel(y_label, fontsize=14)
+        ax.legend(frameon=False, fontsize=12)
+
+    fig.suptitle("ONNX model inference performance", fontsize=18)
+    fig.tight_layout()
+    fig.show()
+
+    return fig
+
+
+fig = plot_inference_benchmark(inference_benchmark)
+
+# %%
+logger.log_figure("inference-performance.png", fig)
+
 # %%
 # ---
 # %%
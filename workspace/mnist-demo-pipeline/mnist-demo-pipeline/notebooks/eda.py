@@ -24,23 +24,25 @@ P = {
 from typing import Dict, Tuple
 
 #
-import collections
 import matplotlib.pyplot as plt
 
 
 #
-from pynb_dag_runner.tasks.task_opentelemetry_logging import PydarLogger
+from common.logging import make_pydar_logger
+from common.profiling import start_profiling
 
 #
-from common.io import datalake_root, read_numpy
+from common.io import datalake_root, read_numpy_dataset
+from common.dataset_statistics import compute_dataset_statistics
 
 
 # %%
-logger = PydarLogger(P)
+start_profiling(P)
+logger = make_pydar_logger(P)
 
 # %%
-X = read_numpy(datalake_root(P) / "raw" / "digits.numpy")
-y = read_numpy(datalake_root(P) / "raw" / "labels.numpy")
+X = read_numpy_dataset(P, datalake_root(P) / "raw" / "digits.numpy")
+y = read_numpy_dataset(P, datalake_root(P) / "raw" / "labels.numpy")
 
 # %% [markdown]
 # ## Check shapes of digit image and label vectors
@@ -62,6 +64,15 @@ assert X.shape[1] == 8 * 8
 logger.log_int("nr_digits", len(y))
 logger.log_int("pixels_per_digit", int(X.shape[1]))
 
+# %% [markdown]
+# ## Compute dataset statistics
+#
+# Label counts, pixel value counts, and per-pixel means and variances are computed
+# in one vectorized pass over chunks of rows (see `common.dataset_statistics`).
+
+# %%
+stats = compute_dataset_statistics(X, y)
+
 
 # %% [markdown]
 # ## Check distribution of labels
@@ -99,10 +110,10 @@ def plot_dict_to_barplot(
 
 # %%
 # all labels in y are in set 0, 1, ..., 8, 9 (possible digits)
-assert set(y) == set(range(10))
+assert set(stats.label_counts.keys()) == set(range(10))
 
 # %%
-digit_counts: Dict[int, int] = dict(collections.Counter(y))
+digit_counts: Dict[int, int] = stats.label_counts
 
 logger.log_value("counts_per_digit", {str(k): v for k, v in digit_counts.items()})
 
@@ -124,19 +135,19 @@ logger.log_figure("logged-images/samples_per_digit.png", fig)
 # ## Check distribution of pixel values
 
 # %%
-assert X.reshape(-1).shape == (X.shape[0] * X.shape[1],)
+# all pixel values are in set 0, 1, ..., 15, 16
+assert set(stats.pixel_value_counts.keys()) == set(float(x) for x in range(17))
 
 # %%
-# all labels in y are in set 0, 1, ..., 8, 9 (possible digits)
-assert set(X.reshape(-1)) == set(float(x) for x in range(17))
-
-# %%
-pixel_value_counts: Dict[int, int] = dict(collections.Counter(X.reshape(-1)))
+pixel_value_counts: Dict[int, int] = stats.pixel_value_counts
 
 # %%
 fig = plot_dict_to_barplot(
     pixel_value_counts,
-    title=f"Distribution of pixel values over all digit images (n={len(X.reshape(-1))})",
+    title=(
+        "Distribution of pixel values over all digit images "
+        f"(n={sum(pixel_value_counts.values())})"
+    ),
     x_label="Pixel value",
     y_label="Counts",
 )
@@ -150,29 +161,56 @@ logger.log_figure("logged-images/pixel_value_counts.png", fig)
 # - The second most frequent pixel value is 16.0 (digit draw color).
 
 # %% [markdown]
-# ## Plot individual digit images
+# ## Mean and variance of pixel values
+#
+# Shown for all images, and for the images of each digit.
 
 # %%
-from common.utils import chunkify, make_panel_image
+fig, axs = plt.subplots(nrows=2, ncols=11, figsize=(22, 5))
+
+for ax_row, name, overall, per_digit in [
+    (axs[0], "mean", stats.pixel_mean, stats.class_pixel_mean),
+    (axs[1], "variance", stats.pixel_var, stats.class_pixel_var),
+]:
+    for ax, title, values in zip(
+        ax_row,
+        [f"all ({name})"] + [f"{digit} ({name})" for digit in stats.label_counts],
+        [overall] + list(per_digit),
+    ):
+        ax.imshow(values.reshape(8, 8), cmap=plt.cm.gray_r)
+        ax.set_title(title, fontsize=12)
+        ax.axis("off")
+
+fig.tight_layout()
 
 # %%
-for digit in range(10):
-    X_digit = X[y == digit].reshape(-1, 8, 8)
+logger.log_figure("logged-images/pixel_mean_and_variance.png", fig)
 
-    fig, ax = plt.subplots(nrows=1, ncols=1, figsize=(18, 30))
+# %% [markdown]
+# ## Plot individual digit images
+#
+# The (large) figures for the digits are independent, and are rendered in parallel
+# using the cores reserved for this task (see `common.plotting.render_figures`). The
+# plot function is defined in `common.figures`.
 
-    ax.set_title(f"\nDigits {digit} (n={len(X_digit)}) \n", fontsize=24)
-    ax.axis("off")
+# %%
+import functools
 
-    ax.imshow(
-        make_panel_image(X_digit, pad_width=2, background_fill=6, images_per_row=26),
-        cmap=plt.cm.gray_r,
-    )
+#
+from common.utils import get_num_cpus
+from common.plotting import render_figures, show_png
+from common.figures import plot_digit_images
 
-    fig.tight_layout()
-    fig.show()
+# %%
+digit_pngs = render_figures(
+    [functools.partial(plot_digit_images, X[y == digit], digit) for digit in range(10)],
+    max_workers=get_num_cpus(P),
+)
 
-    logger.log_figure(f"logged-images/digits/{digit}-images.png", fig)
+# %%
+for digit, png in zip(range(10), digit_pngs):
+    logger.log_artefact(f"logged-images/digits/{digit}-images.png", png)
+    show_png(png)
 
 # %%
 ###
@@ -23,9 +23,11 @@ P = {
 # ### Simulate different types of failures (for testing timeout and retry logic)
 
 # %%
-from pynb_dag_runner.tasks.task_opentelemetry_logging import PydarLogger
+from common.logging import make_pydar_logger
+from common.profiling import start_profiling
 
-logger = PydarLogger(P)
+start_profiling(P)
+logger = make_pydar_logger(P)
 
 # %%
 import time, random
@@ -56,7 +58,7 @@ maybe_crash(
 from sklearn import datasets
 
 #
-from common.io import datalake_root, write_numpy
+from common.io import datalake_root, write_numpy_dataset
 
 # %%
 digits = datasets.load_digits()
@@ -72,7 +74,9 @@ logger.log_value("target_shape", list(y.shape))
 X.shape, y.shape
 
 # %%
-write_numpy(datalake_root(P) / "raw" / "digits.numpy", X)
-write_numpy(datalake_root(P) / "raw" / "labels.numpy", y)
+# pixels (0..16, as float64) and labels (0..9, as int64) are stored as uint8, see
+# common.io.compact_dtype
+write_numpy_dataset(P, datalake_root(P) / "raw" / "digits.numpy", X)
+write_numpy_dataset(P, datalake_root(P) / "raw" / "labels.numpy", y)
 
 # %%
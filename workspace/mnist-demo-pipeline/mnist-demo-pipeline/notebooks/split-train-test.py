@@ -22,17 +22,28 @@ P = {
 
 
 # %%
-from common.io import datalake_root, read_numpy, write_numpy
-from pynb_dag_runner.tasks.task_opentelemetry_logging import PydarLogger
+from common.io import (
+    datalake_root,
+    read_numpy_dataset,
+    write_numpy_dataset,
+    dataset_logical_dtype,
+)
+from common.logging import make_pydar_logger
+from common.profiling import start_profiling
 
-logger = PydarLogger(P)
+start_profiling(P)
+logger = make_pydar_logger(P)
 
 # %% [markdown]
 # ## Load and split digits data
 
 # %%
-X = read_numpy(datalake_root(P) / "raw" / "digits.numpy")
-y = read_numpy(datalake_root(P) / "raw" / "labels.numpy")
+X = read_numpy_dataset(P, datalake_root(P) / "raw" / "digits.numpy")
+y = read_numpy_dataset(P, datalake_root(P) / "raw" / "labels.numpy")
+
+# datasets are read in their compact dtypes; keep the logical dtypes when writing
+X_dtype = dataset_logical_dtype(P, datalake_root(P) / "raw" / "digits.numpy")
+y_dtype = dataset_logical_dtype(P, datalake_root(P) / "raw" / "labels.numpy")
 
 # %%
 from sklearn.model_selection import train_test_split
@@ -65,11 +76,18 @@ logger.log_int("nr_digits_test", len(y_test))
 # ### Persist training and test data sets to separate files
 
 # %%
-write_numpy(datalake_root(P) / "train-data" / "digits.numpy", X_train)
-write_numpy(datalake_root(P) / "train-data" / "labels.numpy", y_train)
-
-#
-write_numpy(datalake_root(P) / "test-data" / "digits.numpy", X_test)
-write_numpy(datalake_root(P) / "test-data" / "labels.numpy", y_test)
+for split, X_split, y_split in [("train", X_train, y_train), ("test", X_test, y_test)]:
+    write_numpy_dataset(
+        P,
+        datalake_root(P) / f"{split}-data" / "digits.numpy",
+        X_split,
+        logical_dtype=X_dtype,
+    )
+    write_numpy_dataset(
+        P,
+        datalake_root(P) / f"{split}-data" / "labels.numpy",
+        y_split,
+        logical_dtype=y_dtype,
+    )
 
 # %%
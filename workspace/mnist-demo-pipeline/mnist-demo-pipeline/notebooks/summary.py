@@ -24,22 +24,24 @@ P = {
 
 
 # %%
+from pathlib import Path
+
 #
 import pandas as pd
 import matplotlib.pyplot as plt
 
 #
-from pynb_dag_runner.tasks.task_opentelemetry_logging import PydarLogger
+from common.logging import make_pydar_logger
+from common.profiling import start_profiling
 
 # %%
-logger = PydarLogger(P=P)
+start_profiling(P)
+logger = make_pydar_logger(P)
 
 # %%
-from pynb_dag_runner.tasks.task_opentelemetry_logging import (
-    PydarLogger,
-    get_logged_values,
-)
-from pynb_dag_runner.opentelemetry_helpers import _get_all_spans, Spans
+from common.pydar_internals import get_all_spans
+from common.span_index import SpanIndex
+from common.span_writer import read_spans
 
 
 # %%
@@ -48,25 +50,21 @@ def get_model_benchmarks():
     Query the OpenTelemetry logs for *this pipeline run* and return
     all key-values logged from all runs of the benchmark-model.py task
 
-    For testing a json file with OpenTelemetry spans (as an array)
-    can be used as follows:
-
-    - Create output directory `mkdir /tmp/spans`
-    - Run unit tests. This will create pipeline-outputs/opentelemetry-spans.json
-    - Convert this json-array into jsonl format as follows
-
-    jq -c '.[]' /pipeline-outputs/opentelemetry-spans.json > /tmp/spans/data.txt
-
+    For testing, spans output by a previous pipeline run can be read by setting
+    the parameter "task.otel_spans_path", eg. to
+    /pipeline-outputs/opentelemetry-spans.json. The file may be a JSON array or
+    JSONL file, and may be compressed (eg. opentelemetry-spans.json.gz).
     """
-    spans: Spans = Spans(_get_all_spans())
+    # index spans once; lookups below do not scan all spans
+    spans: SpanIndex = SpanIndex(
+        read_spans(Path(P["task.otel_spans_path"]))  # type: ignore
+        if "task.otel_spans_path" in P
+        else get_all_spans()
+    )
     print(f"Found {len(spans)} spans")
 
-    benchmark_spans = (
-        spans
-        # -
-        .filter(["name"], "execute-task")
-        # -
-        .filter(["attributes", "task.notebook"], "notebooks/benchmark-model.py")
+    benchmark_spans = spans.filter(
+        "execute-task", {"task.notebook": "notebooks/benchmark-model.py"}
     )
 
     result = []
@@ -75,7 +73,7 @@ def get_model_benchmarks():
             {
                 "span_id": s["context"]["span_id"],
                 "nr_train_images": s["attributes"]["task.nr_train_images"],
-                "data": get_logged_values(spans.bound_under(s)),
+                "data": spans.logged_values(s),
             }
         )
 
@@ -90,6 +88,10 @@ def adjust_pandas(df):
             .replace("data.roc_auc_per_digit", "roc_auc")
             # -- 'data.roc_auc_class_mean' -> 'roc_auc_mean'
             .replace("data.roc_auc_class_mean", "roc_auc_mean")
+            # -- 'data.latency_p95_ms_batch_1' -> 'latency_p95_ms_batch_1'
+            .replace("data.latency_p95_ms_batch_1", "latency_p95_ms_batch_1")
+            # -- 'data.max_rows_per_s' -> 'max_rows_per_s'
+            .replace("data.max_rows_per_s", "max_rows_per_s")
         )
 
     return df.rename(column_renamer, axis="columns").sort_values(by="nr_train_images")
@@ -127,6 +129,49 @@ fig = plot_classifier_performance_summary(df_data)
 # %%
 logger.log_figure("auc-roc-model-performances.png", fig)
 
+
+# %% [markdown]
+# ### Model quality vs. inference speed
+
+
+# %%
+def plot_quality_vs_latency(df_data):
+    fig, axs = plt.subplots(nrows=1, ncols=2, figsize=(16, 5))
+
+    for ax, x_col, x_label in zip(
+        axs,
+        ["latency_p95_ms_batch_1", "max_rows_per_s"],
+        ["p95 latency for single row (ms)", "Max throughput (rows/s)"],
+    ):
+        ax.scatter(df_data[x_col], df_data["roc_auc_mean"])
+
+        for _, row in df_data.iterrows():
+            ax.annotate(
+                f"n={row['nr_train_images']}",
+                (row[x_col], row["roc_auc_mean"]),
+                textcoords="offset points",
+                xytext=(5, 5),
+            )
+
+        ax.set_xlabel(x_label, fontsize=14)
+        ax.set_ylabel("Mean ROC AUC", fontsize=14)
+
+    fig.suptitle(
+        "Classifier performance vs. inference speed "
+        "(n = number of digits in training set)",
+        fontsize=17,
+    )
+    fig.tight_layout()
+    fig.show()
+
+    return fig
+
+
+fig = plot_quality_vs_latency(df_data)
+
+# %%
+logger.log_figure("auc-roc-vs-inference-performance.png", fig)
+
 # %%
 ###
 
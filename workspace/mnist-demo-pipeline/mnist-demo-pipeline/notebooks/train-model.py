@@ -5,7 +5,7 @@
 #
 # - Load all training data (images and labels).
 # - Limit number of train images to `task.nr_train_images` (value provided as run parameter).
-# - Train a support vector machine model using sklearn.
+# - Search hyperparameters and train a support vector machine model using sklearn.
 # - Persist the trained model using the ONNX format.
 
 # %% [markdown]
@@ -16,6 +16,7 @@
 P = {
     "pipeline.data_lake_root": "/pipeline-outputs/data-lake",
     "task.nr_train_images": 600,
+    "task.num_cpus": 2,
 }
 # %% tags=["parameters"]
 # - During automated runs parameters will be injected in the below cell -
@@ -29,9 +30,11 @@ P = {
 
 
 # %%
-from pynb_dag_runner.tasks.task_opentelemetry_logging import PydarLogger
+from common.logging import make_pydar_logger
+from common.profiling import start_profiling
 
-logger = PydarLogger(P)
+start_profiling(P)
+logger = make_pydar_logger(P)
 
 
 # %% [markdown]
@@ -39,11 +42,17 @@ logger = PydarLogger(P)
 
 # %%
 def load_and_limit_train_data(P):
-    from common.io import datalake_root, read_numpy
+    from common.io import datalake_root, read_numpy_dataset
     from sklearn.model_selection import train_test_split
 
-    X_train_all = read_numpy(datalake_root(P) / "train-data" / "digits.numpy")
-    y_train_all = read_numpy(datalake_root(P) / "train-data" / "labels.numpy")
+    # Read-only view of train data (memory-mapped, or in the Ray object store); only
+    # the rows selected below are copied into memory
+    X_train_all = read_numpy_dataset(
+        P, datalake_root(P) / "train-data" / "digits.numpy"
+    )
+    y_train_all = read_numpy_dataset(
+        P, datalake_root(P) / "train-data" / "labels.numpy"
+    )
 
     assert isinstance(P["task.nr_train_images"], int)
 
@@ -67,25 +76,62 @@ def load_and_limit_train_data(P):
 X_train, y_train = load_and_limit_train_data(P)
 
 # %% [markdown]
-# ## Train support vector classifier model
+# ## Search hyperparameters for support vector classifier model
 #
-# Below we assume that the hyperparameter $C$ is known.
+# The hyperparameters $C$ and kernel are determined by a cross-validated search
+# (on the train data available in this notebook):
 #
-# However, this should ideally be found by a hyperparameter search. That could be
-# done in parallel on the Ray cluster, but this needs some more work. Ie., to use
-# multiple cores in the notebook, those cores should be reserved when starting the
-# notebook task (TODO).
+# - Each fit in the search is run as a Ray task on the Ray cluster. At most
+#   `P["task.num_cpus"]` fits run in parallel, ie., the search uses the cores reserved
+#   for this notebook task (see `num_cpus` in `driver.py`).
+# - Candidates are evaluated one fold at a time, and after each fold only the best
+#   half of the candidates continue (successive halving). So, bad candidates are
+#   stopped early.
 #
-# - https://docs.ray.io/en/latest/tune/key-concepts.html
-#
-# Note: cv-scores would need to be computed here, since they depend on the train data.
+# Note: cv-scores need to be computed here, since they depend on the train data.
 # After this notebook only the onnx-model is available.
 
+# %%
+from sklearn.model_selection import ParameterGrid
+
+#
+from common.hyperparameter_search import search_svc_hyperparameters, make_jobs_map
+from common.utils import get_num_cpus
+
+# %%
+candidates = list(
+    ParameterGrid({"C": [1e-4, 1e-3, 1e-2, 1e-1, 1.0], "kernel": ["linear", "rbf"]})
+)
+
+best_params, cv_results = search_svc_hyperparameters(
+    X_train,
+    y_train,
+    candidates,
+    nr_folds=5,
+    reduction_factor=2,
+    jobs_map=make_jobs_map(P, max_parallel=get_num_cpus(P)),
+)
+
+# %%
+logger.log_value("cv_search_results", cv_results)
+logger.log_value("best_params", best_params)
+logger.log_float(
+    "cv_best_mean_accuracy",
+    max(r["mean_score"] for r in cv_results if r["params"] == best_params),
+)
+
+best_params
+
+# %% [markdown]
+# ## Train support vector classifier model
+#
+# Fit final model on all train data using the best hyperparameters found above.
+
 # %%
 from sklearn.svm import SVC
 
 # %%
-model = SVC(C=0.001, kernel="linear", probability=True)
+model = SVC(**best_params, probability=True)
 
 model.fit(X_train, y_train)
 
@@ -119,17 +165,15 @@ logger.log_int(
 # ## Persist model
 
 # %%
-from skl2onnx import convert_sklearn
-from skl2onnx.common.data_types import FloatTensorType
-
-#
-from common.io import datalake_root, write_onnx
+from common.io import datalake_root, write_onnx, convert_sklearn_to_onnx
 
 # %%
-# convert sklearn model into onnx and persist to data lake
+# convert sklearn model into onnx and persist to data lake. The model outputs
+# probabilities as a float32 tensor (not as a list of dicts), see
+# convert_sklearn_to_onnx.
 
-model_onnx = convert_sklearn(
-    model, initial_types=[("float_input_8x8_image", FloatTensorType([None, 8 * 8]))]
+model_onnx = convert_sklearn_to_onnx(
+    model, input_name="float_input_8x8_image", nr_features=8 * 8
 )
 write_onnx(
     datalake_root(P)
@@ -1,6 +1,7 @@
 import json
 from pathlib import Path
 from functools import lru_cache
+from typing import List
 
 
 @lru_cache
@@ -34,6 +35,55 @@ def get_url_to_this_run(pipeline_outputs_path: Path) -> str:
     return f"https://{repo_owner}.github.io/{repo_name}/#/experiments/all-pipelines-runs/runs/{run_id}"
 
 
+def make_profile_report_lines(pipeline_outputs_path: Path) -> List[str]:
+    """
+    Return markdown lines with hot spots (functions with most own time, and peak
+    memory use) of task runs that were profiled (see common.profiling)
+    """
+    report_lines: List[str] = []
+
+    # task run directories are <task directory>/<run directory>
+    for summary_path in sorted(
+        (pipeline_outputs_path / "pipeline-outputs").glob("*/*/profile-summary.json")
+    ):
+        summary = json.loads(summary_path.read_text())
+        task_attributes = json.loads(
+            (summary_path.parent.parent / "task.json").read_text()
+        )["attributes"]
+        task_parameters = ", ".join(
+            f"{k}={v}"
+            for k, v in task_attributes.items()
+            if k.startswith("task.")
+            and k not in ["task.notebook", "task.task_type", "task.profile"]
+        )
+
+        report_lines.append(
+            f"### {Path(task_attributes['task.notebook']).name} "
+            f"({task_parameters}, {summary_path.parent.name.split('--')[0]})"
+        )
+        if "memory" in summary:
+            report_lines.append(
+                f"Peak traced memory: {summary['memory']['peak_memory_mb']} MB"
+            )
+            report_lines.append("")
+        if "cpu" in summary:
+            report_lines.append(
+                "| own time (s) | cumulative time (s) | calls | function |"
+            )
+            report_lines.append("|---:|---:|---:|---|")
+            for row in summary["cpu"]["top_own_time"][:5]:
+                report_lines.append(
+                    f"| {row['tottime_s']:.3f} | {row['cumtime_s']:.3f} "
+                    f"| {row['ncalls']} | `{row['function']}` |"
+                )
+        report_lines.append("")
+
+    if len(report_lines) == 0:
+        return []
+
+    return ["## Hot spots in profiled tasks"] + report_lines
+
+
 def make_markdown_report(pipeline_outputs_path: Path) -> str:
     report_lines = []
 
@@ -53,6 +103,9 @@ def make_markdown_report(pipeline_outputs_path: Path) -> str:
     report_lines.append("```mermaid")
     report_lines.append((pipeline_outputs_path / "gantt.mmd").read_text())
     report_lines.append("```")
+
+    report_lines += make_profile_report_lines(pipeline_outputs_path)
+
     report_lines.append("---")
     report_lines.append(
         "Note: the above links point to a static Github Pages site built using build artifacts "